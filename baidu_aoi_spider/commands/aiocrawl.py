@@ -0,0 +1,20 @@
+from scrapy.commands import ScrapyCommand
+from scrapy.exceptions import UsageError
+
+from baidu_aoi_spider.engine import AsyncEngine
+
+
+class Command(ScrapyCommand):
+    requires_project = True
+
+    def syntax(self) -> str:
+        return "<spider>"
+
+    def short_desc(self) -> str:
+        return "Run a spider on the asyncio engine instead of the Scrapy runtime"
+
+    def run(self, args, opts) -> None:
+        if len(args) != 1:
+            raise UsageError()
+        spidercls = self.crawler_process.spider_loader.load(args[0])
+        AsyncEngine(spidercls, self.settings).run()
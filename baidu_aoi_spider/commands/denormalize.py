@@ -0,0 +1,23 @@
+from scrapy.commands import ScrapyCommand
+from scrapy.exceptions import UsageError
+
+from processor import FileOperator, Normalizer
+
+
+class Command(ScrapyCommand):
+    requires_project = True
+
+    def syntax(self) -> str:
+        return "<spider>"
+
+    def short_desc(self) -> str:
+        return "Derive the csv and shp with geometries from the normalized tables"
+
+    def run(self, args, opts) -> None:
+        if len(args) != 1:
+            raise UsageError()
+        spidercls = self.crawler_process.spider_loader.load(args[0])
+        spidercls.prepare(self.settings.copy_to_dict())
+        if not Normalizer.enabled():
+            raise UsageError('"OUTPUT_NORMALIZED_DIR" is not set.', print_help=False)
+        FileOperator.save_denormalized()
@@ -0,0 +1,65 @@
+from scrapy.commands import ScrapyCommand
+from scrapy.exceptions import UsageError
+
+from processor import Estimator
+
+
+class Command(ScrapyCommand):
+    requires_project = True
+
+    def syntax(self) -> str:
+        return "[options] <spider>"
+
+    def short_desc(self) -> str:
+        return "Estimate the API calls and time of a crawl without crawling"
+
+    def add_options(self, parser) -> None:
+        super().add_options(parser)
+        parser.add_argument(
+            "--sample",
+            type=int,
+            default=50,
+            help="number of POIs sampled to estimate candidates per POI (default: 50)",
+        )
+        parser.add_argument(
+            "--live",
+            action="store_true",
+            help="request the uid search API for sampled POIs that are not archived",
+        )
+        parser.add_argument(
+            "--latency",
+            type=float,
+            default=0.3,
+            help="mean API latency in seconds if not sampled live (default: 0.3)",
+        )
+        parser.add_argument(
+            "--qps", type=float, default=30, help="QPS limit of each AK (default: 30)"
+        )
+        parser.add_argument(
+            "--quota",
+            type=int,
+            default=5000,
+            help="daily uid search quota of each AK (default: 5000)",
+        )
+        parser.add_argument(
+            "--candidates",
+            type=float,
+            default=5.0,
+            help="candidates per POI if nothing is sampled (default: 5)",
+        )
+
+    def run(self, args, opts) -> None:
+        if len(args) != 1:
+            raise UsageError()
+        spidercls = self.crawler_process.spider_loader.load(args[0])
+        spidercls.prepare(self.settings.copy_to_dict())
+        estimation = Estimator.estimate(
+            sample_size=opts.sample,
+            live=opts.live,
+            latency=opts.latency,
+            qps=opts.qps,
+            daily_quota=opts.quota,
+            candidates=opts.candidates,
+        )
+        for key, value in estimation.items():
+            print(f"{key:>20}: {value}")
@@ -0,0 +1,23 @@
+from scrapy.commands import ScrapyCommand
+from scrapy.exceptions import UsageError
+
+from processor import FileOperator, Logger, Reranker
+
+
+class Command(ScrapyCommand):
+    requires_project = True
+
+    def syntax(self) -> str:
+        return "<spider>"
+
+    def short_desc(self) -> str:
+        return "Re-match POIs offline from the candidate store of a spider"
+
+    def run(self, args, opts) -> None:
+        if len(args) != 1:
+            raise UsageError()
+        spidercls = self.crawler_process.spider_loader.load(args[0])
+        spidercls.prepare(self.settings.copy_to_dict())
+        Reranker.rerank()
+        Logger.log_simplification()
+        FileOperator.save_file()
@@ -0,0 +1,258 @@
+import asyncio
+import logging
+import time
+from collections import Counter as StatsCounter
+from types import SimpleNamespace
+from typing import TYPE_CHECKING
+from urllib.parse import urlparse
+
+from scrapy.http import Request, TextResponse
+from scrapy.settings import Settings
+from scrapy_fake_useragent.middleware import RandomUserAgentMiddleware
+
+from baidu_aoi_spider.middlewares import BaiduAOIMiddleware
+from processor import HttpArchive, Metrics, Repo, SessionPool
+
+if TYPE_CHECKING:
+    from processor.session_pool import Session
+
+
+class _Slot(object):
+    """
+    Download slot of a host: a bounded semaphore of `CONCURRENT_REQUESTS_PER_IP`,
+    and the time of the last request for `DOWNLOAD_DELAY`.
+    """
+
+    def __init__(self, concurrency: int) -> None:
+        self.semaphore = asyncio.BoundedSemaphore(concurrency)
+        self.lock = asyncio.Lock()
+        self.last = 0.0
+
+    async def wait_delay(self, delay: float) -> None:
+        async with self.lock:
+            wait = self.last + delay - time.monotonic()
+            if wait > 0:
+                await asyncio.sleep(wait)
+            self.last = time.monotonic()
+
+
+class AsyncEngine(object):
+    """
+    Alternative to the Scrapy runtime, which drives the callbacks of a spider
+    from an asyncio event loop with a pooled `aiohttp` client session.
+
+    The spider is the same: its `start_requests`, `parse_uid` and `parse_aoi` are
+    called as they are, and the `Request`s they yield are downloaded here, newest
+    first as in Scrapy's default LIFO queue. The downloading mirrors the settings
+    and `BaiduAOIMiddleware`:
+        - at most `CONCURRENT_REQUESTS` requests, `CONCURRENT_REQUESTS_PER_IP` per host,
+          and `DOWNLOAD_DELAY` seconds between two requests to a host
+        - a random user-agent of `RandomUserAgentMiddleware` for every request
+        - a random `BAIDUID` cookie and, if `PROXY_ENABLED`, a proxy from the pool,
+          both renewed before each retry, or a session of the `SessionPool`,
+          waiting for its `SESSION_MIN_INTERVAL`
+        - up to `RETRY_TIMES` retries on `RETRY_HTTP_CODES`, network errors
+          and proxy pool errors, after which the callback receives
+          a 'Gave up retrying' message
+        - `HttpArchive` recording and replaying
+    An exception of a callback is logged, and only fails its request.
+    Unlike the middleware, connections are kept alive and pooled.
+    """
+
+    PROXY_POOL = "http://127.0.0.1:5000"
+
+    def __init__(self, spidercls, settings: Settings) -> None:
+        self.spidercls = spidercls
+        self.settings = settings
+        self.concurrency = settings.getint("CONCURRENT_REQUESTS")
+        self.concurrency_per_host = settings.getint(
+            "CONCURRENT_REQUESTS_PER_IP"
+        ) or settings.getint("CONCURRENT_REQUESTS_PER_DOMAIN")
+        self.delay = settings.getfloat("DOWNLOAD_DELAY")
+        self.retry_times = settings.getint("RETRY_TIMES")
+        self.retry_http_codes = {
+            int(code) for code in settings.getlist("RETRY_HTTP_CODES")
+        }
+        self.stats = StatsCounter()
+        # the same user-agent provider as the Scrapy runtime
+        self.user_agents = RandomUserAgentMiddleware(
+            SimpleNamespace(settings=settings)
+        )._ua_provider
+
+    def run(self) -> None:
+        asyncio.run(self.crawl())
+
+    async def crawl(self) -> None:
+        import aiohttp
+
+        self.spider = self.spidercls(self.settings.copy_to_dict())
+        HttpArchive.open()
+        # and the proxy pool errors, e.g. not running or without any proxy left
+        self._retry_exceptions = (
+            aiohttp.ClientError,
+            asyncio.TimeoutError,
+            ValueError,
+            KeyError,
+        )
+        self._slots = {}
+        self._queue = []
+        self._active = 0
+        self._changed = asyncio.Event()
+        self._start_requests = iter(self.spider.start_requests())
+        connector = aiohttp.TCPConnector(
+            limit=self.concurrency, limit_per_host=self.concurrency_per_host
+        )
+        try:
+            async with aiohttp.ClientSession(
+                connector=connector,
+                headers=self.settings.getdict("DEFAULT_REQUEST_HEADERS"),
+                timeout=aiohttp.ClientTimeout(total=15),
+            ) as self.session:
+                await asyncio.gather(*(self._worker() for _ in range(self.concurrency)))
+        finally:
+            HttpArchive.close()
+            self.spider.close_spider()
+
+    async def _worker(self) -> None:
+        while True:
+            request = self._next_request()
+            if request is None:
+                # nothing to do until another request finishes
+                if not self._active:
+                    self._changed.set()
+                    return
+                self._changed.clear()
+                await self._changed.wait()
+                continue
+            self._active += 1
+            try:
+                await self._process(request)
+            except Exception as e:
+                # as Scrapy's scraper, only the request fails
+                self.stats[f"spider_exceptions/{type(e).__name__}"] += 1
+                logging.exception(f"Spider error processing {request}")
+            finally:
+                self._active -= 1
+                self._changed.set()
+
+    def _next_request(self) -> Request | None:
+        if self._queue:
+            return self._queue.pop()
+        return next(self._start_requests, None)
+
+    async def _process(self, request: Request) -> None:
+        response = await self._download(request)
+        for new_request in request.callback(response, **request.cb_kwargs) or ():
+            self._queue.append(new_request)
+
+    async def _download(self, request: Request) -> TextResponse | str:
+        if Repo._http_archive_mode == "replay":
+            return self._replay(request)
+        host = urlparse(request.url).hostname
+        if host not in self._slots:
+            self._slots[host] = _Slot(self.concurrency_per_host)
+        slot = self._slots[host]
+        headers = {k.decode(): v[0].decode() for k, v in request.headers.items()}
+        user_agent = headers.setdefault("User-Agent", self.user_agents.get_random_ua())
+        sessions = SessionPool.enabled()
+        proxy = None
+        async with slot.semaphore:
+            for retry_times in range(self.retry_times + 1):
+                session = None
+                try:
+                    # a proxy pool error fails the attempt as a network error
+                    if sessions:
+                        session = await self._acquire_session(user_agent)
+                        cookies = {"BAIDUID": session.cookie}
+                        headers["User-Agent"] = session.user_agent
+                        proxy = session.proxy
+                        await asyncio.sleep(SessionPool.wait(session))
+                    else:
+                        cookies = {"BAIDUID": BaiduAOIMiddleware.get_cookie()}
+                        if Repo._proxy_enabled and proxy is None:
+                            proxy = await self._get_proxy()
+                    await slot.wait_delay(self.delay)
+                    self.stats["downloader/request_count"] += 1
+                    start = time.perf_counter()
+                    # redirects are anti-bot blocks to retry, as `dont_redirect`
+                    async with self.session.get(
+                        request.url,
+                        headers=headers,
+                        cookies=cookies,
+                        proxy=proxy,
+                        allow_redirects=False,
+                    ) as r:
+                        body = await r.read()
+                        status = r.status
+                except self._retry_exceptions as e:
+                    reason = type(e).__name__
+                    await self._report_session(session, None)
+                else:
+                    await self._report_session(session, status)
+                    Metrics.observe("download", time.perf_counter() - start, host)
+                    self.stats[f"downloader/response_status_count/{status}"] += 1
+                    response = TextResponse(
+                        request.url, status=status, body=body, encoding="utf-8"
+                    )
+                    if status not in self.retry_http_codes:
+                        if Repo._http_archive_mode == "record" and status == 200:
+                            HttpArchive.put(request.url, status, dict(r.headers), body)
+                            self.stats["http_archive/recorded"] += 1
+                        return response
+                    reason = status
+                if retry_times < self.retry_times:
+                    self.stats["retry/count"] += 1
+                    self.stats[f"retry/reason_count/{reason}"] += 1
+                    if proxy is not None and not sessions:
+                        await self._delete_proxy(proxy)
+                        proxy = None
+        self.stats["retry/max_reached"] += 1
+        return f"Gave up retrying {request} (failed {retry_times + 1} times)"
+
+    async def _acquire_session(self, user_agent: str) -> "Session":
+        """
+        See `SessionMiddleware.process_request`, where a new session takes
+        the `user_agent` of the request.
+        """
+        session = SessionPool.acquire()
+        if session is None:
+            session = SessionPool.add(
+                BaiduAOIMiddleware.get_cookie(),
+                user_agent,
+                await self._get_proxy() if Repo._proxy_enabled else None,
+            )
+        return session
+
+    async def _report_session(
+        self, session: "Session | None", status: int | None
+    ) -> None:
+        if session is not None and SessionPool.report(session, status):
+            if session.proxy:
+                await self._delete_proxy(session.proxy)
+
+    def _replay(self, request: Request) -> TextResponse | str:
+        archived = HttpArchive.get(request.url)
+        if archived is None:
+            self.stats["http_archive/miss"] += 1
+            # as given up retrying, see `HttpArchiveMiddleware.process_request`
+            return f"Gave up retrying {request} (not archived)"
+        self.stats["http_archive/hit"] += 1
+        status, _, body = archived
+        return TextResponse(request.url, status=status, body=body, encoding="utf-8")
+
+    async def _get_proxy(self) -> str:
+        """
+        See `BaiduAOIMiddleware.get_proxy`.
+        """
+        with Metrics.timer("proxy_fetch"):
+            async with self.session.get(f"{self.PROXY_POOL}/get/") as r:
+                proxy = await r.json(content_type=None)
+        return f'http://{proxy["proxy"]}'
+
+    async def _delete_proxy(self, proxy: str) -> None:
+        try:
+            async with self.session.get(f"{self.PROXY_POOL}/delete/?proxy={proxy}"):
+                pass
+        except self._retry_exceptions as e:
+            # the proxy is only given out again
+            logging.warning(f"-- Failed to delete proxy {proxy}: {e!r}")
@@ -0,0 +1,231 @@
+import json
+import logging
+import os
+import time
+
+from scrapy import signals
+from scrapy.utils.httpobj import urlparse_cached
+from twisted.internet import task
+from twisted.web.resource import Resource
+from twisted.web.server import Site
+
+from processor import Controller, FileOperator, Metrics, Repo
+
+
+class MetricsResource(Resource):
+    isLeaf = True
+
+    def __init__(self, extension) -> None:
+        super().__init__()
+        self.extension = extension
+
+    def render_GET(self, request) -> bytes:
+        self.extension.update_gauges()
+        request.setHeader(b"Content-Type", b"text/plain; version=0.0.4")
+        return Metrics.prometheus().encode("utf-8")
+
+
+class MetricsExtension(object):
+    """
+    Record per-stage download latency and queue wait time into `Metrics`,
+    copy the summaries into Scrapy stats, serve them in Prometheus text format
+    at `http://METRICS_HOST:METRICS_PORT/metrics` and dump them as json
+    to `METRICS_DUMP_PATH` every `METRICS_DUMP_INTERVAL` seconds.
+    """
+
+    def __init__(self, crawler) -> None:
+        self.crawler = crawler
+        self.port = None
+        self.dump_task = None
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        ext = cls(crawler)
+        crawler.signals.connect(ext.spider_opened, signal=signals.spider_opened)
+        crawler.signals.connect(ext.spider_closed, signal=signals.spider_closed)
+        crawler.signals.connect(ext.request_scheduled, signal=signals.request_scheduled)
+        crawler.signals.connect(
+            ext.request_reached_downloader, signal=signals.request_reached_downloader
+        )
+        crawler.signals.connect(ext.response_received, signal=signals.response_received)
+        return ext
+
+    def spider_opened(self, spider) -> None:
+        Metrics.reset()
+        if Repo._metrics_port:
+            # imported late, not to install the default reactor before Scrapy's
+            from twisted.internet import reactor
+
+            site = Site(MetricsResource(self))
+            self.port = reactor.listenTCP(
+                Repo._metrics_port, site, interface=Repo._metrics_host
+            )
+            logging.warning(
+                f"-- Metrics served at "
+                f"http://{Repo._metrics_host}:{Repo._metrics_port}/metrics."
+            )
+        if Repo._metrics_dump_path:
+            self.dump_task = task.LoopingCall(self.dump)
+            self.dump_task.start(Repo._metrics_dump_interval, now=False)
+
+    def spider_closed(self, spider) -> None:
+        if self.dump_task and self.dump_task.running:
+            self.dump_task.stop()
+        self.dump()
+        if self.port:
+            self.port.stopListening()
+
+    def request_scheduled(self, request, spider) -> None:
+        request.meta["scheduled_at"] = time.perf_counter()
+
+    def request_reached_downloader(self, request, spider) -> None:
+        scheduled_at = request.meta.pop("scheduled_at", None)
+        if scheduled_at is not None:
+            Metrics.observe("queue_wait", time.perf_counter() - scheduled_at)
+
+    def response_received(self, response, request, spider) -> None:
+        latency = request.meta.get("download_latency")
+        if latency is not None:
+            # the Host header tells the APIs apart even behind a proxy or stand-in
+            host = request.headers.get("Host", b"").decode()
+            Metrics.observe(
+                "download", latency, host or urlparse_cached(request).hostname
+            )
+
+    def update_gauges(self) -> None:
+        engine = self.crawler.engine
+        if engine is not None:
+            Metrics.set_gauge("requests_in_flight", len(engine.downloader.active))
+
+    def dump(self) -> None:
+        """
+        Copy the summaries into Scrapy stats, and write them as json if required.
+        """
+        self.update_gauges()
+        snapshot = Metrics.snapshot()
+        for stage, summary in snapshot["stages"].items():
+            for name, value in summary.items():
+                self.crawler.stats.set_value(f"metrics/{stage}/{name}", value)
+        if Repo._metrics_dump_path:
+            # write to a temporary file first, so that readers never see a partial file
+            tmp_path = f"{Repo._metrics_dump_path}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(snapshot, f, indent=2)
+            os.replace(tmp_path, Repo._metrics_dump_path)
+
+
+class ControlResource(Resource):
+    isLeaf = True
+
+    def __init__(self, extension) -> None:
+        super().__init__()
+        self.extension = extension
+
+    def render_GET(self, request) -> bytes:
+        if request.path != b"/state":
+            return self.reply(request, {"error": "Not found."}, 404)
+        return self.reply(request, self.extension.state())
+
+    def render_POST(self, request) -> bytes:
+        action = request.path.decode().strip("/")
+        if action not in ["settings", "pause", "resume", "checkpoint"]:
+            return self.reply(request, {"error": "Not found."}, 404)
+        try:
+            if action == "settings":
+                self.extension.update(json.loads(request.content.read() or b"{}"))
+            else:
+                getattr(self.extension, action)()
+        except (TypeError, ValueError) as e:
+            return self.reply(request, {"error": str(e)}, 400)
+        return self.reply(request, self.extension.state())
+
+    @staticmethod
+    def reply(request, content: dict, code: int = 200) -> bytes:
+        request.setResponseCode(code)
+        request.setHeader(b"Content-Type", b"application/json")
+        return json.dumps(content, ensure_ascii=False).encode("utf-8")
+
+
+class ControlExtension(object):
+    """
+    Serve a local control endpoint at `http://CONTROL_HOST:CONTROL_PORT`,
+    to inspect and tune a running crawl without restarting it:
+        - GET /state: progress, scheduling state and live settings
+        - POST /settings: update some of the `Controller.LIVE_SETTINGS` with
+          a json object, e.g. `{"DOWNLOAD_DELAY": 0.5, "FILTER_RULES": {...}}`
+        - POST /pause, /resume: stop or restart scheduling new requests,
+          while the requests already in flight are finished
+        - POST /checkpoint: save the file at once
+    """
+
+    def __init__(self, crawler) -> None:
+        self.crawler = crawler
+        self.spider = None
+        self.port = None
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        ext = cls(crawler)
+        crawler.signals.connect(ext.spider_opened, signal=signals.spider_opened)
+        crawler.signals.connect(ext.spider_closed, signal=signals.spider_closed)
+        return ext
+
+    def spider_opened(self, spider) -> None:
+        self.spider = spider
+        if Repo._control_port:
+            # imported late, not to install the default reactor before Scrapy's
+            from twisted.internet import reactor
+
+            site = Site(ControlResource(self))
+            self.port = reactor.listenTCP(
+                Repo._control_port, site, interface=Repo._control_host
+            )
+            logging.warning(
+                f"-- Control endpoint served at "
+                f"http://{Repo._control_host}:{Repo._control_port}."
+            )
+
+    def spider_closed(self, spider) -> None:
+        if self.port:
+            self.port.stopListening()
+
+    def state(self) -> dict:
+        engine = self.crawler.engine
+        # `engine.scheduler` since Scrapy 2.13, `engine.slot.scheduler` before,
+        # either is only set while the spider is open
+        slot = getattr(engine, "slot", None)
+        scheduler = getattr(engine, "scheduler", slot and slot.scheduler)
+        state = Controller.state()
+        state.update(
+            paused=engine.paused,
+            requests_in_flight=len(engine.downloader.active),
+            requests_scheduled=len(scheduler) if scheduler is not None else 0,
+        )
+        return state
+
+    def update(self, updates: dict) -> None:
+        """
+        Update the settings, and apply the concurrency ones to the downloader.
+        """
+        Controller.update(updates)
+        downloader = self.crawler.engine.downloader
+        downloader.total_concurrency = Repo._concurrent_requests
+        downloader.ip_concurrency = Repo._concurrent_requests_per_ip
+        # new download slots take the delay of the spider
+        self.spider.download_delay = Repo._download_delay
+        for slot in downloader.slots.values():
+            slot.delay = Repo._download_delay
+            if Repo._concurrent_requests_per_ip:
+                slot.concurrency = Repo._concurrent_requests_per_ip
+
+    def pause(self) -> None:
+        self.crawler.engine.pause()
+        logging.warning("-- Scheduling paused.")
+
+    def resume(self) -> None:
+        self.crawler.engine.unpause()
+        logging.warning("-- Scheduling resumed.")
+
+    def checkpoint(self) -> None:
+        FileOperator.save_file()
+        logging.warning("-- Checkpoint saved.")
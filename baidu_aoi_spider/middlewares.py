@@ -1,27 +1,90 @@
+import asyncio
 import random
 import string
 from typing import Optional, Union
 
 import requests
+from scrapy import signals
 from scrapy.downloadermiddlewares.retry import RetryMiddleware
+from scrapy.exceptions import IgnoreRequest
+from scrapy.http import Headers
 from scrapy.http.request import Request
+from scrapy.responsetypes import responsetypes
 from scrapy.spiders import Spider
 from scrapy.utils.python import global_object_name
 from scrapy.utils.response import response_status_message
 
+from processor import HttpArchive, Metrics, Profiler, Repo, SessionPool
+
+
+class HttpArchiveMiddleware(object):
+    """
+    Record every successful Baidu API response into the `HttpArchive`
+    (`HTTP_ARCHIVE_MODE` = 'record'), or serve every request from it
+    without touching the network (`HTTP_ARCHIVE_MODE` = 'replay').
+
+    It runs before `BaiduAOIMiddleware`, so that replayed requests
+    neither fetch proxies nor wait for download slots.
+    """
+
+    def __init__(self, stats) -> None:
+        self.stats = stats
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        middleware = cls(crawler.stats)
+        crawler.signals.connect(middleware.spider_opened, signal=signals.spider_opened)
+        crawler.signals.connect(middleware.spider_closed, signal=signals.spider_closed)
+        return middleware
+
+    def spider_opened(self, spider) -> None:
+        HttpArchive.open()
+
+    def spider_closed(self, spider) -> None:
+        HttpArchive.close()
+
+    def process_request(self, request, spider):
+        if Repo._http_archive_mode != "replay":
+            return None
+        archived = HttpArchive.get(request.url)
+        if archived is None:
+            self.stats.inc_value("http_archive/miss")
+            raise IgnoreRequest(f"Not archived: {request.url}")
+        self.stats.inc_value("http_archive/hit")
+        status, headers, body = archived
+        headers = Headers(headers)
+        respcls = responsetypes.from_args(headers=headers, url=request.url, body=body)
+        return respcls(
+            url=request.url, status=status, headers=headers, body=body, request=request
+        )
+
+    def process_response(self, request, response, spider):
+        if Repo._http_archive_mode == "record" and response.status == 200:
+            headers = {
+                k.decode("latin1"): [v.decode("latin1") for v in vs]
+                for k, vs in response.headers.items()
+            }
+            HttpArchive.put(request.url, response.status, headers, response.body)
+            self.stats.inc_value("http_archive/recorded")
+        return response
+
 
 class BaiduAOIMiddleware(RetryMiddleware):
-    def get_proxy(self) -> str:
+    @staticmethod
+    def get_proxy() -> str:
         """
         proxy pool is built with reference to https://github.com/jhao104/proxy_pool
         """
-        proxy = requests.get("http://127.0.0.1:5000/get/").json()
+        with Metrics.timer("proxy_fetch"):
+            proxy = requests.get("http://127.0.0.1:5000/get/").json()
         return f'http://{proxy["proxy"]}'
 
-    def delete_proxy(self, proxy) -> None:
+    @staticmethod
+    def delete_proxy(proxy) -> None:
         requests.get(f"http://127.0.0.1:5000/delete/?proxy={proxy}")
 
-    def get_cookie(self) -> str:
+    @staticmethod
+    def get_cookie() -> str:
         """
         It is observed that `BAIDUID` cookie value
         is made up of 32 random numbers and letters.
@@ -37,20 +100,28 @@ class BaiduAOIMiddleware(RetryMiddleware):
         return f"{bd_id}:FG=1"
 
     def alter_proxy_and_cookie(self, request):
+        # the retry of a session request is bound to a session again
+        if "session" in request.meta:
+            return request
         request.cookies["BAIDUID"] = self.get_cookie()
         if request.meta.get("proxy_enabled"):
             self.delete_proxy(request.meta["proxy"])
             request.meta["proxy"] = self.get_proxy()
         return request
 
+    @Profiler.sampled
     def process_request(self, request, spider):
         request.headers["Connection"] = "close"
         request.meta["dont_redirect"] = True
         request.meta["download_timeout"] = 15
+        # the cookie and proxy are bound by `SessionMiddleware` instead
+        if SessionPool.enabled():
+            return
         request.cookies["BAIDUID"] = self.get_cookie()
         if request.meta.get("proxy_enabled"):
             request.meta["proxy"] = self.get_proxy()
 
+    @Profiler.sampled
     def process_response(self, request, response, spider):
         if request.meta.get("dont_retry", False):
             return response
@@ -60,6 +131,7 @@ class BaiduAOIMiddleware(RetryMiddleware):
             return self._retry(request, reason, spider) or response
         return response
 
+    @Profiler.sampled
     def process_exception(self, request, exception, spider):
         if isinstance(exception, self.EXCEPTIONS_TO_RETRY) and not request.meta.get(
             "dont_retry", False
@@ -79,6 +151,57 @@ class BaiduAOIMiddleware(RetryMiddleware):
         )
 
 
+class SessionMiddleware(object):
+    """
+    Send every request as a session of the `SessionPool` (if `SESSION_POOL_SIZE`),
+    i.e. with the session's own cookie jar, `BAIDUID` cookie, user-agent and proxy,
+    where a new session takes the random user-agent given to its first request.
+    A request waits until `SESSION_MIN_INTERVAL` seconds after the last one
+    of its session, so that a full pool slows the crawl down.
+
+    It runs after the retry middlewares, so that it sees every response and exception
+    before they are retried, and the retries are bound to a session again.
+    """
+
+    async def process_request(self, request, spider):
+        if not SessionPool.enabled():
+            return None
+        session = SessionPool.acquire()
+        if session is None:
+            session = SessionPool.add(
+                BaiduAOIMiddleware.get_cookie(),
+                request.headers.get("User-Agent", b"").decode(),
+                (
+                    BaiduAOIMiddleware.get_proxy()
+                    if request.meta.get("proxy_enabled")
+                    else None
+                ),
+            )
+        request.meta["session"] = session
+        request.meta["cookiejar"] = session.id
+        request.cookies["BAIDUID"] = session.cookie
+        request.headers["User-Agent"] = session.user_agent
+        if session.proxy:
+            request.meta["proxy"] = session.proxy
+        wait = SessionPool.wait(session)
+        if wait:
+            await asyncio.sleep(wait)
+
+    def process_response(self, request, response, spider):
+        self._report(request, response.status)
+        return response
+
+    def process_exception(self, request, exception, spider):
+        self._report(request, None)
+
+    @staticmethod
+    def _report(request, status: int | None) -> None:
+        session = request.meta.get("session")
+        if session is not None and SessionPool.report(session, status):
+            if session.proxy:
+                BaiduAOIMiddleware.delete_proxy(session.proxy)
+
+
 def get_retry_request(
     request: Request,
     *,
@@ -5,6 +5,7 @@
 BOT_NAME = "baidu_aoi_spider"
 SPIDER_MODULES = ["baidu_aoi_spider.spiders"]
 NEWSPIDER_MODULE = "baidu_aoi_spider.spiders"
+COMMANDS_MODULE = "baidu_aoi_spider.commands"
 
 # Disobey robots.txt rules
 ROBOTSTXT_OBEY = False
@@ -22,9 +23,27 @@ DEFAULT_REQUEST_HEADERS = {
 
 # Enable or disable downloader middlewares
 DOWNLOADER_MIDDLEWARES = {
-    "scrapy.downloadermiddleware.useragent.UserAgentMiddleware": None,
+    "scrapy.downloadermiddlewares.useragent.UserAgentMiddleware": None,
     "scrapy_fake_useragent.middleware.RandomUserAgentMiddleware": 100,
+    "baidu_aoi_spider.middlewares.HttpArchiveMiddleware": 50,
     "baidu_aoi_spider.middlewares.BaiduAOIMiddleware": 200,
+    "baidu_aoi_spider.middlewares.SessionMiddleware": 560,
+}
+
+# Random browser user-agents of fake-useragent, where newer versions require a fallback
+# (without one, the Scrapy user-agent of USER_AGENT is sent instead)
+FAKEUSERAGENT_FALLBACK = (
+    "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 "
+    "(KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36"
+)
+
+# Keep the per-IP concurrency honored, which the downloader-aware queue does not support
+SCHEDULER_PRIORITY_QUEUE = "scrapy.pqueues.ScrapyPriorityQueue"
+
+# Enable or disable extensions
+EXTENSIONS = {
+    "baidu_aoi_spider.extensions.MetricsExtension": 500,
+    "baidu_aoi_spider.extensions.ControlExtension": 500,
 }
 
 # Retry settings
@@ -35,6 +54,10 @@ RETRY_PRIORITY_ADJUST = -1
 # Log level settings
 LOG_LEVEL = "WARNING"
 
+# Baidu API endpoints, only changed when testing against a local stand-in server
+BAIDU_SEARCH_URL = "https://api.map.baidu.com/place/v2/search"
+BAIDU_AOI_URL = "https://map.baidu.com/"
+
 # Settings whose default value is deprecated to a future-proof value
 REQUEST_FINGERPRINTER_IMPLEMENTATION = "2.7"
 TWISTED_REACTOR = "twisted.internet.asyncioreactor.AsyncioSelectorReactor"
@@ -66,6 +89,139 @@ PROXY_ENABLED = True
 UPDATE_INTERVAL = 150  # how many AOI API calls before updating the output file
 USE_FIRST_UID = False
 
+# Session pool settings
+# Requests are sent by a pool of up to SESSION_POOL_SIZE sticky sessions, each with
+# its own BAIDUID cookie jar, user-agent and proxy, instead of a new random cookie
+# and user-agent for every request, which looks unnatural and is blocked more often.
+# A session is retired at once on a response status in SESSION_BLOCK_CODES, after
+# SESSION_MAX_FAILURES consecutive other failures, or after SESSION_MAX_REQUESTS requests.
+SESSION_POOL_SIZE = 0  # 0 to disable, e.g. 20
+SESSION_MIN_INTERVAL = 1  # unit: seconds, at least between two requests of a session
+SESSION_MAX_REQUESTS = 0  # 0 for no limit, e.g. 500
+SESSION_MAX_FAILURES = 3
+SESSION_BLOCK_CODES = [302, 403]
+
+# Crawl order settings
+# By default, POIs are crawled in the order of the csv file. They can be sorted
+# along a space-filling curve instead ('hilbert' or 'geohash'), so that neighboring
+# POIs, which often share candidate AOIs, are crawled together,
+# and grouped by their industry columns first ('VAR' industry parameters only).
+CRAWL_ORDER = ""  # '' to keep the csv order, 'hilbert' or 'geohash'
+CRAWL_ORDER_BY_INDUSTRY = False
+
+# Candidate pre-screening settings
+# Uid search results are scored by the weighted mean of their name similarity,
+# distance, search rank and industry tag match, and only the AOIs of the top
+# PRESCREEN_TOP_K results scoring at least PRESCREEN_MIN_SCORE are requested.
+# For a PRESCREEN_AUDIT_RATE fraction of POIs, all results are requested instead,
+# to measure how often the best AOI is within the top-K.
+PRESCREEN_TOP_K = 0  # 0 to disable, e.g. 3
+PRESCREEN_MIN_SCORE = 0  # between 0 and 1, the best result is always requested
+PRESCREEN_WEIGHTS = {"similarity": 1, "distance": 1, "search_rank": 1, "tag": 1}
+PRESCREEN_AUDIT_RATE = 0  # between 0 and 1, e.g. 0.05
+
+# Decisive match settings
+# The AOI of the first search result is requested alone first, and if it cannot
+# be beaten, i.e. its name is identical to the POI's and its polygon contains the POI,
+# the POI is finished at once without requesting the other AOIs.
+# Only supported if "sort_by_area" is 0.
+DECISIVE_MATCH = False
+
+# POI deduplication settings
+# POIs with the same name within about DEDUP_TOLERANCE meters are crawled only once,
+# and the result is copied to all of them.
+DEDUP_TOLERANCE = 0  # unit: meters, 0 to disable, e.g. 50
+
+# Grid harvesting settings
+# The POIs to crawl are tiled into cells of GRID_CELL_SIZE meters, and a cell of at
+# least GRID_MIN_POIS POIs may be swept by a paged search of its industry category
+# (requires "prim_ind" or "sec_ind" of API_PARAMS) instead of a search per POI.
+# The AOI of each uid found within GRID_MARGIN meters of its POIs is requested once,
+# and the POIs are matched to them locally. A cell is only harvested if it takes
+# fewer API calls than searching its POIs one by one, as estimated from the first
+# page and the costs observed so far, and the POIs left unmatched are still searched
+# one by one.
+GRID_CELL_SIZE = 0  # unit: meters, 0 to disable, e.g. 1000
+GRID_MIN_POIS = 10
+GRID_MARGIN = 500  # unit: meters
+
+# Output geometry settings
+# AOI polygons are simplified with a topology-preserving tolerance before being written,
+# and their coordinates are rounded, which makes the csv and shp files much smaller.
+# The size reduction and the maximum error introduced are logged at the end.
+OUTPUT_SIMPLIFY_TOLERANCE = 0  # unit: meters, 0 to disable, e.g. 1
+OUTPUT_PRECISION = 0  # decimals of wgs84 coordinates, 0 to disable, e.g. 6 (~0.1 m)
+
+# Candidate store settings
+# Every candidate AOI of each POI is kept in this directory (set to '' to disable),
+# so that POIs can be re-matched offline after changing `FILTER_RULES`,
+# by running `scrapy rerank spider_name`.
+CANDIDATE_STORE_DIR = ""  # e.g. "data/AOI/candidates"
+
+# Normalized output settings
+# Each AOI polygon is saved once into OUTPUT_NORMALIZED_DIR/aoi.csv, keyed by uid and
+# geom_hash, however many POIs are matched to it, and only new AOIs are appended at
+# each save, while OUTPUT_NORMALIZED_DIR/poi_aoi.csv assigns each matched POI to its uid.
+# The POI csv is then saved without geometry and the shp is not saved while crawling:
+# run `scrapy denormalize spider_name` to derive both from the normalized tables.
+OUTPUT_NORMALIZED_DIR = ""  # '' to disable, e.g. "data/AOI/normalized"
+
+# HTTP archive settings
+# In 'record' mode, every Baidu API response is saved into HTTP_ARCHIVE_PATH (sqlite),
+# in 'replay' mode, the spider is served entirely from that archive without network,
+# e.g. to reproduce a crawl, or to measure parsing and ranking speed alone.
+HTTP_ARCHIVE_MODE = ""  # '' to disable, 'record' or 'replay'
+HTTP_ARCHIVE_PATH = "data/AOI/archive.sqlite"
+
+# Negative cache settings
+# Uid searches without any valid uid ('no_uid') and uids without geometry
+# ('no_geometry') are recorded into NEGATIVE_CACHE_PATH (sqlite), and skipped
+# when re-crawling until they expire, unless NEGATIVE_CACHE_FORCE is on.
+NEGATIVE_CACHE_PATH = ""  # '' to disable, e.g. "data/AOI/negative_cache.sqlite"
+NEGATIVE_CACHE_TTL = {"no_uid": 7, "no_geometry": 30}  # unit: days, 0 to never skip
+NEGATIVE_CACHE_FORCE = False
+
+# Refresh settings
+# Finished POIs are crawled again if their results are older than REFRESH_MAX_AGE days,
+# or if their status is in REFRESH_STATUSES, e.g. ["No Uid", "No Geometry"].
+# Their previous results are kept until they are crawled again, and how many
+# geometries actually changed is logged at the end. With REFRESH_REUSE_SEARCH on,
+# the AOIs of the candidates kept in CANDIDATE_STORE_DIR are requested directly,
+# without searching the uids of these POIs again.
+REFRESH_MAX_AGE = 0  # unit: days, 0 to disable, e.g. 30
+REFRESH_STATUSES = []
+REFRESH_REUSE_SEARCH = False
+
+# Metrics settings
+# Per-stage latency histograms (download, queue wait, parsing, saving, etc.)
+# are always recorded into the Scrapy stats. They can also be pulled
+# in Prometheus text format from http://METRICS_HOST:METRICS_PORT/metrics,
+# and dumped as json to METRICS_DUMP_PATH every METRICS_DUMP_INTERVAL seconds.
+METRICS_HOST = "127.0.0.1"
+METRICS_PORT = 0  # 0 to disable, e.g. 9410
+METRICS_DUMP_PATH = ""  # '' to disable, e.g. "data/AOI/metrics.json"
+METRICS_DUMP_INTERVAL = 60  # unit: seconds
+
+# Control settings
+# A local endpoint at http://CONTROL_HOST:CONTROL_PORT shows the live state of the crawl
+# (GET /state), and tunes it without restarting (POST /settings with a json object of
+# CONCURRENT_REQUESTS, CONCURRENT_REQUESTS_PER_IP, DOWNLOAD_DELAY, UPDATE_INTERVAL,
+# PROXY_ENABLED, AK_LIST or FILTER_RULES), pauses or resumes scheduling
+# (POST /pause, POST /resume), and saves the file at once (POST /checkpoint).
+CONTROL_HOST = "127.0.0.1"
+CONTROL_PORT = 0  # 0 to disable, e.g. 9411
+
+# Profiling settings
+# A sampled fraction of spider callbacks and middleware hooks are profiled,
+# and the profiles are written into PROFILE_DIR at every update, as pstats files
+# (for `python -m pstats` or snakeviz) or collapsed stacks (for flamegraph.pl or speedscope).
+PROFILE_SAMPLE_RATE = 0  # 0 to disable, e.g. 0.05
+PROFILE_FORMAT = "pstats"  # 'pstats' or 'collapsed'
+# Also write the top memory allocators at every update,
+# which traces every allocation and slows down the crawl noticeably
+PROFILE_TRACEMALLOC = False
+PROFILE_DIR = "data/AOI/profile"
+
 # ---------------------- 3. Baidu Map uid API parameters --------------------- #
 
 # Detailed information can be found at:
@@ -106,6 +262,12 @@ FILTER_RULES = {
     "max_aoi_area": 10000,  # Set to a large number to disable, e.g. 10000
     # 2. Lowest name similarity between AOI and POI
     "min_similarity": 0,  # 0 to disable, maximum is 1
+    # 2.1 Name similarity metric: 'sequence' (difflib SequenceMatcher),
+    # 'jaccard' (character bigram Jaccard index) or 'levenshtein' (Levenshtein ratio)
+    "similarity_metric": "sequence",
+    # 2.2 Whether to strip common suffixes like '小区' or '花园' before comparing names
+    # (only for 'jaccard' and 'levenshtein')
+    "strip_suffixes": False,
     # 3. AOI sorting rules, set to 0 to disable
     "sort_by_search_rank": 1,  # the higher the rank, the more relevant, the better
     "sort_by_area": 0,  # 1 for the smaller the better, -1 for the bigger the better
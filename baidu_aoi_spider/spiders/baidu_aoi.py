@@ -6,9 +6,17 @@ from processor import (
     AOIContainer,
     APIHandler,
     Counter,
+    Deduplicator,
     FileOperator,
+    Harvester,
     Logger,
+    Metrics,
+    NegativeCache,
+    Prescreener,
+    Profiler,
+    Refresher,
     Repo,
+    SessionPool,
     Validator,
 )
 
@@ -30,7 +38,20 @@ class BaiduAOISpider(scrapy.Spider):
         return spider
 
     def __init__(self, settings):
-        settings = self.deep_update(settings, self.updating_settings)
+        self.prepare(settings)
+        # counter and AOI container initialization
+        Counter.boot()
+        AOIContainer.mold()
+        NegativeCache.open()
+        SessionPool.open()
+        Profiler.start()
+
+    @classmethod
+    def prepare(cls, settings: dict) -> None:
+        """
+        Import the settings and the POI file, which is shared with offline commands.
+        """
+        settings = cls.deep_update(settings, cls.updating_settings)
         # import and validate settings
         Repo.import_settings(settings)
         Validator.validate_settings()
@@ -40,69 +61,226 @@ class BaiduAOISpider(scrapy.Spider):
         # prepare file for writing
         FileOperator.add_cols()
         FileOperator.convert_crs_to_wgs84()
-        # counter and AOI container initialization
-        Counter.boot()
-        AOIContainer.mold()
+        Deduplicator.group()
+        Refresher.select()
 
     # -------------------------------- main spider ------------------------------- #
 
+    async def start(self):
+        # entry point of Scrapy 2.13+, older versions call start_requests directly
+        for request in self.start_requests():
+            yield request
+
     def start_requests(self):
         Logger.log_start()
         # idx_url_tuples is of the form [(idx1, url1), (idx2, url2), ...]
         idx_url_tuples = APIHandler.assemble_uid_urls()
+        # POIs of dense regions may be harvested by grid cells instead,
+        # the others are taken before any cell gives its POIs back
+        cells = Harvester.plan(idx_url_tuples)
+        idx_url_tuples = [
+            (idx, url) for idx, url in idx_url_tuples if not Harvester.holds(idx)
+        ]
+        for cell in cells:
+            yield self.request_cell(cell, page=0)
+        yield from self.search_pois(idx_url_tuples)
+
+    def search_pois(self, idx_url_tuples: list):
         for idx, url in idx_url_tuples:
-            yield self.request_uid(url, idx=idx)
+            # refreshed POIs may request the uids of their last search directly
+            uid_name_rank_triples = Refresher.cached_search(idx)
+            if uid_name_rank_triples is not None:
+                yield from self.request_candidates(idx, uid_name_rank_triples)
+                yield from self.searched(idx)
+                continue
+            # searches known to return no uid are not sent again
+            if NegativeCache.has_search(url):
+                FileOperator.write_status(idx, "No Uid")
+                Logger.log_progress()
+                yield from self.searched(idx)
+                continue
+            yield self.request_uid(APIHandler.sign(url), idx=idx)
 
+    @Profiler.sampled
     def parse_uid(self, response, idx):
         try:
             self.check_retry_times(response)
             # uid_name_rank_triples is of the form:
             # [(uid_name1, uid1, search_rank1), (uid_name2, uid2, search_rank2), ...]
-            uid_name_rank_triples = APIHandler.extract_uid_name_rank(idx, response)
-            if uid_name_rank_triples:
-                # record how many uids are available for this POI
-                Counter.write_aoi_total_num(idx, len(uid_name_rank_triples))
-                # if `USE_FIRST_UID` is on, only the first search result will be requested
-                for uid_name, uid, rank in uid_name_rank_triples:
-                    url = APIHandler.assemble_aoi_url(uid)
-                    yield self.request_aoi(url, idx=idx, uid_name=uid_name, rank=rank)
-            else:
+            with Metrics.timer("parse_uid", cpu=True):
+                uid_name_rank_triples = APIHandler.extract_uid_name_rank(idx, response)
+            if not uid_name_rank_triples:
                 # no uid found, skip this POI
-                Repo.file.loc[idx, "status"] = "No Uid"
+                NegativeCache.add_search(response.url)
+                FileOperator.write_status(idx, "No Uid")
                 Logger.log_progress()
+                return
+            yield from self.request_candidates(idx, uid_name_rank_triples)
         except Exception as e:
             Logger.log_uid_fail(e, idx)
+        finally:
+            yield from self.searched(idx)
+
+    def request_candidates(self, idx: int, uid_name_rank_triples: list):
+        # uids known to have no geometry are not requested again
+        uid_name_rank_triples = NegativeCache.filter_uids(uid_name_rank_triples)
+        # nor the AOIs already tried for it in its grid cell
+        uid_name_rank_triples = Harvester.untried(idx, uid_name_rank_triples)
+        if uid_name_rank_triples:
+            # record how many uids are available for this POI
+            Counter.write_aoi_total_num(idx, len(uid_name_rank_triples))
+            # if `USE_FIRST_UID` is on, only the first search result will be requested
+            # if `DECISIVE_MATCH` is on, the first one may be requested alone first
+            uid_name_rank_triples = AOIContainer.defer(idx, uid_name_rank_triples)
+            yield from self.request_aois(idx, uid_name_rank_triples)
+        else:
+            FileOperator.write_status(idx, "No Geometry")
+            Logger.log_progress()
 
-    def parse_aoi(self, response, idx, uid_name, rank):
+    @Profiler.sampled
+    def parse_aoi(self, response, idx, uid, uid_name, rank):
         try:
             self.check_retry_times(response)
-            geometry = APIHandler.get_polygon_geometry(response)
+            with Metrics.timer("parse_aoi", cpu=True):
+                coords = APIHandler.get_polygon_coords(response)
             # if geometry exists and is valid,
             # append it to the AOI list of this POI
-            if geometry:
-                AOIContainer.append(idx, rank, uid_name, geometry)
+            if coords is not None:
+                with Metrics.timer("aoi_append", cpu=True):
+                    AOIContainer.append(idx, rank, uid, uid_name, coords)
+            else:
+                NegativeCache.add_uid(uid)
         except Exception as e:
             Logger.log_aoi_fail(e, idx, uid_name)
         finally:
             # count that one AOI of this POI is called
             Counter.count_aoi_called(idx)
-            # if all AOIs of this POI are called,
+            # if all AOIs of this POI are called, or one of them is decisive,
             # find the best AOI and record it if exists
-            if Counter.all_aoi_called(idx):
+            if Counter.all_aoi_called(idx) or AOIContainer.has_decisive_aoi(idx):
                 best_aoi = AOIContainer.get_best_aoi(idx)
+                Prescreener.audit(idx, best_aoi.uid if best_aoi else None)
                 if best_aoi:
                     FileOperator.write_aoi_and_status(idx, best_aoi)
                 else:
-                    Repo.file.loc[idx, "status"] = "No Geometry"
+                    FileOperator.write_status(idx, "No Geometry")
+                # the deferred AOIs dropped are not counted as requested
+                Counter.settle_aoi_total_num(idx)
+                AOIContainer.release(idx)
                 Logger.log_progress()
+            else:
+                # the AOIs deferred after a first AOI that is not decisive
+                yield from self.request_aois(idx, AOIContainer.resume(idx))
+            # update file periodically
+            if Counter.reach_update_interval():
+                FileOperator.save_file()
+                Profiler.dump()
+                Logger.log_update()
+
+    # ------------------------------ grid harvesting ----------------------------- #
+
+    @Profiler.sampled
+    def parse_cell(self, response, cell, page):
+        # the other pages of a cell given up are ignored
+        if not Harvester.active(cell):
+            return
+        try:
+            self.check_retry_times(response)
+            with Metrics.timer("parse_uid", cpu=True):
+                Harvester.add_page(cell, page, response)
+        except Exception as e:
+            Logger.log_cell_fail(e, cell)
+            yield from self.search_pois(Harvester.release(cell))
+            return
+        if page == 0:
+            yield from self.decide_cell(cell)
+        elif Harvester.all_pages_received(cell):
+            yield from self.harvest_cell(cell)
+
+    def decide_cell(self, cell: int):
+        decision = Harvester.decide(cell)
+        if decision == "split":
+            cells, idx_url_tuples = Harvester.split(cell)
+            for quarter in cells:
+                yield self.request_cell(quarter, page=0)
+            yield from self.search_pois(idx_url_tuples)
+            return
+        elif decision == "search":
+            yield from self.search_pois(Harvester.release(cell))
+            return
+        elif decision == "wait":
+            # decided again once enough POIs are searched one by one,
+            # or once no more will be, e.g. if it is the last cell crawled
+            yield from self.decide_waiting()
+            return
+        for next_page in range(1, Harvester.pages(cell)):
+            yield self.request_cell(cell, page=next_page)
+        if Harvester.all_pages_received(cell):
+            yield from self.harvest_cell(cell)
+
+    def harvest_cell(self, cell: int):
+        uid_name_rank_triples = Harvester.candidates(cell)
+        for uid_name, uid, _ in uid_name_rank_triples:
+            url = APIHandler.assemble_aoi_url(uid)
+            yield self.request_cell_aoi(url, cell=cell, uid=uid, uid_name=uid_name)
+        if not uid_name_rank_triples:
+            yield from self.finish_cell(cell)
+
+    @Profiler.sampled
+    def parse_cell_aoi(self, response, cell, uid, uid_name):
+        coords = None
+        try:
+            self.check_retry_times(response)
+            with Metrics.timer("parse_aoi", cpu=True):
+                coords = APIHandler.get_polygon_coords(response)
+            if coords is None:
+                NegativeCache.add_uid(uid)
+        except Exception as e:
+            Logger.log_cell_aoi_fail(e, cell, uid_name)
+        finally:
+            Counter.count_cell_aoi_called()
+            # once all AOIs of the cell are called, match its POIs to them
+            if Harvester.add_geometry(cell, uid, coords):
+                yield from self.finish_cell(cell)
             # update file periodically
             if Counter.reach_update_interval():
                 FileOperator.save_file()
+                Profiler.dump()
                 Logger.log_update()
 
+    def searched(self, idx: int):
+        # the POIs searched one by one tell what harvesting a cell saves
+        Harvester.searched(idx)
+        yield from self.decide_waiting()
+
+    def decide_waiting(self):
+        for cell in Harvester.waiting():
+            yield from self.decide_cell(cell)
+
+    def finish_cell(self, cell: int):
+        with Metrics.timer("aoi_append", cpu=True):
+            matched, idx_url_tuples = Harvester.match(cell)
+        for idx, best_aoi in matched:
+            FileOperator.write_aoi_and_status(idx, best_aoi)
+            AOIContainer.release(idx)
+        Logger.log_progress()
+        # the POIs without a valid AOI in the cell are searched one by one
+        yield from self.search_pois(idx_url_tuples)
+        yield from self.decide_waiting()
+
+    def request_failed(self, failure):
+        # POIs and cells wait for all their responses, so failed requests,
+        # e.g. given up retrying or not archived, are passed on to the callback too
+        request = failure.request
+        message = f"Gave up retrying {request} ({failure.value!r})"
+        yield from request.callback(message, **request.cb_kwargs)
+
     def close_spider(self):
         Logger.log_finish()
         FileOperator.save_file()
+        NegativeCache.close()
+        Profiler.dump()
+        Profiler.stop()
 
     # ---------------------------------- utility --------------------------------- #
 
@@ -110,8 +288,9 @@ class BaiduAOISpider(scrapy.Spider):
         return scrapy.Request(
             url=url,
             **kwargs,
+            errback=self.request_failed,
             dont_filter=True,
-            meta={"proxy_enabled": Repo._proxy_enabled}
+            meta={"proxy_enabled": Repo._proxy_enabled},
         )
 
     def request_uid(self, url: str, **kwargs) -> Request:
@@ -122,6 +301,11 @@ class BaiduAOISpider(scrapy.Spider):
         )
         return self.request(url, **params)
 
+    def request_aois(self, idx: int, uid_name_rank_triples: list):
+        for uid_name, uid, rank in uid_name_rank_triples:
+            url = APIHandler.assemble_aoi_url(uid)
+            yield self.request_aoi(url, idx=idx, uid=uid, uid_name=uid_name, rank=rank)
+
     def request_aoi(self, url: str, **kwargs) -> Request:
         params = dict(
             callback=self.parse_aoi,
@@ -130,16 +314,33 @@ class BaiduAOISpider(scrapy.Spider):
         )
         return self.request(url, **params)
 
+    def request_cell(self, cell: int, page: int) -> Request:
+        params = dict(
+            callback=self.parse_cell,
+            headers={"Host": "api.map.baidu.com"},
+            cb_kwargs=dict(cell=cell, page=page),
+        )
+        return self.request(APIHandler.sign(Harvester.url(cell, page)), **params)
+
+    def request_cell_aoi(self, url: str, **kwargs) -> Request:
+        params = dict(
+            callback=self.parse_cell_aoi,
+            headers={"Host": "map.baidu.com"},
+            cb_kwargs=dict(**kwargs),
+        )
+        return self.request(url, **params)
+
     def check_retry_times(self, response) -> None:
         if isinstance(response, str):
             if response.startswith("Gave up retrying"):
                 raise Exception(response)
 
-    def deep_update(self, base_dict: dict, updating_dict: dict) -> dict:
+    @classmethod
+    def deep_update(cls, base_dict: dict, updating_dict: dict) -> dict:
         updated_dict = base_dict.copy()
         for k, v in updating_dict.items():
             if isinstance(v, dict):
-                updated_dict[k] = self.deep_update(updated_dict.get(k, {}), v)
+                updated_dict[k] = cls.deep_update(updated_dict.get(k, {}), v)
             else:
                 updated_dict[k] = v
         return updated_dict
@@ -0,0 +1,212 @@
+"""
+End-to-end crawl benchmark against the local mock Baidu server.
+
+The example POIs in `data/POI_example1.csv` are tiled (with jittered coordinates)
+to the requested number of rows, the spider crawls them from a mock server started
+in a subprocess, and the following figures are reported:
+    - POIs/s: POIs finished per second of wall time
+    - API calls/POI: search and AOI requests (including retries) per POI
+    - Retries/POI: retried requests per POI, e.g. of blocked visitors
+    - CPU ms/POI: user + system CPU time of the crawling process per POI
+    - Peak RSS: maximum resident set size of the crawling process
+    - Checkpoint: number and total time of `FileOperator.save_file` calls
+
+With `--archive record`, the responses are also recorded into an `HttpArchive`,
+which `--archive replay` serves without the mock server, so that parsing and
+ranking throughput can be measured in isolation from the network.
+
+With `--engine asyncio`, the spider runs on `AsyncEngine` instead of Scrapy,
+to compare the two runtimes on the same POIs and server. With `--session-pool`,
+requests are sent by that many sticky sessions (`SESSION_POOL_SIZE`), which is
+best compared under the visitor blocking of the mock server. With
+`--grid-cell-size`, dense regions are harvested by grid cells (`GRID_CELL_SIZE`),
+which needs an industry category (`--industry`) to search them by, and the mock
+server serves area searches of the POI file, best compared where nearby POIs
+share their AOIs (`--share-distance`).
+
+Usage (from the project root):
+    python -m benchmarks.crawl --rows 100000 --latency 0.02 --json bench.json
+    python -m benchmarks.crawl --rows 10000 --archive record --archive-path a.sqlite
+    python -m benchmarks.crawl --rows 10000 --archive replay --archive-path a.sqlite
+    python -m benchmarks.crawl --rows 10000 --engine asyncio
+    python -m benchmarks.crawl --rows 10000 --fresh-block-rate 0.05 --session-pool 20
+    python -m benchmarks.crawl --rows 10000 --industry 住宅区 --grid-cell-size 1000
+    python -m benchmarks.crawl --rows 2000 --industry 住宅区 --grid-cell-size 1000 \
+        --share-distance 600
+"""
+
+import argparse
+import json
+import os
+import resource
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+import scrapy
+from scrapy.crawler import CrawlerProcess
+from scrapy.utils.log import configure_logging
+from scrapy.utils.project import get_project_settings
+
+from baidu_aoi_spider.engine import AsyncEngine
+from baidu_aoi_spider.spiders.baidu_aoi import BaiduAOISpider
+from benchmarks import mock_baidu
+from processor import FileOperator, ResultStore
+
+
+def make_poi_file(rows: int, path: str, seed: int = 0) -> None:
+    """
+    Tile the example POIs to `rows` rows, jittering coordinates by up to ~1 km
+    so that every row issues a distinct query.
+    """
+    example = pd.read_csv("data/POI_example1.csv")[["name", "lng", "lat"]]
+    df = example.iloc[np.arange(rows) % len(example)].reset_index(drop=True)
+    rng = np.random.default_rng(seed)
+    df["lng"] += rng.uniform(-0.01, 0.01, rows)
+    df["lat"] += rng.uniform(-0.01, 0.01, rows)
+    df.to_csv(path, index=False)
+
+
+def start_mock_server(args: argparse.Namespace) -> subprocess.Popen:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        args.port = sock.getsockname()[1]
+    cmd = [sys.executable, "-m", "benchmarks.mock_baidu", "--port", str(args.port)]
+    for option in (
+        "latency",
+        "error_rate",
+        "qps",
+        "candidates",
+        "no_uid_rate",
+        "no_geo_rate",
+        "fresh_block_rate",
+        "visitor_qps",
+        "world",
+        "share_distance",
+    ):
+        cmd += [f"--{option.replace('_', '-')}", str(getattr(args, option))]
+    server = subprocess.Popen(cmd, stdout=subprocess.PIPE, text=True)
+    server.stdout.readline()  # wait until it is listening
+    return server
+
+
+def timed_checkpoints(records: list) -> None:
+    """
+    Wrap `FileOperator.save_file` to record the time of every checkpoint.
+    """
+    save_file = FileOperator.save_file
+
+    def wrapper(*args, **kwargs):
+        start = time.perf_counter()
+        save_file(*args, **kwargs)
+        records.append(time.perf_counter() - start)
+
+    FileOperator.save_file = wrapper
+
+
+def run(args: argparse.Namespace) -> dict:
+    tmp = tempfile.mkdtemp(prefix="bench_crawl_")
+    make_poi_file(args.rows, os.path.join(tmp, "POI.csv"))
+    if args.grid_cell_size:
+        args.world = os.path.join(tmp, "POI.csv")
+    settings = get_project_settings()
+    # the archive is replayed without any server
+    server = None
+    if args.archive != "replay":
+        server = start_mock_server(args)
+        url = f"http://127.0.0.1:{args.port}"
+        settings.set("BAIDU_SEARCH_URL", f"{url}/place/v2/search", priority="cmdline")
+        settings.set("BAIDU_AOI_URL", f"{url}/", priority="cmdline")
+    settings.setdict(
+        {
+            "POI_CSV_PATH": os.path.join(tmp, "POI.csv"),
+            "AOI_SHP_PATH": os.path.join(tmp, "AOI", "AOI.shp"),
+            "AK_LIST": ["benchmark"],
+            "PROXY_ENABLED": False,
+            "CONCURRENT_REQUESTS": args.concurrency,
+            "CONCURRENT_REQUESTS_PER_IP": args.concurrency,
+            "DOWNLOAD_DELAY": args.download_delay,
+            "SESSION_POOL_SIZE": args.session_pool,
+            "GRID_CELL_SIZE": args.grid_cell_size,
+            "API_PARAMS": {**settings.getdict("API_PARAMS"), "prim_ind": args.industry},
+            "LOG_LEVEL": args.log_level,
+            "HTTP_ARCHIVE_MODE": args.archive,
+            "HTTP_ARCHIVE_PATH": os.path.abspath(args.archive_path),
+        },
+        priority="cmdline",
+    )
+    checkpoints = []
+    timed_checkpoints(checkpoints)
+    try:
+        if args.engine == "asyncio":
+            configure_logging(settings)
+            engine = AsyncEngine(BaiduAOISpider, settings)
+        else:
+            process = CrawlerProcess(settings)
+            crawler = process.create_crawler(BaiduAOISpider)
+        usage = resource.getrusage(resource.RUSAGE_SELF)
+        start = time.perf_counter()
+        if args.engine == "asyncio":
+            engine.run()
+        else:
+            process.crawl(crawler)
+            process.start()
+        wall = time.perf_counter() - start
+        end_usage = resource.getrusage(resource.RUSAGE_SELF)
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+    stats = engine.stats if args.engine == "asyncio" else crawler.stats.get_stats()
+    pois = int(ResultStore.finished().sum())
+    cpu = (end_usage.ru_utime - usage.ru_utime) + (end_usage.ru_stime - usage.ru_stime)
+    return {
+        "engine": args.engine,
+        "scrapy": scrapy.__version__,
+        "rows": args.rows,
+        "pois_finished": pois,
+        "pois_matched": ResultStore.count("Matched"),
+        "wall_s": round(wall, 3),
+        "pois_per_s": round(pois / wall, 2),
+        "api_calls_per_poi": round(
+            stats.get("downloader/request_count", 0) / max(pois, 1), 3
+        ),
+        "retries": stats.get("retry/count", 0),
+        "retries_per_poi": round(stats.get("retry/count", 0) / max(pois, 1), 3),
+        "cpu_ms_per_poi": round(cpu / max(pois, 1) * 1000, 3),
+        "peak_rss_mb": round(end_usage.ru_maxrss / 1024, 1),  # KiB on Linux
+        "checkpoints": len(checkpoints),
+        "checkpoint_s": round(sum(checkpoints), 3),
+        "output_dir": tmp,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rows", type=int, default=100000)
+    parser.add_argument("--concurrency", type=int, default=25)
+    parser.add_argument("--download-delay", type=float, default=0)
+    parser.add_argument("--log-level", default="ERROR")
+    parser.add_argument("--json", help="also write the report to this file")
+    parser.add_argument("--archive", choices=["", "record", "replay"], default="")
+    parser.add_argument("--archive-path", default="bench_archive.sqlite")
+    parser.add_argument("--session-pool", type=int, default=0, help="0 to disable")
+    parser.add_argument("--engine", choices=["scrapy", "asyncio"], default="scrapy")
+    parser.add_argument("--industry", default="", help="prim_ind of API_PARAMS")
+    parser.add_argument("--grid-cell-size", type=float, default=0, help="0 to disable")
+    mock_baidu.add_arguments(parser)
+    args = parser.parse_args()
+    report = run(args)
+    for key, value in report.items():
+        print(f"{key:>20}: {value}")
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,325 @@
+"""
+Micro-benchmarks of the per-vertex and per-candidate hot paths.
+
+Every case is run on fixed, seeded fixtures at several sizes, and the best
+time per call is reported. Results are written as JSON, and compared against
+a stored baseline: cases slower than the baseline by more than `--threshold`
+are flagged, and the exit code is 1 if any.
+
+Usage (from the project root):
+    python -m benchmarks.micro                      # compare with baseline.json
+    python -m benchmarks.micro --update-baseline    # store a new baseline
+    python -m benchmarks.micro --filter coords --output results.json
+"""
+
+import argparse
+import itertools
+import json
+import logging
+import math
+import os
+import platform
+import sys
+import tempfile
+import time
+import timeit
+from typing import Callable, Dict, List
+
+import numpy as np
+import pandas as pd
+import shapely
+from scrapy.http import TextResponse
+from scrapy.utils.project import get_project_settings
+
+from baidu_aoi_spider.spiders.baidu_aoi import BaiduAOISpider
+from benchmarks.crawl import make_poi_file
+from benchmarks.mock_baidu import bd09ll_to_bd09mc
+from processor import APIHandler, FileOperator, Normalizer, Repo, ResultStore
+from processor.aoi_container import AOI, AOI_list
+from spatial.coords import (
+    bd09mc_to_wgs84,
+    bd09mc_to_wgs84_array,
+    cal_distance,
+    wgs84_to_bd09ll,
+)
+from spatial.geometry import points_to_polygon, wgs84_to_wgs84utm50n
+
+BASELINE = os.path.join(os.path.dirname(__file__), "baseline.json")
+CENTER = (116.310, 39.990)  # wgs84, Peking University
+
+# ---------------------------------- fixtures --------------------------------- #
+
+
+def ring(n: int, radius: float = 0.005, center: tuple = CENTER) -> np.ndarray:
+    """
+    A closed `n`-vertex ring of `(lng, lat)` around `center`, in wgs84 CRS.
+    """
+    angle = np.linspace(0, 2 * math.pi, n, endpoint=False)
+    coords = np.column_stack(
+        [center[0] + radius * np.cos(angle), center[1] + radius * np.sin(angle)]
+    )
+    return np.vstack([coords, coords[:1]])
+
+
+def mc_vertices(n: int) -> np.ndarray:
+    """
+    `n` vertices of a ring in bd09mc CRS, as returned by the `qt=ext` API.
+    """
+    return np.array([bd09ll_to_bd09mc(*wgs84_to_bd09ll(*xy)) for xy in ring(n)[:-1]])
+
+
+def ext_response(n: int) -> TextResponse:
+    xys = mc_vertices(n)
+    xys = np.vstack([xys, xys[:1]])
+    geo = "4|0,0;0,0|1-" + ",".join(f"{x:.6f},{y:.6f}" for x, y in xys) + ";"
+    body = json.dumps({"content": {"geo": geo, "uid": "0" * 24}})
+    return TextResponse("http://127.0.0.1/", body=body, encoding="utf-8")
+
+
+def search_response(n: int) -> TextResponse:
+    rng = np.random.default_rng(n)
+    lng, lat = Repo.file.loc[0, "lng_wgs84"], Repo.file.loc[0, "lat_wgs84"]
+    results = []
+    for rank in range(n):
+        u_lng, u_lat = wgs84_to_bd09ll(
+            *(np.array([lng, lat]) + rng.uniform(-0.01, 0.01, 2))
+        )
+        results.append(
+            {
+                "name": f"{Repo.file.loc[0, 'name']}{rank}",
+                "location": {"lat": u_lat, "lng": u_lng},
+                "uid": f"{rank:024x}",
+                "detail_info": {},
+            }
+        )
+    body = json.dumps({"status": 0, "message": "ok", "results": results})
+    return TextResponse("http://127.0.0.1/", body=body, encoding="utf-8")
+
+
+def aoi_list(n: int) -> AOI_list:
+    rng = np.random.default_rng(n)
+    aois = AOI_list(0)
+    for rank in range(n):
+        aoi = AOI(rank + 1, f"{rank:024x}", f"{aois.poi_name}{rank}", ring(16))
+        aoi.distance = rng.uniform(0, 500)
+        aoi.similarity = rng.uniform(0, 1)
+        aois.aoi_list.append(aoi)
+    return aois
+
+
+def matched_file(rows: int, path: str) -> pd.DataFrame:
+    """
+    A POI file of `rows` rows whose every other POI is matched to a 16-vertex AOI.
+    """
+    make_poi_file(rows, os.path.join(path, "POI.csv"))
+    df = pd.read_csv(os.path.join(path, "POI.csv"))
+    df["lng_wgs84"], df["lat_wgs84"] = df["lng"], df["lat"]
+    df["status"] = np.where(np.arange(rows) % 2 == 0, "Matched", "No Uid")
+    df["uid_name"] = np.where(df["status"] == "Matched", df["name"], None)
+    df["geometry"] = [
+        points_to_polygon(ring(16, center=(lng, lat))) if status == "Matched" else None
+        for lng, lat, status in zip(df["lng"], df["lat"], df["status"])
+    ]
+    df["crawled_at"], df["geom_hash"] = None, None
+    df["uid"] = [
+        f"{i:024x}" if status == "Matched" else None
+        for i, status in enumerate(df["status"])
+    ]
+    return df
+
+
+# ----------------------------------- cases ----------------------------------- #
+
+
+def case_bd09mc_to_wgs84(n: int) -> Callable:
+    xs, ys = mc_vertices(n).T.tolist()
+    return lambda: [bd09mc_to_wgs84(x, y) for x, y in zip(xs, ys)]
+
+
+def case_bd09mc_to_wgs84_array(n: int) -> Callable:
+    xs, ys = mc_vertices(n).T
+    return lambda: bd09mc_to_wgs84_array(xs, ys)
+
+
+def case_cal_distance(n: int) -> Callable:
+    a, b = ring(n)[:-1].tolist(), ring(n, radius=0.01)[:-1].tolist()
+    return lambda: [cal_distance(*p, *q) for p, q in zip(a, b)]
+
+
+def case_wgs84_to_wgs84utm50n(n: int) -> Callable:
+    polygon = points_to_polygon(ring(n))
+    return lambda: wgs84_to_wgs84utm50n(polygon)
+
+
+def case_get_polygon_geometry(n: int) -> Callable:
+    response = ext_response(n)
+    return lambda: APIHandler.get_polygon_geometry(response)
+
+
+def case_extract_uid_name_rank(n: int) -> Callable:
+    response = search_response(n)
+    return lambda: APIHandler.extract_uid_name_rank(0, response)
+
+
+def case_weighted_rank(n: int) -> Callable:
+    aois = aoi_list(n)
+    return aois._weighted_rank
+
+
+def case_write_aoi_and_status(n: int) -> Callable:
+    Repo.file = matched_file(n, tempfile.mkdtemp(prefix="bench_micro_"))
+    ResultStore.load()
+    best_aoi = aoi_list(1).aoi_list[0]
+    idx = itertools.cycle(range(n))
+    return lambda: FileOperator.write_aoi_and_status(next(idx), best_aoi)
+
+
+def case_save_file(n: int) -> Callable:
+    Repo.file = matched_file(n, tempfile.mkdtemp(prefix="bench_micro_"))
+    ResultStore.load()
+    return FileOperator.save_file
+
+
+def case_save_file_normalized(n: int) -> Callable:
+    """
+    Saves after the first one, when all AOIs are already in the AOI table.
+    """
+    workdir = tempfile.mkdtemp(prefix="bench_micro_")
+    Repo.file = matched_file(n, workdir)
+    ResultStore.load()
+
+    def save() -> None:
+        Repo._output_normalized_dir = os.path.join(workdir, "normalized")
+        try:
+            FileOperator.save_file()
+        finally:
+            Repo._output_normalized_dir = ""
+
+    Repo._output_normalized_dir = os.path.join(workdir, "normalized")
+    Normalizer.open()
+    save()
+    return save
+
+
+CASES = {
+    # name: (function, sizes)
+    "coords.bd09mc_to_wgs84": (case_bd09mc_to_wgs84, [100, 1000, 10000]),
+    "coords.bd09mc_to_wgs84_array": (case_bd09mc_to_wgs84_array, [100, 1000, 10000]),
+    "coords.cal_distance": (case_cal_distance, [100, 1000, 10000]),
+    "geometry.wgs84_to_wgs84utm50n": (case_wgs84_to_wgs84utm50n, [10, 100, 1000]),
+    "APIHandler.get_polygon_geometry": (case_get_polygon_geometry, [10, 100, 1000]),
+    "APIHandler.extract_uid_name_rank": (case_extract_uid_name_rank, [1, 10, 50]),
+    "AOI_list._weighted_rank": (case_weighted_rank, [2, 10, 100]),
+    "FileOperator.write_aoi_and_status": (case_write_aoi_and_status, [1000, 100000]),
+    "FileOperator.save_file": (case_save_file, [1000, 10000]),
+    "FileOperator.save_file(normalized)": (case_save_file_normalized, [1000, 10000]),
+}
+
+# ---------------------------------- running ---------------------------------- #
+
+
+def prepare(workdir: str) -> None:
+    """
+    Import the project settings and a small POI file, as the spider does.
+    """
+    make_poi_file(100, os.path.join(workdir, "POI.csv"))
+    settings = get_project_settings().copy_to_dict()
+    settings.update(
+        POI_CSV_PATH=os.path.join(workdir, "POI.csv"),
+        AOI_SHP_PATH=os.path.join(workdir, "AOI", "AOI.shp"),
+        CANDIDATE_STORE_DIR="",
+        AK_LIST=["benchmark"],
+    )
+    BaiduAOISpider.prepare(settings)
+
+
+def measure(func: Callable, repeat: int) -> float:
+    """
+    Best time per call, in seconds, of `repeat` runs of at least 0.2 s each.
+    """
+    timer = timeit.Timer(func)
+    number, _ = timer.autorange()
+    return min(timer.repeat(repeat=repeat, number=number)) / number
+
+
+def run(name_filter: str, repeat: int) -> Dict[str, float]:
+    results = {}
+    file = Repo.file
+    for name, (case, sizes) in CASES.items():
+        if name_filter not in name:
+            continue
+        for size in sizes:
+            key = f"{name}[{size}]"
+            results[key] = measure(case(size), repeat)
+            print(f"{key:<45} {results[key] * 1e6:>14.2f} us", flush=True)
+        Repo.file = file
+    return results
+
+
+def compare(results: Dict[str, float], baseline: dict, threshold: float) -> List[str]:
+    """
+    Print the ratio to the baseline of every case, and return the slowed down ones.
+    """
+    slowdowns = []
+    print(f"\n{'case':<45} {'baseline us':>14} {'now us':>14} {'ratio':>7}")
+    for key, seconds in results.items():
+        base = baseline["results"].get(key)
+        if base is None:
+            continue
+        ratio = seconds / base
+        flag = ""
+        if ratio > 1 + threshold:
+            slowdowns.append(key)
+            flag = "  SLOWER"
+        print(
+            f"{key:<45} {base * 1e6:>14.2f} {seconds * 1e6:>14.2f} {ratio:>7.2f}{flag}"
+        )
+    return slowdowns
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--filter", default="", help="only run matching cases")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--output", help="write the results to this file")
+    parser.add_argument("--baseline", default=BASELINE)
+    parser.add_argument("--update-baseline", action="store_true")
+    parser.add_argument(
+        "--threshold", type=float, default=0.2, help="tolerated slowdown ratio"
+    )
+    args = parser.parse_args()
+    logging.getLogger().setLevel(logging.ERROR)
+    prepare(tempfile.mkdtemp(prefix="bench_micro_"))
+    report = {
+        "meta": {
+            "date": time.strftime("%Y-%m-%d %H:%M:%S"),
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "pandas": pd.__version__,
+            "shapely": shapely.__version__,
+            "machine": platform.platform(),
+        },
+        "results": run(args.filter, args.repeat),
+    }
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    if args.update_baseline:
+        if os.path.exists(args.baseline):
+            with open(args.baseline) as f:
+                # keep the cases that are filtered out this time
+                report["results"] = {**json.load(f)["results"], **report["results"]}
+        with open(args.baseline, "w") as f:
+            json.dump(report, f, indent=2)
+    elif os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            slowdowns = compare(report["results"], json.load(f), args.threshold)
+        if slowdowns:
+            print(
+                f"\n{len(slowdowns)} case(s) slower than baseline by >{args.threshold:.0%}"
+            )
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
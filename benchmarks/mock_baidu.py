@@ -0,0 +1,315 @@
+"""
+A local stand-in of the Baidu `place/v2/search` and `qt=ext` APIs for benchmarks.
+
+Responses are synthetic but deterministic for the same query and location:
+every POI gets a few candidate uids around it, and every uid gets a square
+polygon (in bd09mc CRS) around its location. The polygon is encoded in the uid,
+so that uids found by an earlier run (e.g. cached searches when refreshing)
+are served as well. Latency, error rate, throttling
+and the blocking of visitors are configurable, so that the spider can be run
+end-to-end offline.
+
+With `--world`, the POIs of a csv (`name`, `lng`, `lat` in wgs84 CRS) make up
+a world, whose candidate uids are also served by area searches (`bounds`),
+paged by `page_size` and `page_num` up to 150 results, for grid harvesting.
+With `--share-distance`, the POIs of the same name within about that many meters
+share their candidates, as the buildings of a residential compound share its AOI,
+which is where harvesting a dense region takes fewer calls than searching its POIs.
+
+Visitors are told apart by their `BAIDUID` cookie. A new visitor is challenged,
+i.e. blocked for good with a 302, with a probability of `--fresh-block-rate`,
+and so is a known visitor coming back with another user-agent, or sending more
+than `--visitor-qps` requests per second.
+
+Usage:
+    python -m benchmarks.mock_baidu --port 8000 --latency 0.05 --error-rate 0.01
+"""
+
+import argparse
+import csv
+import json
+import random
+import threading
+import time
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Tuple
+from urllib.parse import parse_qs, urlparse
+
+from spatial.coords import (
+    MC2LL,
+    MC_BAND,
+    bd09ll_to_wgs84,
+    bd09mc_to_bd09ll,
+    wgs84_to_bd09ll,
+)
+
+
+def bd09ll_to_bd09mc(lng: float, lat: float) -> Tuple[float, float]:
+    """
+    Inverse of `bd09mc_to_bd09ll`, solved by bisection since `y` is monotonic in `lat`.
+    """
+    low, high = MC_BAND[-1], MC_BAND[0] * 1.5
+    for _ in range(60):
+        y = (low + high) / 2
+        if bd09mc_to_bd09ll(0, y)[1] < lat:
+            low = y
+        else:
+            high = y
+    cF = next(MC2LL[i] for i in range(len(MC_BAND)) if y > MC_BAND[i])
+    return (lng - cF[0]) / cF[1], y
+
+
+class MockBaidu(object):
+    """
+    State and behaviour of the stand-in server, shared by all handler threads.
+    """
+
+    def __init__(
+        self,
+        latency: float = 0.0,
+        error_rate: float = 0.0,
+        qps: int = 0,
+        candidates: int = 5,
+        no_uid_rate: float = 0.05,
+        no_geo_rate: float = 0.1,
+        fresh_block_rate: float = 0.0,
+        visitor_qps: int = 0,
+        world: str = "",
+        share_distance: float = 0.0,
+    ) -> None:
+        self.latency = latency
+        self.error_rate = error_rate
+        self.qps = qps
+        self.candidates = candidates
+        self.no_uid_rate = no_uid_rate
+        self.no_geo_rate = no_geo_rate
+        self.fresh_block_rate = fresh_block_rate
+        self.visitor_qps = visitor_qps
+        self.share_distance = share_distance
+        # user-agent, whether blocked, and request window of every visitor
+        self.visitors: Dict[str, list] = {}
+        self.counts = {"search": 0, "ext": 0, "error": 0, "throttled": 0, "blocked": 0}
+        self._window = (0, 0)  # (second, requests in that second)
+        self._lock = threading.Lock()
+        # (wgs84 lng, wgs84 lat, result) of every candidate uid of the world
+        self.places = []
+        if world:
+            with open(world, encoding="utf-8") as f:
+                for row in csv.DictReader(f):
+                    lng, lat = float(row["lng"]), float(row["lat"])
+                    query = {"query": row["name"], "location": f"{lat},{lng}"}
+                    for result in self.search(query)["results"]:
+                        self.places.append((*self._uid_location(result), result))
+
+    def handle(
+        self, path: str, query: Dict[str, str], cookie: str = "", user_agent: str = ""
+    ) -> Tuple[int, bytes]:
+        if self.latency:
+            time.sleep(random.expovariate(1 / self.latency))
+        if path == "/verify":
+            return 200, b"<html>verify</html>"
+        with self._lock:
+            if self._throttled():
+                self.counts["throttled"] += 1
+                return 403, b"Forbidden"
+            if self._blocked(cookie, user_agent):
+                self.counts["blocked"] += 1
+                return 302, b"Found"
+            if random.random() < self.error_rate:
+                self.counts["error"] += 1
+                return 503, b"Service Unavailable"
+        if path.endswith("/place/v2/search"):
+            self.counts["search"] += 1
+            body = self.area_search(query) if "bounds" in query else self.search(query)
+        elif query.get("qt") == "ext":
+            self.counts["ext"] += 1
+            body = self.ext(query.get("uid", ""))
+        else:
+            return 404, b"Not Found"
+        return 200, json.dumps(body, ensure_ascii=False).encode("utf-8")
+
+    def search(self, query: Dict[str, str]) -> dict:
+        name = query.get("query", "")
+        lat, lng = map(float, query.get("location", "0,0").split(","))
+        if self.share_distance:
+            # the same candidates for the POIs of a name in a square of the lattice
+            step = self.share_distance / 111320
+            lat, lng = round(lat / step) * step, round(lng / step) * step
+        rng = random.Random(zlib.crc32(f"{name}|{lat:.6f}|{lng:.6f}".encode()))
+        results = []
+        if rng.random() >= self.no_uid_rate:
+            for rank in range(rng.randint(1, 2 * self.candidates - 1)):
+                # candidates are scattered within ~300 m of the POI
+                u_lng = lng + rng.uniform(-0.003, 0.003)
+                u_lat = lat + rng.uniform(-0.003, 0.003)
+                uid = f"{zlib.crc32(f'{name}|{u_lng}|{u_lat}'.encode()):08x}"
+                uid += f"{rng.getrandbits(64):016x}"
+                # the polygons of the first candidates are large enough to cover the POI
+                half = rng.uniform(3e-3, 5e-3) if rank < 2 else rng.uniform(2e-4, 1e-3)
+                if rng.random() >= self.no_geo_rate:
+                    # location and half side in units of 1e-7 degree
+                    uid += "".join(
+                        f"{round(v * 1e7):08x}" for v in (u_lng, u_lat, half)
+                    )
+                bd_lng, bd_lat = wgs84_to_bd09ll(u_lng, u_lat)
+                results.append(
+                    {
+                        "name": name if rank == 0 else f"{name}{rank}号楼",
+                        "location": {"lat": bd_lat, "lng": bd_lng},
+                        "uid": uid,
+                        "detail_info": {"tag": query.get("tag", "")},
+                    }
+                )
+        return {"status": 0, "message": "ok", "results": results}
+
+    def area_search(self, query: Dict[str, str]) -> dict:
+        lat1, lng1, lat2, lng2 = map(float, query["bounds"].split(","))
+        results, seen = [], set()
+        for lng, lat, result in self.places:
+            if (
+                lng1 <= lng <= lng2
+                and lat1 <= lat <= lat2
+                and result["uid"] not in seen
+            ):
+                seen.add(result["uid"])
+                results.append(dict(result, detail_info={"tag": query.get("tag", "")}))
+        page_size = int(query.get("page_size", 10))
+        start = int(query.get("page_num", 0)) * page_size
+        page = results[:150][start : start + page_size]
+        return {"status": 0, "message": "ok", "total": len(results), "results": page}
+
+    @staticmethod
+    def _uid_location(result: dict) -> Tuple[float, float]:
+        """
+        The wgs84 location of a result, encoded in its uid, or approximated.
+        """
+        uid = result["uid"]
+        if len(uid) == 48:
+            return tuple(int(uid[i : i + 8], 16) / 1e7 for i in (24, 32))
+        location = result["location"]
+        return bd09ll_to_wgs84(location["lng"], location["lat"])
+
+    def ext(self, uid: str) -> dict:
+        if len(uid) != 48:
+            return {"content": {"uid": uid}}
+        lng, lat, half = (int(uid[i : i + 8], 16) / 1e7 for i in range(24, 48, 8))
+        corners = [
+            (lng - half, lat - half),
+            (lng + half, lat - half),
+            (lng + half, lat + half),
+            (lng - half, lat + half),
+            (lng - half, lat - half),
+        ]
+        xys = [bd09ll_to_bd09mc(*wgs84_to_bd09ll(x, y)) for x, y in corners]
+        (x1, y1), (x2, y2) = xys[0], xys[2]
+        ring = ",".join(f"{x:.6f},{y:.6f}" for x, y in xys)
+        return {"content": {"geo": f"4|{x1},{y1};{x2},{y2}|1-{ring};", "uid": uid}}
+
+    def _blocked(self, cookie: str, user_agent: str) -> bool:
+        if not (self.fresh_block_rate or self.visitor_qps):
+            return False
+        second = int(time.time())
+        visitor = self.visitors.get(cookie)
+        if visitor is None:
+            blocked = random.random() < self.fresh_block_rate
+            visitor = self.visitors[cookie] = [user_agent, blocked, (second, 0)]
+        elif visitor[0] != user_agent:
+            visitor[1] = True
+        start, count = visitor[2]
+        count = count + 1 if second == start else 1
+        visitor[2] = (second, count)
+        if self.visitor_qps and count > self.visitor_qps:
+            visitor[1] = True
+        return visitor[1]
+
+    def _throttled(self) -> bool:
+        if not self.qps:
+            return False
+        second = int(time.time())
+        start, count = self._window
+        count = count + 1 if second == start else 1
+        self._window = (second, count)
+        return count > self.qps
+
+
+class MockBaiduServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, port: int, mock: MockBaidu) -> None:
+        super().__init__(("127.0.0.1", port), _Handler)
+        self.mock = mock
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self) -> None:
+        url = urlparse(self.path)
+        query = {k: v[0] for k, v in parse_qs(url.query).items()}
+        cookies = dict(
+            c.strip().partition("=")[::2]
+            for c in self.headers.get("Cookie", "").split(";")
+        )
+        status, body = self.server.mock.handle(
+            url.path,
+            query,
+            cookie=cookies.get("BAIDUID", ""),
+            user_agent=self.headers.get("User-Agent", ""),
+        )
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        if status == 302:
+            # blocked visitors are redirected to a verification page, as by Baidu
+            self.send_header("Location", "/verify")
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format: str, *args) -> None:
+        pass
+
+
+def add_arguments(parser: argparse.ArgumentParser) -> None:
+    group = parser.add_argument_group("mock server")
+    group.add_argument("--latency", type=float, default=0.02, help="mean seconds")
+    group.add_argument("--error-rate", type=float, default=0.0)
+    group.add_argument("--qps", type=int, default=0, help="0 for no throttling")
+    group.add_argument("--candidates", type=int, default=5, help="mean per POI")
+    group.add_argument("--no-uid-rate", type=float, default=0.05)
+    group.add_argument("--no-geo-rate", type=float, default=0.1)
+    group.add_argument("--fresh-block-rate", type=float, default=0.0)
+    group.add_argument("--visitor-qps", type=int, default=0, help="0 for no limit")
+    group.add_argument("--world", default="", help="POI csv of area searches")
+    group.add_argument(
+        "--share-distance", type=float, default=0, help="meters, 0 for no sharing"
+    )
+
+
+def from_arguments(args: argparse.Namespace) -> MockBaidu:
+    return MockBaidu(
+        latency=args.latency,
+        error_rate=args.error_rate,
+        qps=args.qps,
+        candidates=args.candidates,
+        no_uid_rate=args.no_uid_rate,
+        no_geo_rate=args.no_geo_rate,
+        fresh_block_rate=args.fresh_block_rate,
+        visitor_qps=args.visitor_qps,
+        world=args.world,
+        share_distance=args.share_distance,
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--port", type=int, default=8000)
+    add_arguments(parser)
+    args = parser.parse_args()
+    server = MockBaiduServer(args.port, from_arguments(args))
+    print(f"Mock Baidu server listening on {server.url}", flush=True)
+    server.serve_forever()
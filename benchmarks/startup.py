@@ -0,0 +1,90 @@
+"""
+Startup benchmark of the spider package.
+
+Every figure is measured in a fresh interpreter, repeated `--repeat` times,
+and the median is reported in seconds:
+    - import_processor: `import processor`
+    - import_spiders: importing the spider modules, as `scrapy list` does
+    - scrapy_list: wall time of the whole `scrapy list` command
+    - init_total: `prepare`, `Counter.boot` and `AOIContainer.mold` of `example1`
+    - init_step_n: duration of the `(n/6)` initialization step, see `Startup`
+
+Usage (from the project root):
+    python -m benchmarks.startup --repeat 10 --json startup.json
+"""
+
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+import time
+
+IMPORT_SCRIPT = """
+import time
+start = time.perf_counter()
+import {module}
+print(time.perf_counter() - start)
+"""
+
+INIT_SCRIPT = """
+import json, logging, time
+logging.disable(logging.WARNING)
+start = time.perf_counter()
+from scrapy.utils.project import get_project_settings
+from baidu_aoi_spider.spiders.examples import Example1
+from processor import AOIContainer, Counter, Startup
+Example1.prepare(get_project_settings().copy_to_dict())
+Counter.boot()
+AOIContainer.mold()
+durations = {f"init_step_{k}": v for k, v in Startup.durations.items()}
+durations["init_total"] = time.perf_counter() - start
+print(json.dumps(durations))
+"""
+
+
+def run_python(script: str) -> str:
+    return subprocess.run(
+        [sys.executable, "-c", script], check=True, capture_output=True, text=True
+    ).stdout.strip()
+
+
+def measure_once() -> dict:
+    figures = {
+        "import_processor": float(run_python(IMPORT_SCRIPT.format(module="processor"))),
+        "import_spiders": float(
+            run_python(IMPORT_SCRIPT.format(module="baidu_aoi_spider.spiders.examples"))
+        ),
+    }
+    start = time.perf_counter()
+    subprocess.run(
+        [sys.executable, "-m", "scrapy", "list"], check=True, capture_output=True
+    )
+    figures["scrapy_list"] = time.perf_counter() - start
+    figures.update(json.loads(run_python(INIT_SCRIPT)))
+    return figures
+
+
+def run(repeat: int) -> dict:
+    runs = [measure_once() for _ in range(repeat)]
+    return {
+        key: round(statistics.median(figures[key] for figures in runs), 4)
+        for key in runs[0]
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--json", help="also write the report to this file")
+    args = parser.parse_args()
+    report = run(args.repeat)
+    for key, value in report.items():
+        print(f"{key:>20}: {value}")
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
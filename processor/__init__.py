@@ -1,8 +1,47 @@
-# import all modules
-from processor.aoi_container import AOIContainer
-from processor.api_handler import APIHandler
-from processor.counter import Counter
-from processor.file_operator import FileOperator
-from processor.logger import Logger
-from processor.repository import Repo
-from processor.validator import Validator
+# import all modules lazily, i.e. a module is only imported
+# when one of its classes is first accessed (PEP 562)
+import importlib
+
+_modules = {
+    "AOIContainer": "processor.aoi_container",
+    "APIHandler": "processor.api_handler",
+    "CandidateStore": "processor.candidate_store",
+    "Controller": "processor.controller",
+    "Counter": "processor.counter",
+    "Deduplicator": "processor.deduplicator",
+    "Estimator": "processor.estimator",
+    "FileOperator": "processor.file_operator",
+    "Harvester": "processor.harvester",
+    "HttpArchive": "processor.http_archive",
+    "Logger": "processor.logger",
+    "Metrics": "processor.metrics",
+    "NegativeCache": "processor.negative_cache",
+    "Normalizer": "processor.normalizer",
+    "Prescreener": "processor.prescreener",
+    "Profiler": "processor.profiler",
+    "Ranker": "processor.ranker",
+    "Refresher": "processor.refresher",
+    "Repo": "processor.repository",
+    "Reranker": "processor.reranker",
+    "ResultStore": "processor.result_store",
+    "SessionPool": "processor.session_pool",
+    "Similarity": "processor.similarity",
+    "Simplifier": "processor.simplifier",
+    "Startup": "processor.startup",
+    "Validator": "processor.validator",
+}
+
+__all__ = list(_modules)
+
+
+def __getattr__(name: str):
+    if name not in _modules:
+        raise AttributeError(f"module 'processor' has no attribute '{name}'")
+    value = getattr(importlib.import_module(_modules[name]), name)
+    # cache it, so that `__getattr__` is only called once per class
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(list(globals()) + __all__)
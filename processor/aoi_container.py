@@ -1,24 +1,66 @@
-import logging
-from difflib import SequenceMatcher
+from typing import List, Tuple
 
 import numpy as np
-import pandas as pd
 from numpy.typing import NDArray
 from shapely.geometry import Point, Polygon
 
+from processor.candidate_store import CandidateStore
+from processor.ranker import Ranker
 from processor.repository import Repo
-from spatial.geometry import wgs84_to_wgs84utm50n
+from processor.similarity import Similarity
+from processor.startup import Startup
+from spatial.geometry import (
+    coords_wgs84_to_wgs84utm50n,
+    points_to_polygon,
+    polygon_area,
+)
 
 
 class AOI(object):
-    def __init__(self, rank: int, uid_name: str, geometry: Polygon) -> None:
+    """
+    A candidate AOI, whose polygon is held as an `n x 2` array of `wgs84` coordinates.
+    The `shapely` geometry is only built when it is needed.
+    """
+
+    __slots__ = (
+        "uid",
+        "uid_name",
+        "search_rank",
+        "coords",
+        "bounds",
+        "area",
+        "distance",
+        "similarity",
+        "_utm_coords",
+        "_geometry",
+    )
+
+    def __init__(self, rank: int, uid: str, uid_name: str, coords: NDArray) -> None:
+        self.uid = uid
         self.uid_name = uid_name
-        self.geometry = geometry
         self.search_rank = rank
+        self.coords = coords
+        self.bounds = (*coords.min(axis=0), *coords.max(axis=0))
+        self.distance = None
+        self.similarity = None
+        self._utm_coords = None
+        self._geometry = None
         self.area = self._area() / 1000000  # convert to square kilometers
 
+    @property
+    def geometry(self) -> Polygon:
+        if self._geometry is None:
+            self._geometry = points_to_polygon(self.coords)
+        return self._geometry
+
+    @property
+    def utm_coords(self) -> NDArray:
+        if self._utm_coords is None:
+            self._utm_coords = coords_wgs84_to_wgs84utm50n(self.coords)
+        return self._utm_coords
+
     def _area(self) -> float:
-        return wgs84_to_wgs84utm50n(self.geometry).area  # unit: square meters
+        return polygon_area(self.utm_coords)  # unit: square meters
 
     def _not_too_big_or_too_small(self) -> bool:
         return (self.area >= Repo._min_aoi_area) and (self.area <= Repo._max_aoi_area)
@@ -29,29 +71,47 @@ class AOI(object):
         or the similarity between the names of the AOI and the POI
         is above the threshold when similarity sorting is enabled.
         """
-        return (Repo._sortings.get("sort_by_similarity") == 0) or (
+        return (not Repo._sortings.get("sort_by_similarity")) or (
             self.similarity >= Repo._min_similarity
         )
 
 
 class AOI_list(object):
+    __slots__ = (
+        "poi_name",
+        "p_lng",
+        "p_lat",
+        "poi_features",
+        "aoi_list",
+        "candidates",
+        "decisive",
+    )
+
     def __init__(self, idx: int) -> None:
         self.poi_name = Repo.file.loc[idx, "name"]
         self.p_lng = Repo.file.loc[idx, "lng_wgs84"]
         self.p_lat = Repo.file.loc[idx, "lat_wgs84"]
+        self.poi_features = None
         self.aoi_list = []
+        self.candidates = []
+        self.decisive = False
 
     def _append(self, aoi: AOI) -> None:
         aoi = self._add_poi_related_property(aoi)
+        # keep every candidate for the candidate store, valid or not
+        if CandidateStore.enabled():
+            self.candidates.append(aoi)
         if self._validate_aoi(aoi):
             self.aoi_list.append(aoi)
+            if Repo._decisive_match and self._is_decisive(aoi):
+                self.decisive = True
 
     def _validate_aoi(self, aoi: AOI) -> bool:
         def bbox_contains_poi() -> bool:
             """
             Check if the `bounding box` of AOI contains the corresponding POI.
             """
-            lng1, lat1, lng2, lat2 = aoi.geometry.bounds
+            lng1, lat1, lng2, lat2 = aoi.bounds
             if lng1 <= self.p_lng <= lng2 and lat1 <= self.p_lat <= lat2:
                 return True
             else:
@@ -63,43 +123,46 @@ class AOI_list(object):
             and aoi._not_too_different()
         )
 
+    @staticmethod
+    def _is_decisive(aoi: AOI) -> bool:
+        """
+        A valid AOI cannot be beaten by the rest if it is the first search result,
+        and is the best possible by every enabled sorting (`sort_by_area` is 0):
+        its name is identical to the POI's, and the POI is within its polygon.
+        Other AOIs can only tie with it, and ties are broken by search rank.
+        """
+        return (
+            aoi.search_rank == 1
+            and (not Repo._sortings.get("sort_by_similarity") or aoi.similarity >= 1)
+            and (not Repo._sortings.get("sort_by_distance") or aoi.distance == 0)
+        )
+
     def _get_best_aoi(self) -> AOI:
+        # the filter rules may be updated while crawling (see `Controller`),
+        # so the properties enabled since the AOIs were appended are computed
+        # and the AOIs are validated again by the current rules
+        self.aoi_list = [
+            aoi
+            for aoi in map(self._add_poi_related_property, self.aoi_list)
+            if self._validate_aoi(aoi)
+        ]
         if self.aoi_list:
+            # AOIs arrive in random order, ties are broken by search rank instead
+            self.aoi_list.sort(key=lambda aoi: aoi.search_rank)
             weighted_rank = self._weighted_rank()
             best_aoi_idx = np.argmin(weighted_rank)
             return self.aoi_list[best_aoi_idx]
 
-    def _sort_by_search_rank(self) -> NDArray:
-        return self._get_rank(lambda aoi: aoi.search_rank)
-
-    def _sort_by_area(self) -> NDArray:
-        """
-        Sort in ascending order if `sort_by_area` is 1, in descending order if -1.
-        """
-        return self._get_rank(lambda aoi: Repo._sortings.get("sort_by_area") * aoi.area)
-
-    def _sort_by_distance(self) -> NDArray:
-        return self._get_rank(lambda aoi: aoi.distance)
-
-    def _sort_by_similarity(self) -> NDArray:
-        return self._get_rank(lambda aoi: -aoi.similarity)  # descending
-
-    def _get_rank(self, func: callable) -> NDArray:
-        """
-        Return an rank array [r1, r2, ... rn] for an AOI property list
-        [aoi_1.property, aoi_2.property, ... aoi_n.property],
-        such that aoi_i.property is the ri-th smallest element.
-        """
-        return np.argsort(np.argsort([func(aoi) for aoi in self.aoi_list]))
-
     def _weighted_rank(self) -> NDArray:
-        ranks = []
-        for sorting, value in Repo._sortings.items():
-            if value != 0:
-                ranks.append(getattr(self, f"_{sorting}")())
-        values = [value for value in Repo._sortings.values() if value != 0]
-        weights = np.array(values) / np.abs(values).sum()
-        return sum([rank * weight for rank, weight in zip(ranks, weights)])
+        table = {
+            "search_rank": [aoi.search_rank for aoi in self.aoi_list],
+            "area": [aoi.area for aoi in self.aoi_list],
+        }
+        if Repo._sortings.get("sort_by_distance"):
+            table["distance"] = [aoi.distance for aoi in self.aoi_list]
+        if Repo._sortings.get("sort_by_similarity"):
+            table["similarity"] = [aoi.similarity for aoi in self.aoi_list]
+        return Ranker.weighted_rank(table)
 
     def _add_poi_related_property(self, aoi: AOI) -> AOI:
         def cal_distance(aoi: AOI) -> float:
@@ -107,20 +170,28 @@ class AOI_list(object):
             Plane distance between the POI and the AOI
             in Wgs84-Utm50N projection.
             """
-            geometry = wgs84_to_wgs84utm50n(aoi.geometry)
-            point = wgs84_to_wgs84utm50n(Point(self.p_lat, self.p_lng))
-            return geometry.distance(point)
+            geometry = points_to_polygon(aoi.utm_coords)
+            point = coords_wgs84_to_wgs84utm50n(np.array([[self.p_lng, self.p_lat]]))
+            return geometry.distance(Point(point[0]))
 
         def cal_similarity(aoi: AOI) -> float:
             """
-            Text similarity is calculated using difflib `SequenceMatcher`. For its algorithm,
-            see https://stackoverflow.com/questions/35517353/how-does-pythons-sequencematcher-work
+            Name similarity calculated by the `Similarity` engine,
+            POI name features are preprocessed once and cached.
             """
-            return SequenceMatcher(None, aoi.uid_name, self.poi_name).ratio()
+            if self.poi_features is None:
+                self.poi_features = Similarity.features(self.poi_name)
+            return Similarity.score(self.poi_features, [aoi.uid_name])[0]
 
-        if Repo._sortings.get("sort_by_distance"):
+        # the candidate store needs both properties for offline re-ranking,
+        # and each property is computed once, when it is first needed
+        if aoi.distance is None and (
+            Repo._sortings.get("sort_by_distance") or CandidateStore.enabled()
+        ):
             aoi.distance = cal_distance(aoi)
-        if Repo._sortings.get("sort_by_similarity"):
+        if aoi.similarity is None and (
+            Repo._sortings.get("sort_by_similarity") or CandidateStore.enabled()
+        ):
             aoi.similarity = cal_similarity(aoi)
         return aoi
 
@@ -128,12 +199,24 @@ class AOI_list(object):
 class AOIContainer(object):
     @classmethod
     def mold(cls) -> None:
-        """Initialize the `AOIContainer` class before logging."""
-        cls._dict = {idx: AOI_list(idx) for idx in Repo.file.index}
-        logging.warning("(6/6) AOIContainer is ready.")
+        """Initialize the `AOIContainer` class before logging.
+
+        The `AOI_list` of a POI is only created when its first AOI arrives,
+        and dropped as soon as the POI is finished.
+        With `DECISIVE_MATCH`, the AOI requests deferred after the first one
+        are kept in `_deferred`, and dropped if the first AOI is decisive.
+        """
+        cls._dict = {}
+        cls._deferred = {}
+        cls._decided = 0  # POIs finished early by a decisive AOI
+        cls._saved = 0  # deferred AOI requests dropped
+        CandidateStore.open()
+        Startup.log_step(6, "AOIContainer is ready.")
 
     @classmethod
-    def append(cls, idx: int, rank: int, uid_name: str, geometry: Polygon) -> None:
+    def append(
+        cls, idx: int, rank: int, uid: str, uid_name: str, coords: NDArray
+    ) -> None:
         """Append an AOI conditionally in the `AOIList` of its corresponding POI.
 
         AOI will be appended if it satisfies all the following requirements:
@@ -147,12 +230,16 @@ class AOIContainer(object):
             POI index.
         rank : int
             AOI search rank.
+        uid : str
+            AOI uid.
         uid_name : str
             AOI uid_name.
-        geometry : Polygon
-            AOI geometry.
+        coords : NDArray
+            AOI polygon coordinates, an `n x 2` array in wgs84 CRS.
         """
-        aoi = AOI(rank, uid_name, geometry)
+        aoi = AOI(rank, uid, uid_name, coords)
+        if idx not in cls._dict:
+            cls._dict[idx] = AOI_list(idx)
         cls._dict[idx]._append(aoi)
 
     @classmethod
@@ -167,6 +254,72 @@ class AOIContainer(object):
         Returns
         -------
         AOI
-            The best AOI of the POI with index `idx`.
+            The best AOI of the POI with index `idx`,
+            None if no AOI of the POI is appended or valid.
+        """
+        if idx in cls._dict:
+            return cls._dict[idx]._get_best_aoi()
+
+    @classmethod
+    def has_decisive_aoi(cls, idx: int) -> bool:
+        """Whether the POI with index `idx` can be finished before all its AOIs
+        are called, as one of them cannot be beaten (see `DECISIVE_MATCH`).
+
+        Parameters
+        ----------
+        idx : int
+            POI index.
+        """
+        return idx in cls._dict and cls._dict[idx].decisive
+
+    @classmethod
+    def defer(
+        cls, idx: int, uid_name_rank_triples: List[Tuple[str, str, int]]
+    ) -> List[Tuple[str, str, int]]:
+        """Keep all but the first search result of the POI with index `idx` aside
+        if the first one could be decisive, and return the ones to request now.
+
+        Only the first search result can be decisive, so with `DECISIVE_MATCH`
+        it is requested alone, and the rest are only requested (see `resume`)
+        if it turns out not to be decisive.
+
+        Parameters
+        ----------
+        idx : int
+            POI index.
+        uid_name_rank_triples : List[Tuple[str, str, int]]
+            `(uid_name, uid, search_rank)` triples of the POI in search order.
+        """
+        if not Repo._decisive_match or uid_name_rank_triples[0][2] != 1:
+            return uid_name_rank_triples
+        cls._deferred[idx] = uid_name_rank_triples[1:]
+        return uid_name_rank_triples[:1]
+
+    @classmethod
+    def resume(cls, idx: int) -> List[Tuple[str, str, int]]:
+        """Return the deferred search results of the POI with index `idx`
+        to request, if any.
+
+        Parameters
+        ----------
+        idx : int
+            POI index.
+        """
+        return cls._deferred.pop(idx, [])
+
+    @classmethod
+    def release(cls, idx: int) -> None:
+        """Drop the `AOI_list` of the finished POI with index `idx`,
+        after recording all its candidate AOIs in the `CandidateStore` if enabled.
+
+        Parameters
+        ----------
+        idx : int
+            POI index.
         """
-        return cls._dict[idx]._get_best_aoi()
+        aoi_list = cls._dict.pop(idx, None)
+        if aoi_list and aoi_list.decisive:
+            cls._decided += 1
+            cls._saved += len(cls._deferred.pop(idx, []))
+        if aoi_list and CandidateStore.enabled():
+            CandidateStore.record(idx, aoi_list.candidates)
@@ -1,22 +1,33 @@
 import json
 import random
-from typing import List, Tuple
+from typing import TYPE_CHECKING, List, Tuple
 
-import pandas as pd
+import numpy as np
+from numpy.typing import NDArray
 from scrapy.http import Response
 from shapely.geometry import Polygon
 
+from processor.deduplicator import Deduplicator
+from processor.prescreener import Prescreener
 from processor.repository import Repo
-from spatial.coords import bd09ll_to_wgs84, bd09mc_to_wgs84
+from processor.result_store import ResultStore
+from spatial.coords import (
+    bd09ll_to_wgs84,
+    bd09mc_to_wgs84_array,
+    geohash_index_array,
+    hilbert_index_array,
+)
 from spatial.geometry import points_to_polygon, within_distance
 
+if TYPE_CHECKING:
+    import pandas as pd
+
 
 class APIHandler(object):
     @classmethod
     def assemble_uid_urls(cls) -> List[Tuple[int, str]]:
         """
         Construct `Baidu uid` circular area search urls (POIs that are already queried are skipped) using following parameters, and return a list of `(DataFrame_idx, url)` tuples:
-            - ak (str): a random Baidu API key
             - name (str): POI's name
             - lng/lat (float): POI's longitude/latitude (wgs84 CRS)
             - radius (int): area search radius, in meters
@@ -24,35 +35,64 @@ class APIHandler(object):
             - prim_ind (str): primary industry category
             - sec_ind (str): secondary industry category
             - scope (int): search scope, equals 2 if `prim_ind` and `sec_ind` are specified, otherwise equals 1
+        The API key is only added by `sign` when a url is requested,
+        so that changes of `AK_LIST` while crawling apply to the urls not requested yet.
         """
         urls = []
-        df = Repo.file.copy()
-        # store industry parameter in a column
-        if Repo._prim_ind != "VAR":
-            df["prim_ind"] = Repo._prim_ind
-        if Repo._sec_ind != "VAR":
-            df["sec_ind"] = Repo._sec_ind
+        # skip POIs that are already queried, or whose duplicate is queried instead
+        df = Repo.file[~ResultStore.finished() & Deduplicator.is_representative()]
+        df = cls._crawl_order(df)
+        prim_inds, sec_inds = cls._industries(df)
         # concatenate urls
-        for idx in df.index:
-            # skip POIs that are already queried
-            if not pd.isna(df.loc[idx, "status"]):
-                continue
-            name = df.loc[idx, "name"]
-            lng, lat = df.loc[idx, "lng_wgs84"], df.loc[idx, "lat_wgs84"]
-            prim_ind, sec_ind = df.loc[idx, "prim_ind"], df.loc[idx, "sec_ind"]
+        for idx, name, lng, lat, prim_ind, sec_ind in zip(
+            df.index, df["name"], df["lng_wgs84"], df["lat_wgs84"], prim_inds, sec_inds
+        ):
             url = (
-                f"https://api.map.baidu.com/place/v2/search?"
+                f"{Repo._search_url}?"
                 f"query={name}"
                 f"&location={lat},{lng}"
                 f"&radius={Repo._radius}"
                 f"&radius_limit={Repo._radius_limit}"
-                f"&ak={random.choice(Repo._ak_list)}"
                 f"&output=json&coord_type=1"
             )
             url += cls._industry_url_segment(prim_ind, sec_ind)
             urls.append((idx, url))
         return urls
 
+    @classmethod
+    def assemble_area_url(
+        cls,
+        bounds: Tuple[float, float, float, float],
+        prim_ind: str,
+        sec_ind: str,
+        page: int,
+        page_size: int,
+    ) -> str:
+        """
+        Construct a `Baidu uid` rectangular area search url of an industry category,
+        whose name is the query, for the grid harvesting of `Harvester`:
+            - bounds (tuple): `(min_lng, min_lat, max_lng, max_lat)` in wgs84 CRS
+            - prim_ind/sec_ind (str): industry category, at least one of them is given
+            - page (int): page number, starting from 0
+            - page_size (int): number of results per page
+        """
+        lng1, lat1, lng2, lat2 = bounds
+        url = (
+            f"{Repo._search_url}?"
+            f"query={sec_ind or prim_ind}"
+            f"&bounds={lat1:.6f},{lng1:.6f},{lat2:.6f},{lng2:.6f}"
+            f"&page_size={page_size}&page_num={page}"
+            f"&output=json&coord_type=1"
+        )
+        return url + cls._industry_url_segment(prim_ind, sec_ind)
+
+    @staticmethod
+    def sign(url: str) -> str:
+        """
+        Add a random Baidu API key (ak) of `AK_LIST` to a uid search url.
+        """
+        return f"{url}&ak={random.choice(Repo._ak_list)}"
+
     @classmethod
     def extract_uid_name_rank(
         cls, idx: int, response: Response
@@ -60,7 +100,8 @@ class APIHandler(object):
         """
         Parse the `Baidu uid` response, filter the results,
         and return a list of `(uid_name, uid, search_rank)` triples.
-        If `USE_FIRST_UID` is on, only the first result is returned.
+        If `USE_FIRST_UID` is on, only the first result is returned,
+        and if `PRESCREEN_TOP_K` is set, only the top-K results (see `Prescreener`).
 
         Filter Rules:
         -----
@@ -104,6 +145,7 @@ class APIHandler(object):
         ```
         """
         name_uid_rank = []
+        u_properties = []
         status = json.loads(response.text).get("status")
         results = json.loads(response.text).get("results")
         # check status
@@ -118,24 +160,47 @@ class APIHandler(object):
                 # keep the result if it passes all the rules
                 if cls._pass_filter_rules(**p_property, **u_property):
                     name_uid_rank.append((result["name"], result["uid"], rank + 1))
+                    u_properties.append(u_property)
                 if Repo._use_first_uid and name_uid_rank:
                     break
+        if Prescreener.enabled():
+            name_uid_rank = Prescreener.screen(
+                idx, name_uid_rank, u_properties, p_property
+            )
         return name_uid_rank
 
+    @classmethod
+    def extract_area_results(cls, response: Response) -> Tuple[int, List[dict]]:
+        """
+        Parse a `Baidu uid` area search response (see `extract_uid_name_rank`),
+        and return the total number of results of the search, and the properties
+        (see `_get_uid_property`) of the results of this page with a name,
+        an uid and a location.
+        """
+        response = json.loads(response.text)
+        cls._check_status(response.get("status"))
+        u_properties = [
+            cls._get_uid_property(result) for result in response.get("results") or []
+        ]
+        u_properties = [
+            u
+            for u in u_properties
+            if u["uid"] and u["uid_name"] and u["u_lng"] and u["u_lat"]
+        ]
+        return response.get("total", 0), u_properties
+
     @staticmethod
     def assemble_aoi_url(uid: str) -> str:
         """
         Construct a `Baidu AOI` url with this AOI's `uid`.
         """
-        return (
-            f"https://map.baidu.com/?newmap=1&qt=ext&"
-            f"uid={uid}&ext_ver=new&ie=utf-8&l=11"
-        )
+        return f"{Repo._aoi_url}?newmap=1&qt=ext&uid={uid}&ext_ver=new&ie=utf-8&l=11"
 
     @staticmethod
-    def get_polygon_geometry(response: Response) -> Polygon | None:
+    def get_polygon_coords(response: Response) -> NDArray | None:
         """
-        Parse the `Baidu AOI` response, extract the polygon geometry.
+        Parse the `Baidu AOI` response, extract the polygon coordinates
+        as an `n x 2` array of `(lng, lat)` in wgs84 CRS.
 
         Json Response Example
         -----
@@ -161,13 +226,56 @@ class APIHandler(object):
         response = json.loads(response.text)
         geo = response.get("content", {}).get("geo")
         if geo:
-            xys = geo.split("|")[2][2:-1].split(",")
+            xys = np.array(geo.split("|")[2][2:-1].split(","), dtype=float)
             # xys now looks like [x1, y1, x2, y2, ..., xn, yn]
             # convert it into the format [(x1, y1), (x2, y2), ..., (xn, yn)]
-            points = [
-                bd09mc_to_wgs84(float(x), float(y)) for x, y in zip(xys[::2], xys[1::2])
-            ]
-            return points_to_polygon(points)
+            if len(xys) < 6:
+                raise ValueError("A polygon must have at least 3 coordinate tuples.")
+            return np.column_stack(bd09mc_to_wgs84_array(xys[0::2], xys[1::2]))
+
+    @classmethod
+    def get_polygon_geometry(cls, response: Response) -> Polygon | None:
+        """
+        Parse the `Baidu AOI` response, extract the polygon geometry.
+        See `get_polygon_coords` for the response format.
+        """
+        coords = cls.get_polygon_coords(response)
+        if coords is not None:
+            return points_to_polygon(coords)
+
+    @staticmethod
+    def _crawl_order(df: "pd.DataFrame") -> "pd.DataFrame":
+        """
+        Sort the POIs to crawl along the space-filling curve of `CRAWL_ORDER`,
+        so that neighboring POIs are requested together,
+        and by their industry columns first if `CRAWL_ORDER_BY_INDUSTRY` is on.
+        """
+        if not Repo._crawl_order:
+            return df
+        curve = {"hilbert": hilbert_index_array, "geohash": geohash_index_array}
+        keys = [curve[Repo._crawl_order](df["lng_wgs84"], df["lat_wgs84"])]
+        if Repo._crawl_order_by_industry:
+            for col, value in [
+                ("sec_ind", Repo._sec_ind),
+                ("prim_ind", Repo._prim_ind),
+            ]:
+                if value == "VAR":
+                    keys.append(df[col].astype(str).to_numpy())
+        # np.lexsort sorts by the last key first, and is stable
+        return df.iloc[np.lexsort(keys)]
+
+    @staticmethod
+    def _industries(df: "pd.DataFrame") -> Tuple[list, list]:
+        """
+        Industry parameters of the POIs, either fixed or stored in a column.
+        """
+        prim_inds = (
+            df["prim_ind"] if Repo._prim_ind == "VAR" else [Repo._prim_ind] * len(df)
+        )
+        sec_inds = (
+            df["sec_ind"] if Repo._sec_ind == "VAR" else [Repo._sec_ind] * len(df)
+        )
+        return prim_inds, sec_inds
 
     @staticmethod
     def _industry_url_segment(prim_ind: str, sec_ind: str) -> str:
@@ -197,7 +305,7 @@ class APIHandler(object):
             raise Exception(f"API Error: {status}.")
 
     @staticmethod
-    def _get_poi_property(df: pd.DataFrame, idx: int) -> dict:
+    def _get_poi_property(df: "pd.DataFrame", idx: int) -> dict:
         radius = Repo._radius / 1000  # convert to km
         p_lng, p_lat = df.loc[idx, "lng_wgs84"], df.loc[idx, "lat_wgs84"]
         if Repo._prim_ind == "VAR":
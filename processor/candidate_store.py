@@ -0,0 +1,149 @@
+import glob
+import os
+from typing import Dict, List
+
+import numpy as np
+from numpy.typing import NDArray
+
+from processor.repository import Repo
+
+
+class CandidateStore(object):
+    """
+    Columnar store of every candidate AOI of each finished POI, including the ones
+    rejected by `FILTER_RULES`, so that POIs can be re-matched offline.
+
+    Candidates are buffered in memory and flushed as a new `part-xxxxx.npz` file
+    in `CANDIDATE_STORE_DIR` at every checkpoint. Each part holds the columns:
+        - idx (int64): POI index
+        - search_rank (int16): AOI search rank
+        - uid (str)/uid_name (str): Baidu uid and its name
+        - area (float64): AOI area, in square kilometers
+        - distance (float64): distance between the AOI and the POI, in meters
+        - similarity (float64): name similarity between the AOI and the POI
+        - bounds (float64, n x 4): AOI bounding box `(lng1, lat1, lng2, lat2)`
+        - wkb (uint8) + wkb_offsets (int64, n + 1): AOI geometries as concatenated `wkb`
+    """
+
+    _columns = [
+        "idx",
+        "search_rank",
+        "uid",
+        "uid_name",
+        "area",
+        "distance",
+        "similarity",
+    ]
+    _rows = []
+
+    @classmethod
+    def open(cls) -> None:
+        cls._rows = []
+        if cls.enabled():
+            os.makedirs(Repo._candidate_store_dir, exist_ok=True)
+
+    @staticmethod
+    def enabled() -> bool:
+        return bool(Repo._candidate_store_dir)
+
+    @classmethod
+    def record(cls, idx: int, candidates: list) -> None:
+        """
+        Buffer all candidate AOIs of a finished POI.
+        """
+        for aoi in candidates:
+            cls._rows.append(
+                (
+                    idx,
+                    aoi.search_rank,
+                    aoi.uid,
+                    aoi.uid_name,
+                    aoi.area,
+                    aoi.distance,
+                    aoi.similarity,
+                    aoi.bounds,
+                    aoi.geometry.wkb,
+                )
+            )
+
+    @classmethod
+    def flush(cls) -> None:
+        """
+        Write the buffered candidates as a new part of the store.
+        """
+        if not (cls.enabled() and cls._rows):
+            return
+        idx, rank, uid, uid_name, area, distance, similarity, bounds, wkb = zip(
+            *cls._rows
+        )
+        lengths = np.fromiter((len(b) for b in wkb), dtype=np.int64, count=len(wkb))
+        path = os.path.join(
+            Repo._candidate_store_dir, f"part-{cls._next_part():05d}.npz"
+        )
+        np.savez_compressed(
+            path,
+            idx=np.array(idx, dtype=np.int64),
+            search_rank=np.array(rank, dtype=np.int16),
+            uid=np.array(uid, dtype=str),
+            uid_name=np.array(uid_name, dtype=str),
+            area=np.array(area, dtype=np.float64),
+            distance=np.array(distance, dtype=np.float64),
+            similarity=np.array(similarity, dtype=np.float64),
+            bounds=np.array(bounds, dtype=np.float64).reshape(-1, 4),
+            wkb=np.frombuffer(b"".join(wkb), dtype=np.uint8),
+            wkb_offsets=np.concatenate([[0], np.cumsum(lengths)]),
+        )
+        cls._rows = []
+
+    @classmethod
+    def load(cls) -> Dict[str, NDArray]:
+        """
+        Load all parts of the store into one table, sorted by POI index.
+
+        If a POI was crawled more than once, only the candidates
+        from its latest part are kept. Candidates of a POI are sorted
+        by search rank, the same order as `AOI_list` ranks them.
+        """
+        paths = cls._part_paths()
+        if not paths:
+            raise FileNotFoundError(
+                f'No candidate found in CANDIDATE_STORE_DIR: "{Repo._candidate_store_dir}".'
+            )
+        parts = [dict(np.load(path)) for path in paths]
+        part_no = np.concatenate(
+            [np.full(len(part["idx"]), no) for no, part in enumerate(parts)]
+        )
+        table = {
+            col: np.concatenate([part[col] for part in parts])
+            for col in cls._columns + ["bounds"]
+        }
+        table["wkb"] = cls._concat_wkb(parts)
+        # keep the latest part of each POI, sorted by search rank within a POI
+        latest = np.zeros(table["idx"].max() + 1, dtype=part_no.dtype)
+        np.maximum.at(latest, table["idx"], part_no)
+        keep = part_no == latest[table["idx"]]
+        order = np.lexsort((table["search_rank"][keep], table["idx"][keep]))
+        table = {col: value[keep][order] for col, value in table.items()}
+        return table
+
+    @staticmethod
+    def _concat_wkb(parts: List[Dict[str, NDArray]]) -> NDArray:
+        """
+        Split the concatenated `wkb` buffers of all parts into an object array of bytes.
+        """
+        wkb = []
+        for part in parts:
+            buffer, offsets = part["wkb"].tobytes(), part["wkb_offsets"]
+            wkb.extend(buffer[i:j] for i, j in zip(offsets[:-1], offsets[1:]))
+        return np.array(wkb, dtype=object)
+
+    @classmethod
+    def _next_part(cls) -> int:
+        paths = cls._part_paths()
+        if not paths:
+            return 0
+        return int(os.path.basename(paths[-1])[5:10]) + 1
+
+    @staticmethod
+    def _part_paths() -> List[str]:
+        return sorted(glob.glob(os.path.join(Repo._candidate_store_dir, "part-*.npz")))
@@ -0,0 +1,67 @@
+import logging
+
+from processor.counter import Counter
+from processor.repository import Repo
+from processor.validator import Validator
+
+
+class Controller(object):
+    """
+    Live tuning of a running crawl without restarting it, see `ControlExtension`.
+
+    Only the `LIVE_SETTINGS` can be updated. They are validated as at startup,
+    and nothing is changed if any of them is invalid. Since the settings are read
+    from `Repo` whenever they are used, the updates apply to the next requests
+    and POIs, e.g. new `FILTER_RULES` to the POIs finished from then on.
+    """
+
+    LIVE_SETTINGS = [
+        "CONCURRENT_REQUESTS",
+        "CONCURRENT_REQUESTS_PER_IP",
+        "DOWNLOAD_DELAY",
+        "UPDATE_INTERVAL",
+        "PROXY_ENABLED",
+        "AK_LIST",
+        "FILTER_RULES",
+    ]
+
+    @classmethod
+    def update(cls, updates: dict) -> None:
+        if not isinstance(updates, dict):
+            raise TypeError("Settings updates must be a json object.")
+        unknown = sorted(set(updates) - set(cls.LIVE_SETTINGS))
+        if unknown:
+            raise ValueError(
+                f'Settings cannot be updated while crawling: {", ".join(unknown)}.'
+            )
+        previous = Repo.update_settings(updates)
+        try:
+            Validator.validate_live_settings()
+        except (TypeError, ValueError):
+            Repo._import_settings(previous)
+            raise
+        logging.warning(f'-- Settings updated: {", ".join(updates)}.')
+
+    @classmethod
+    def state(cls) -> dict:
+        matched, no_uid, no_geometry = Counter._count_status()
+        avg_speed, time_remaining = Counter._cal_speed_xTime()
+        return dict(
+            progress=dict(
+                total=Counter._poi_num,
+                to_crawl=Counter._poi_to_crawl,
+                matched=matched,
+                no_uid=no_uid,
+                no_geometry=no_geometry,
+            ),
+            avg_speed=avg_speed,
+            time_remaining=time_remaining,
+            settings=cls.live_settings(),
+        )
+
+    @classmethod
+    def live_settings(cls) -> dict:
+        settings = {name: Repo._settings.get(name) for name in cls.LIVE_SETTINGS}
+        # only the end of the API keys is shown
+        settings["AK_LIST"] = [f"***{ak[-4:]}" for ak in settings["AK_LIST"]]
+        return settings
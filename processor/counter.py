@@ -1,8 +1,9 @@
-import logging
 import time
 from typing import Tuple
 
 from processor.repository import Repo
+from processor.result_store import ResultStore
+from processor.startup import Startup
 
 
 class Counter(object):
@@ -16,8 +17,9 @@ class Counter(object):
         )
         cls._init_time = time.time()
         cls._time = cls._init_time
+        cls._cell_aoi_called = 0  # AOI urls called for grid cells, see `Harvester`
         cls._poi_to_crawl = cls._poi_num - sum(cls._init_status)
-        logging.warning("(5/6) Counter booted.")
+        Startup.log_step(5, "Counter booted.")
 
     @classmethod
     def write_aoi_total_num(cls, idx: int, total_num: int) -> None:
@@ -26,6 +28,14 @@ class Counter(object):
         """
         cls._df.loc[idx, "poi_aoi_total"] = total_num
 
+    @classmethod
+    def settle_aoi_total_num(cls, idx: int) -> None:
+        """
+        Record the AOIs called as the total number of a finished POI,
+        which is less than written if it is decided early (see `DECISIVE_MATCH`).
+        """
+        cls._df.loc[idx, "poi_aoi_total"] = cls._df.loc[idx, "poi_aoi_called"]
+
     @classmethod
     def count_aoi_called(cls, idx: int) -> None:
         """
@@ -33,6 +43,13 @@ class Counter(object):
         """
         cls._df.loc[idx, "poi_aoi_called"] += 1
 
+    @classmethod
+    def count_cell_aoi_called(cls) -> None:
+        """
+        Count when an AOI url of a grid cell is called.
+        """
+        cls._cell_aoi_called += 1
+
     @classmethod
     def all_aoi_called(cls, idx: int) -> None:
         """
@@ -47,19 +64,16 @@ class Counter(object):
         """
         Determine if the `UPDATE_INTERVAL` is reached.
         """
-        total_called_times = cls._df.poi_aoi_called.sum()
+        total_called_times = cls._df.poi_aoi_called.sum() + cls._cell_aoi_called
         if total_called_times % Repo._update_interval == 0:
             cls._time = time.time()
             return True
 
     @staticmethod
     def _count_status() -> Tuple[int, int, int]:
-        def count(status: str) -> int:
-            return Repo.file.status.eq(status).sum()
-
-        matched = count("Matched")
-        no_uid = count("No Uid")
-        no_geometry = count("No Geometry")
+        matched = ResultStore.count("Matched")
+        no_uid = ResultStore.count("No Uid")
+        no_geometry = ResultStore.count("No Geometry")
         return matched, no_uid, no_geometry
 
     @classmethod
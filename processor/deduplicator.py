@@ -0,0 +1,132 @@
+import logging
+from typing import Dict, Iterable, Tuple
+
+import numpy as np
+from numpy.typing import NDArray
+
+from processor.counter import Counter
+from processor.repository import Repo
+from processor.result_store import ResultStore
+from processor.similarity import Similarity
+
+
+class Deduplicator(object):
+    """
+    Collapse duplicate and near-duplicate POIs before crawling.
+
+    A POI with the same normalized name (see `Similarity.normalize`) as an earlier
+    POI within `DEDUP_TOLERANCE` meters of it joins the group of the nearest such
+    POI. Only the first POI of a group (the representative) is crawled, and its
+    status, uid_name and geometry are fanned out to the other POIs (the members).
+    """
+
+    _reps = None  # representative label of every member, indexed by member label
+    _groups = {}  # member labels of every representative
+    _skipped = None  # members that would have been crawled without deduplication
+
+    @classmethod
+    def group(cls) -> None:
+        """
+        Group the POIs of the file, which is disabled if `DEDUP_TOLERANCE` is 0.
+        """
+        import pandas as pd
+
+        cls._reps = pd.Series(dtype=Repo.file.index.dtype)
+        cls._groups = {}
+        cls._skipped = cls._reps.index
+        if not Repo._dedup_tolerance:
+            return
+        lng = Repo.file["lng_wgs84"].to_numpy(dtype=float)
+        lat = Repo.file["lat_wgs84"].to_numpy(dtype=float)
+        # equirectangular approximation, accurate enough within a city
+        x = lng * 111320 * np.cos(np.radians(lat))
+        y = lat * 110574
+        names = Repo.file["name"].astype(str).map(Similarity.normalize)
+        # only POIs whose name is shared can be duplicates
+        shared = names.duplicated(keep=False).to_numpy()
+        reps = cls._nearest_representatives(
+            Repo.file.index[shared], names[shared].to_numpy(), x[shared], y[shared]
+        )
+        cls._reps = pd.Series(
+            list(reps.values()),
+            index=pd.Index(list(reps), dtype=Repo.file.index.dtype),
+            dtype=Repo.file.index.dtype,
+        )
+        cls._groups = cls._reps.groupby(cls._reps.to_numpy()).groups
+        # members of finished representatives are filled right away,
+        # unless they have a result of their own, e.g. crawled before deduplication
+        cls.fan_out(overwrite=False)
+        unfinished = ~ResultStore.finished()[cls._reps.index]
+        cls._skipped = cls._reps.index[unfinished]
+        logging.warning(
+            f"-- Deduplication: {len(cls._reps)} duplicate POIs in "
+            f"{cls._reps.nunique()} groups, {len(cls._skipped)} uid searches saved."
+        )
+
+    @staticmethod
+    def _nearest_representatives(
+        labels: Iterable, names: NDArray, x: NDArray, y: NDArray
+    ) -> Dict:
+        """
+        Return the representative label of every member label. The POIs are
+        visited in order and binned into `DEDUP_TOLERANCE` meters grid cells,
+        so the representatives within the tolerance of a POI are all found in
+        its own cell and the 8 neighbouring ones.
+        """
+        tolerance = Repo._dedup_tolerance
+        cells = {}  # representatives (x, y, label) of every (name, cell x, cell y)
+        reps = {}
+        for label, name, px, py in zip(labels, names, x, y):
+            cx, cy = int(px // tolerance), int(py // tolerance)
+            nearest, nearest_dist = None, tolerance**2
+            for dx in (-1, 0, 1):
+                for dy in (-1, 0, 1):
+                    for rx, ry, rep in cells.get((name, cx + dx, cy + dy), ()):
+                        dist = (rx - px) ** 2 + (ry - py) ** 2
+                        if dist <= nearest_dist:
+                            nearest, nearest_dist = rep, dist
+            if nearest is None:
+                cells.setdefault((name, cx, cy), []).append((px, py, label))
+            else:
+                reps[label] = nearest
+        return reps
+
+    @classmethod
+    def is_representative(cls) -> NDArray:
+        """
+        Boolean mask of the POIs that should be crawled.
+        """
+        return ~Repo.file.index.isin(cls._reps.index)
+
+    @classmethod
+    def fan_out(cls, idx: int | None = None, overwrite: bool = True) -> None:
+        """
+        Copy the result of the representative `idx` (or of all finished
+        representatives if None) to its members, only to the unfinished ones
+        if `overwrite` is False.
+        """
+        import pandas as pd
+
+        if idx is None:
+            reps = cls._reps
+        elif idx in cls._groups:
+            members = cls._groups[idx]
+            reps = pd.Series(np.full(len(members), idx), index=members)
+        else:
+            return
+        finished = ResultStore.finished()[reps.to_numpy()]
+        if not overwrite:
+            finished &= ~ResultStore.finished()[reps.index]
+        members, reps = reps.index[finished], reps.to_numpy()[finished]
+        ResultStore.copy(reps, members.to_numpy())
+
+    @classmethod
+    def saved_calls(cls) -> Tuple[int, int]:
+        """
+        Number of uid searches and AOI requests saved for the skipped members
+        whose representatives are finished.
+        """
+        reps = cls._reps[cls._skipped]
+        finished = ResultStore.finished()[reps.to_numpy()]
+        aoi_total = Counter._df["poi_aoi_total"].reindex(reps.to_numpy()[finished])
+        return int(finished.sum()), int(aoi_total.fillna(0).sum())
@@ -0,0 +1,149 @@
+import math
+import random
+import time
+from typing import Dict, List, Tuple
+
+import numpy as np
+from scrapy.http import TextResponse
+
+from processor.api_handler import APIHandler
+from processor.deduplicator import Deduplicator
+from processor.http_archive import HttpArchive
+from processor.repository import Repo
+from processor.result_store import ResultStore
+
+
+class Estimator(object):
+    """
+    Dry-run estimation of the API calls and time of a crawl, without crawling.
+
+    The number of candidate uids per POI is estimated from a sample of POIs to crawl,
+    whose uid search responses are read from the `HttpArchive` if archived,
+    or requested live if allowed. No AOI (ext) request is ever sent.
+    """
+
+    @classmethod
+    def estimate(
+        cls,
+        sample_size: int = 50,
+        live: bool = False,
+        latency: float = 0.3,
+        qps: float = 30,
+        daily_quota: int = 5000,
+        candidates: float = 5.0,
+    ) -> dict:
+        """
+        Return the estimation as a dict.
+
+        Parameters
+        ----------
+        sample_size : int
+            Maximum number of POIs sampled to estimate the candidates per POI.
+        live : bool
+            Whether to request the uid search API for the sampled POIs
+            that are not archived.
+        latency : float
+            Mean API latency in seconds, replaced by the measured one if sampled live.
+        qps : float
+            Uid search QPS limit of each AK.
+        daily_quota : int
+            Daily uid search quota of each AK.
+        candidates : float
+            Candidates per POI assumed if nothing can be sampled.
+        """
+        urls = APIHandler.assemble_uid_urls()
+        to_crawl = len(urls)
+        with HttpArchive.reading() as exists:
+            archived = cls._archived_bodies(urls) if exists else {}
+        rng = random.Random(0)
+        # archived responses are sampled first, as they cost nothing
+        sample = rng.sample(
+            [(idx, url) for idx, url in urls if idx in archived],
+            min(sample_size, len(archived)),
+        )
+        uids = [cls._count_uids(idx, url, archived[idx]) for idx, url in sample]
+        latencies = []
+        if live and len(sample) < sample_size:
+            import requests
+
+            missing = [(idx, url) for idx, url in urls if idx not in archived]
+            sample = rng.sample(missing, min(sample_size - len(sample), len(missing)))
+            for idx, url in sample:
+                start = time.perf_counter()
+                try:
+                    body = requests.get(APIHandler.sign(url), timeout=15).content
+                except requests.RequestException:
+                    continue
+                latencies.append(time.perf_counter() - start)
+                uids.append(cls._count_uids(idx, url, body))
+        uids = [n for n in uids if n is not None]
+        if uids:
+            candidates = float(
+                np.mean(np.minimum(uids, 1) if Repo._use_first_uid else uids)
+            )
+        if latencies:
+            latency = float(np.mean(latencies))
+        search_calls = to_crawl
+        if Repo._http_archive_mode == "replay":
+            # archived POIs are replayed without reaching the network
+            search_calls -= len(archived)
+        ext_calls = round(search_calls * candidates)
+        search_calls_per_ak = search_calls / len(Repo._ak_list)
+        finished = ResultStore.finished()
+        return dict(
+            pois_total=len(Repo.file),
+            pois_crawled=int(finished.sum()),
+            pois_to_crawl=to_crawl,
+            # filled by the result of their representative instead
+            pois_duplicate=int(
+                np.count_nonzero(~finished & ~Deduplicator.is_representative())
+            ),
+            pois_archived=len(archived),
+            pois_sampled=len(uids),
+            candidates_per_poi=round(candidates, 2),
+            no_uid_rate=round(float(np.mean(np.equal(uids, 0))), 3) if uids else None,
+            search_calls=search_calls,
+            ext_calls=ext_calls,
+            search_calls_per_ak=math.ceil(search_calls_per_ak),
+            quota_days=math.ceil(search_calls_per_ak / daily_quota),
+            latency_s=round(latency, 3),
+            wall_time_s=round(cls._wall_time(search_calls, ext_calls, latency, qps), 1),
+        )
+
+    @staticmethod
+    def _archived_bodies(urls: List[Tuple[int, str]]) -> Dict[int, bytes]:
+        """
+        Uid search response bodies of the POIs that are in the `HttpArchive`.
+        """
+        bodies = {}
+        for idx, url in urls:
+            archived = HttpArchive.get(url)
+            if archived is not None:
+                bodies[idx] = archived[2]
+        return bodies
+
+    @staticmethod
+    def _count_uids(idx: int, url: str, body: bytes) -> int | None:
+        """
+        Number of candidate uids in a uid search response,
+        None if the response is an API error, which is not a property of the POI.
+        """
+        response = TextResponse(url, body=body, encoding="utf-8")
+        try:
+            return len(APIHandler.extract_uid_name_rank(idx, response))
+        except Exception:
+            return None
+
+    @staticmethod
+    def _wall_time(
+        search_calls: int, ext_calls: int, latency: float, qps: float
+    ) -> float:
+        """
+        The crawl is bounded by concurrency over latency, by the download delay
+        of each of the two API hosts, and by the QPS limit of all AKs.
+        """
+        rate = Repo._concurrent_requests / latency
+        if Repo._download_delay:
+            rate = min(rate, 2 / Repo._download_delay)
+        wall_time = (search_calls + ext_calls) / rate
+        return max(wall_time, search_calls / (qps * len(Repo._ak_list)))
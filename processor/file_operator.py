@@ -1,33 +1,49 @@
 import logging
-
-import geopandas as gpd
-import pandas as pd
+from typing import TYPE_CHECKING
 
 from processor.aoi_container import AOI
+from processor.candidate_store import CandidateStore
+from processor.deduplicator import Deduplicator
+from processor.metrics import Metrics
+from processor.normalizer import Normalizer
 from processor.repository import Repo
-from spatial.coords import bd09ll_to_wgs84, gcj02_to_wgs84
-from spatial.geometry import wkt_to_geometry
+from processor.result_store import ResultStore
+from processor.simplifier import Simplifier
+from processor.startup import Startup
+from spatial.coords import bd09ll_to_wgs84_array, gcj02_to_wgs84_array
+
+if TYPE_CHECKING:
+    import pandas as pd
 
 
 class FileOperator(object):
     @staticmethod
     def add_cols() -> None:
         """
-        In the output `AOI csv`, five additional columns will be added:
+        In the output `AOI csv`, eight additional columns will be added:
             - status (str): 'Matched', 'No Uid' or 'No Geometry'
             - uid_name (str): name of the uid whose geometry is chosen
             - lng_wgs84 (float)/lat_wgs84 (float): longitude/latitude in wgs84 CRS
             - geometry (`wkt`, well known text): AOI polygon geometry
+            - crawled_at (str): UTC time of crawling, e.g. '2023-01-01T08:00:00Z'
+            - geom_hash (str): content hash of the geometry, to detect changes
+            - uid (str): Baidu uid of the AOI
+        The results are held in the `ResultStore` while crawling,
+        and restored from the normalized tables if `OUTPUT_NORMALIZED_DIR` is set.
         """
         for col in ["status", "uid_name", "lng_wgs84", "lat_wgs84", "geometry"]:
             if col not in Repo.file.columns:
                 Repo.file[col] = None
-        # the 'geometry' column will be saved as wkt in csv
-        # convert it to shapely geometry when re-crawling
-        Repo.file.geometry = Repo.file.geometry.apply(
-            lambda x: wkt_to_geometry(x) if isinstance(x, str) else x
-        )
-        logging.warning("(3/6) Additional columns appended.")
+        # added after the geometry, not to reorder the columns of older files
+        for col in ["crawled_at", "geom_hash", "uid"]:
+            if col not in Repo.file.columns:
+                Repo.file[col] = None
+        # columns read from an unfinished csv can be all NaN, i.e. of float dtype
+        for col in ["status", "uid_name", "geometry", "geom_hash", "uid"]:
+            Repo.file[col] = Repo.file[col].astype(object)
+        ResultStore.load()
+        Normalizer.open()
+        Startup.log_step(3, "Additional columns appended.")
 
     @classmethod
     def convert_crs_to_wgs84(cls) -> None:
@@ -38,48 +54,99 @@ class FileOperator(object):
         """
         if Repo._crs != "wgs84":
             # only support gcj02 and bd09ll conversion
-            if Repo._crs == "gc02":
-                cls._transform_crs(gcj02_to_wgs84)
+            if Repo._crs == "gcj02":
+                cls._transform_crs(gcj02_to_wgs84_array)
             elif Repo._crs == "bd09":
-                cls._transform_crs(bd09ll_to_wgs84)
-            logging.warning("(4/6) CRS converted to wgs84.")
+                cls._transform_crs(bd09ll_to_wgs84_array)
+            Startup.log_step(4, "CRS converted to wgs84.")
         # if the CRS is already wgs84, copy the original columns
         elif Repo._crs == "wgs84":
             cls._transform_crs(lambda x, y: (x, y))
-            logging.warning("(4/6) CRS is already wgs84.")
+            Startup.log_step(4, "CRS is already wgs84.")
 
     @staticmethod
     def write_aoi_and_status(idx: int, best_aoi: AOI) -> None:
         """
-        Write the best AOI geometry and crawling status into the file.
+        Write the best AOI geometry and crawling status into the file,
+        and fan them out to the duplicates of the POI.
+        """
+        ResultStore.write(
+            idx,
+            "Matched",
+            best_aoi.uid_name,
+            Simplifier.simplify(best_aoi.geometry),
+            uid=best_aoi.uid,
+            match=(
+                best_aoi.search_rank,
+                best_aoi.area,
+                best_aoi.distance,
+                best_aoi.similarity,
+            ),
+        )
+        Deduplicator.fan_out(idx)
+
+    @staticmethod
+    def write_status(idx: int, status: str) -> None:
+        """
+        Write the crawling status of a POI without AOI ('No Uid' or 'No Geometry')
+        into the file, and fan it out to the duplicates of the POI.
         """
-        Repo.file.loc[idx, "status"] = "Matched"
-        Repo.file.loc[idx, "geometry"] = best_aoi.geometry
-        Repo.file.loc[idx, "uid_name"] = best_aoi.uid_name
+        ResultStore.write(idx, status)
+        Deduplicator.fan_out(idx)
 
     @classmethod
     def save_file(cls) -> None:
         """
-        Save the file as csv and shp (if any geometry exists).
+        Save the file as csv and shp (if any geometry exists),
+        and flush the buffered candidates into the `CandidateStore`.
+        If `OUTPUT_NORMALIZED_DIR` is set, the geometries are only saved
+        in the normalized tables instead, see `save_denormalized`.
         """
-        cls._save_as_csv()
-        cls._save_as_shp()
+        with Metrics.timer("save"):
+            if Normalizer.enabled():
+                cls._save_as_csv(ResultStore.frame(geometry=False))
+                Normalizer.save()
+            else:
+                df = ResultStore.frame()
+                cls._save_as_csv(df)
+                cls._save_as_shp(df)
+            CandidateStore.flush()
+
+    @classmethod
+    def save_denormalized(cls) -> None:
+        """
+        Save the file as csv and shp with the geometry of every POI,
+        i.e. the view derived from the normalized tables.
+        """
+        df = ResultStore.frame()
+        cls._save_as_csv(df)
+        cls._save_as_shp(df)
+        logging.warning(
+            f"-- Denormalized csv and shp saved: "
+            f'"{Repo._poi_csv_path}", "{Repo._aoi_shp_path}".'
+        )
 
     @staticmethod
-    def _transform_crs(func: callable) -> pd.DataFrame:
-        Repo.file[["lng_wgs84", "lat_wgs84"]] = pd.DataFrame(
-            Repo.file.apply(lambda x: func(x.lng, x.lat), axis=1).tolist(),
-            index=Repo.file.index,
+    def _transform_crs(func: callable) -> None:
+        """
+        Transform the whole `lng` and `lat` columns at once with a vectorized `func`.
+        """
+        lng, lat = func(
+            Repo.file["lng"].to_numpy(dtype=float),
+            Repo.file["lat"].to_numpy(dtype=float),
         )
+        Repo.file["lng_wgs84"], Repo.file["lat_wgs84"] = lng, lat
 
     @staticmethod
-    def _save_as_csv() -> None:
-        Repo.file.to_csv(Repo._poi_csv_path, encoding="utf-8", index=False)
+    def _save_as_csv(df: "pd.DataFrame") -> None:
+        df.to_csv(Repo._poi_csv_path, encoding="utf-8", index=False)
 
     @staticmethod
-    def _save_as_shp() -> None:
-        df = Repo.file.dropna(subset=["geometry"])
+    def _save_as_shp(df: "pd.DataFrame") -> None:
+        df = df.dropna(subset=["geometry"])
         # export to shp only when there is at least one geometry
         if len(df):
+            import geopandas as gpd
+
             gdf = gpd.GeoDataFrame(df, geometry="geometry", crs="epsg:4326")
             gdf.to_file(Repo._aoi_shp_path, encoding="utf-8")
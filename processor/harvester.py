@@ -0,0 +1,539 @@
+import logging
+import math
+from typing import Dict, List, Tuple
+
+import numpy as np
+from numpy.typing import NDArray
+from scrapy.http import Response
+
+from processor.aoi_container import AOI, AOIContainer
+from processor.api_handler import APIHandler
+from processor.candidate_store import CandidateStore
+from processor.counter import Counter
+from processor.negative_cache import NegativeCache
+from processor.refresher import Refresher
+from processor.repository import Repo
+from processor.similarity import Similarity
+from spatial.coords import bd09ll_to_wgs84_array
+
+
+class _Cell(object):
+    """
+    A grid cell of POIs of an industry category, harvested together.
+    Its search bounds are the bounding box of its POIs widened by `GRID_MARGIN`.
+    """
+
+    __slots__ = (
+        "pois",
+        "industry",
+        "level",
+        "bounds",
+        "total",
+        "pages",
+        "received",
+        "results",
+        "locations",
+        "coords",
+        "pending",
+        "waited",
+        "harvesting",
+    )
+
+    def __init__(self, pois: List[int], industry: Tuple[str, str], level: int) -> None:
+        self.pois = pois
+        self.industry = industry
+        self.level = level  # times split
+        lng, lat = Harvester._locations(pois)
+        d_lng, d_lat = Harvester._degrees(Repo._grid_margin, lat.mean())
+        self.bounds = (lng.min() - d_lng, lat.min() - d_lat)
+        self.bounds += (lng.max() + d_lng, lat.max() + d_lat)
+        self.total = 0
+        self.pages = 1
+        self.received = 0
+        self.results = {}  # uid properties, by uid
+        self.locations = {}  # uid location in wgs84 CRS, by uid
+        self.coords = {}  # polygon coordinates of the requested uids, by uid
+        self.pending = 0  # uids requested but not received yet
+        self.waited = False  # whether its decision waited for observations
+        self.harvesting = False  # whether it is decided to be harvested
+
+
+class Harvester(object):
+    """
+    Grid harvesting of dense regions, instead of a uid search per POI.
+
+    The POIs to crawl are tiled into `GRID_CELL_SIZE` x `GRID_CELL_SIZE` meters
+    cells by industry category. A cell of at least `GRID_MIN_POIS` POIs is probed
+    by the first page of a search of its category within its bounds, whose total
+    tells the API calls needed to harvest it: the remaining pages, and an AOI
+    request per uid within `GRID_MARGIN` of one of its POIs (estimated from the
+    first page), plus searching again the POIs it is expected to leave unmatched
+    (see `_unmatched_rate`). The cell is harvested if this takes fewer calls than
+    searching its POIs one by one, i.e. a search and the mean AOI requests per POI
+    searched (see `_aoi_requests_per_poi`), and its POIs are searched one by one
+    otherwise. As these costs are observed in this crawl, a probed cell waits
+    until `MIN_OBSERVED` POIs are searched one by one, and if none are left to
+    search, the smallest waiting cell is searched one by one (see `waiting`).
+    Likewise, until a harvested cell tells how many POIs are left unmatched,
+    the first cell that takes fewer calls if all its POIs are matched is harvested,
+    and the others wait for it. A cell with more results than can be paged
+    through is split into quarters first, up to `MAX_SPLITS` times.
+
+    The AOI of each uid of a harvested cell is requested once, however many POIs
+    it is a candidate of, and the POIs are then matched by `AOI_list` as usual,
+    except that candidates are ranked by name similarity (and distance) instead
+    of search rank. The POIs left without a valid AOI are searched one by one
+    afterwards, as their AOI may not be of the category, without requesting
+    again the AOIs already tried for them in the cell (unless the `CandidateStore`
+    keeps every candidate).
+    """
+
+    PAGE_SIZE = 20
+    MAX_RESULTS = 150  # results of a search beyond this are not returned
+    MAX_SPLITS = 3
+    MIN_OBSERVED = 20  # POIs searched before the costs are estimated
+
+    _cells: Dict[int, _Cell] = {}
+    _urls = {}  # uid search urls of the POIs held by cells, by POI index
+    _waiting = []  # probed cells waiting to be decided
+    _unsearched = set()  # POIs to search one by one, whose search has not returned
+    _searched = 0  # POIs whose search has returned, except fallbacks
+    _fallbacks = set()  # POIs left unmatched by their cell, searched again
+    _fallbacks_searched = 0  # fallbacks whose search has returned
+    _tried = {}  # uids already tried for every fallback in its cell
+    _next_id = 0
+    _stats = {}
+
+    @staticmethod
+    def enabled() -> bool:
+        return bool(Repo._grid_cell_size)
+
+    @classmethod
+    def plan(cls, idx_url_tuples: List[Tuple[int, str]]) -> List[int]:
+        """
+        Tile the POIs to crawl, i.e. the `(DataFrame_idx, url)` tuples of
+        `APIHandler.assemble_uid_urls`, into cells, and return the cells to probe.
+        Their POIs are held until their cells are finished (see `holds`).
+        """
+        import pandas as pd
+
+        cls._cells, cls._urls, cls._next_id = {}, {}, 0
+        cls._waiting, cls._unsearched, cls._searched = [], set(), 0
+        cls._fallbacks, cls._fallbacks_searched, cls._tried = set(), 0, {}
+        cls._stats = dict.fromkeys(
+            [
+                "probed",
+                "harvested",
+                "searches",
+                "aoi_requests",
+                "matched",
+                "unmatched",
+                "searched",
+            ],
+            0,
+        )
+        if not cls.enabled():
+            return []
+        # refreshed POIs with a cached search do not need any search
+        urls = {
+            idx: url for idx, url in idx_url_tuples if idx not in Refresher._searches
+        }
+        df = Repo.file.loc[list(urls)]
+        prim_inds, sec_inds = APIHandler._industries(df)
+        lng = df["lng_wgs84"].to_numpy(dtype=float)
+        lat = df["lat_wgs84"].to_numpy(dtype=float)
+        # equirectangular approximation, as in `Deduplicator`
+        x = lng * 111320 * np.cos(np.radians(lat))
+        y = lat * 110574
+        keys = pd.DataFrame(
+            {
+                "prim_ind": pd.Series(list(prim_inds)).fillna("").astype(str).values,
+                "sec_ind": pd.Series(list(sec_inds)).fillna("").astype(str).values,
+                "x": np.floor(x / Repo._grid_cell_size),
+                "y": np.floor(y / Repo._grid_cell_size),
+            },
+            index=df.index,
+        )
+        # POIs without industry category cannot be searched by category
+        keys = keys[(keys["prim_ind"] != "") | (keys["sec_ind"] != "")]
+        probes = []
+        for (prim_ind, sec_ind, _, _), pois in keys.groupby(
+            list(keys.columns), sort=False
+        ).groups.items():
+            if len(pois) >= Repo._grid_min_pois:
+                probes.append(cls._add_cell(list(pois), (prim_ind, sec_ind), 0))
+        cls._urls = {
+            idx: urls[idx] for cell in cls._cells.values() for idx in cell.pois
+        }
+        cls._unsearched = {idx for idx, _ in idx_url_tuples if idx not in cls._urls}
+        logging.warning(
+            f"-- Grid harvesting: {len(probes)} cells of "
+            f"{len(cls._urls)} POIs to probe."
+        )
+        return probes
+
+    @classmethod
+    def holds(cls, idx: int) -> bool:
+        """
+        Whether the POI is in a cell, i.e. not to be searched one by one (yet).
+        """
+        return idx in cls._urls
+
+    @classmethod
+    def active(cls, cell: int) -> bool:
+        """
+        Whether the cell is still crawled, i.e. not finished or given up.
+        """
+        return cell in cls._cells
+
+    @classmethod
+    def url(cls, cell: int, page: int) -> str:
+        """
+        Return the search url of a page of the cell.
+        """
+        cls._stats["searches"] += 1
+        cls._stats["probed"] += page == 0
+        c = cls._cells[cell]
+        return APIHandler.assemble_area_url(c.bounds, *c.industry, page, cls.PAGE_SIZE)
+
+    @classmethod
+    def add_page(cls, cell: int, page: int, response: Response) -> None:
+        """
+        Keep the search results of a page of the cell.
+        """
+        c = cls._cells[cell]
+        total, u_properties = APIHandler.extract_area_results(response)
+        if page == 0:
+            c.total = total
+            c.pages = max(math.ceil(min(total, cls.MAX_RESULTS) / cls.PAGE_SIZE), 1)
+        c.received += 1
+        u_properties = [u for u in u_properties if u["uid"] not in c.results]
+        if u_properties:
+            lng, lat = bd09ll_to_wgs84_array(
+                np.array([u["u_lng"] for u in u_properties], dtype=float),
+                np.array([u["u_lat"] for u in u_properties], dtype=float),
+            )
+            for u, u_lng, u_lat in zip(u_properties, lng, lat):
+                c.results[u["uid"]] = u
+                c.locations[u["uid"]] = (u_lng, u_lat)
+
+    @classmethod
+    def decide(cls, cell: int) -> str:
+        """
+        Decide whether to 'harvest' a probed cell, 'split' it, 'search' its POIs
+        one by one, or 'wait' until enough POIs are searched one by one
+        (see `waiting`) to compare the costs, see `Harvester`.
+        """
+        c = cls._cells[cell]
+        if c.total > cls.MAX_RESULTS:
+            return "split" if c.level < cls.MAX_SPLITS else "search"
+        near = cls._near(c)
+        if not near.any():
+            return "search"
+        if cls._searched < cls.MIN_OBSERVED:
+            if c.waited:
+                # searched one by one to observe the costs, see `waiting`
+                return "search"
+            c.waited = True
+            cls._waiting.append(cell)
+            return "wait"
+        search_calls = len(c.pois) * (1 + cls._aoi_requests_per_poi())
+        harvest_calls = c.pages - 1 + c.total * near.mean()
+        if harvest_calls >= search_calls:
+            # even if all its POIs are matched
+            return "search"
+        unmatched_rate = cls._unmatched_rate()
+        if unmatched_rate is None:
+            if cls._harvesting():
+                cls._waiting.append(cell)
+                return "wait"
+            # harvested to observe how many POIs are left unmatched
+            c.harvesting = True
+            return "harvest"
+        fallback_requests = cls._aoi_requests_per_poi(fallback=True)
+        if fallback_requests is None:
+            fallback_requests = cls._aoi_requests_per_poi()
+        harvest_calls += unmatched_rate * len(c.pois) * (1 + fallback_requests)
+        if harvest_calls < search_calls:
+            c.harvesting = True
+            return "harvest"
+        return "search"
+
+    @classmethod
+    def searched(cls, idx: int) -> None:
+        """
+        Count a POI searched one by one when its search returns (or is skipped).
+        """
+        if idx in cls._unsearched:
+            cls._unsearched.discard(idx)
+            if idx in cls._fallbacks:
+                cls._fallbacks_searched += 1
+                cls._tried.pop(idx, None)  # e.g. if no uid is found
+            else:
+                cls._searched += 1
+
+    @classmethod
+    def untried(
+        cls, idx: int, uid_name_rank_triples: List[Tuple[str, str, int]]
+    ) -> List[Tuple[str, str, int]]:
+        """
+        Return the `(uid_name, uid, search_rank)` triples of a POI searched
+        one by one, but the ones already tried for it in its cell, if any.
+        """
+        tried = cls._tried.pop(idx, None)
+        if not tried:
+            return uid_name_rank_triples
+        return [triple for triple in uid_name_rank_triples if triple[1] not in tried]
+
+    @classmethod
+    def waiting(cls) -> List[int]:
+        """
+        Return the cells waiting to be decided, once they can be. If too few
+        POIs are searched one by one and no more will be, e.g. all the POIs are
+        in cells, the smallest cell is returned alone to be searched one by one.
+        """
+        if not cls._waiting or cls._observing():
+            return []
+        if cls._searched < cls.MIN_OBSERVED:
+            cell = min(cls._waiting, key=lambda cell: len(cls._cells[cell].pois))
+            cls._waiting.remove(cell)
+            return [cell]
+        cells, cls._waiting = cls._waiting, []
+        return [cell for cell in cells if cell in cls._cells]
+
+    @classmethod
+    def pages(cls, cell: int) -> int:
+        return cls._cells[cell].pages
+
+    @classmethod
+    def all_pages_received(cls, cell: int) -> bool:
+        c = cls._cells[cell]
+        return c.received == c.pages
+
+    @classmethod
+    def split(cls, cell: int) -> Tuple[List[int], List[Tuple[int, str]]]:
+        """
+        Split the cell into quarters at the center of its POIs, and return
+        the quarters to probe, and the `(DataFrame_idx, url)` tuples
+        of the POIs to search one by one, i.e. of the quarters too small.
+        """
+        c = cls._cells.pop(cell)
+        lng, lat = cls._locations(c.pois)
+        east = lng > (lng.min() + lng.max()) / 2
+        north = lat > (lat.min() + lat.max()) / 2
+        probes, idx_url_tuples = [], []
+        for quarter in [~east & ~north, east & ~north, ~east & north, east & north]:
+            pois = [idx for idx, inside in zip(c.pois, quarter) if inside]
+            if len(pois) >= Repo._grid_min_pois:
+                probes.append(cls._add_cell(pois, c.industry, c.level + 1))
+            else:
+                idx_url_tuples += cls._release(pois)
+        return probes, idx_url_tuples
+
+    @classmethod
+    def release(cls, cell: int) -> List[Tuple[int, str]]:
+        """
+        Give up the cell, and return the `(DataFrame_idx, url)` tuples
+        of its POIs to search one by one.
+        """
+        c = cls._cells.pop(cell, None)
+        return cls._release(c.pois) if c else []
+
+    @classmethod
+    def candidates(cls, cell: int) -> List[Tuple[str, str, int]]:
+        """
+        Return the `(uid_name, uid, search_rank)` triples of the uids of the cell
+        to request, i.e. within `GRID_MARGIN` of one of its POIs, and not known to
+        have no geometry. The search rank is meaningless here.
+        """
+        c = cls._cells[cell]
+        triples = [
+            (c.results[uid]["uid_name"], uid, 0)
+            for uid, near in zip(c.results, cls._near(c))
+            if near
+        ]
+        triples = NegativeCache.filter_uids(triples)
+        c.pending = len(triples)
+        cls._stats["harvested"] += 1
+        cls._stats["aoi_requests"] += len(triples)
+        return triples
+
+    @classmethod
+    def add_geometry(cls, cell: int, uid: str, coords: NDArray | None) -> bool:
+        """
+        Keep the polygon coordinates of an uid of the cell (None if it has none),
+        and return whether all the uids requested are received.
+        """
+        c = cls._cells[cell]
+        if coords is not None:
+            c.coords[uid] = coords
+        c.pending -= 1
+        return c.pending == 0
+
+    @classmethod
+    def match(cls, cell: int) -> Tuple[List[Tuple[int, AOI]], List[Tuple[int, str]]]:
+        """
+        Match the POIs of the harvested cell to its AOIs in the `AOIContainer`,
+        and return the `(DataFrame_idx, best_aoi)` tuples of the POIs matched,
+        and the `(DataFrame_idx, url)` tuples of the other POIs to search one by one.
+        """
+        c = cls._cells.pop(cell)
+        uids = list(c.coords)
+        names = [c.results[uid]["uid_name"] for uid in uids]
+        bounds = np.array(
+            [(*c.coords[uid].min(axis=0), *c.coords[uid].max(axis=0)) for uid in uids]
+        ).reshape(-1, 4)
+        locations = np.array([c.locations[uid] for uid in uids]).reshape(-1, 2)
+        matched, unmatched = [], []
+        for idx in c.pois:
+            untried = []
+            p_property = APIHandler._get_poi_property(Repo.file, idx)
+            p_lng, p_lat = p_property["p_lng"], p_property["p_lat"]
+            # only AOIs whose bounding box contains the POI can be valid
+            inside = np.flatnonzero(
+                (bounds[:, 0] <= p_lng)
+                & (p_lng <= bounds[:, 2])
+                & (bounds[:, 1] <= p_lat)
+                & (p_lat <= bounds[:, 3])
+            )
+            inside = [
+                i
+                for i in inside
+                if APIHandler._pass_filter_rules(**p_property, **c.results[uids[i]])
+            ]
+            if inside:
+                # rank as a search of the POI name would: by similarity, then distance
+                similarity = Similarity.score(
+                    Similarity.features(Repo.file.loc[idx, "name"]),
+                    [names[i] for i in inside],
+                )
+                distance = cls._distances(locations[inside], p_lng, p_lat)
+                order = np.lexsort((distance, -similarity))
+                if Repo._use_first_uid:
+                    untried = [uids[inside[i]] for i in order[1:]]
+                    order = order[:1]
+                for rank, i in enumerate(order):
+                    uid = uids[inside[i]]
+                    AOIContainer.append(
+                        idx, rank + 1, uid, names[inside[i]], c.coords[uid]
+                    )
+            best_aoi = AOIContainer.get_best_aoi(idx)
+            if best_aoi:
+                matched.append((idx, best_aoi))
+            else:
+                # dropped without recording its candidates, as it is searched again
+                AOIContainer._dict.pop(idx, None)
+                unmatched.append(idx)
+                if not CandidateStore.enabled():
+                    cls._tried[idx] = set(uids).difference(untried)
+        for idx, _ in matched:
+            del cls._urls[idx]
+        cls._stats["matched"] += len(matched)
+        cls._stats["unmatched"] += len(unmatched)
+        cls._fallbacks.update(unmatched)
+        return matched, cls._release(unmatched)
+
+    @classmethod
+    def report(cls) -> Dict[str, int]:
+        """
+        Return the cells probed and harvested, the searches and AOI requests
+        of the cells, the POIs of harvested cells matched or not, and the POIs
+        searched one by one.
+        """
+        return dict(cls._stats)
+
+    @classmethod
+    def _aoi_requests_per_poi(cls, fallback: bool = False) -> float | None:
+        """
+        Mean AOI requests per POI searched one by one, with or without candidates,
+        or per fallback if `fallback`, i.e. of the uids not tried in its cell,
+        None if no fallback is searched yet.
+        """
+        totals = Counter._df["poi_aoi_total"]
+        fallback_total = float(totals.loc[list(cls._fallbacks)].sum())
+        if not fallback:
+            return (float(totals.sum()) - fallback_total) / cls._searched
+        if cls._fallbacks_searched:
+            return fallback_total / cls._fallbacks_searched
+
+    @classmethod
+    def _harvesting(cls) -> bool:
+        """
+        Whether a cell is being harvested.
+        """
+        return any(c.harvesting for c in cls._cells.values())
+
+    @classmethod
+    def _observing(cls) -> bool:
+        """
+        Whether fewer than `MIN_OBSERVED` POIs are searched one by one, while more
+        will be, i.e. POIs are being searched, or cells not waiting are crawled,
+        or whether the first cell harvested is not matched yet.
+        """
+        if cls._unmatched_rate() is None and cls._harvesting():
+            return True
+        return cls._searched < cls.MIN_OBSERVED and bool(
+            cls._unsearched or len(cls._waiting) < len(cls._cells)
+        )
+
+    @classmethod
+    def _unmatched_rate(cls) -> float | None:
+        """
+        Share of the POIs of harvested cells left unmatched, i.e. searched again,
+        None until a cell is matched.
+        """
+        observed = cls._stats["matched"] + cls._stats["unmatched"]
+        if observed:
+            return cls._stats["unmatched"] / observed
+
+    @classmethod
+    def _add_cell(cls, pois: List[int], industry: Tuple[str, str], level: int) -> int:
+        cell, cls._next_id = cls._next_id, cls._next_id + 1
+        cls._cells[cell] = _Cell(pois, industry, level)
+        return cell
+
+    @classmethod
+    def _release(cls, pois: List[int]) -> List[Tuple[int, str]]:
+        """
+        Stop holding the POIs, and return their `(DataFrame_idx, url)` tuples
+        to search them one by one.
+        """
+        cls._stats["searched"] += len(pois)
+        cls._unsearched.update(pois)
+        return [(idx, cls._urls.pop(idx)) for idx in pois]
+
+    @classmethod
+    def _near(cls, c: _Cell) -> NDArray:
+        """
+        Boolean mask of the results of the cell within `GRID_MARGIN` of one of its POIs.
+        """
+        lng, lat = cls._locations(c.pois)
+        locations = np.array(list(c.locations.values())).reshape(-1, 2)
+        distance = np.array(
+            [cls._distances(locations, p_lng, p_lat) for p_lng, p_lat in zip(lng, lat)]
+        )
+        return distance.min(axis=0) <= Repo._grid_margin
+
+    @classmethod
+    def _distances(cls, locations: NDArray, p_lng: float, p_lat: float) -> NDArray:
+        """
+        Approximate distances (in meters) between the locations and a POI.
+        """
+        d_lng, d_lat = cls._degrees(1, p_lat)
+        return np.hypot(
+            (locations[:, 0] - p_lng) / d_lng, (locations[:, 1] - p_lat) / d_lat
+        )
+
+    @staticmethod
+    def _degrees(meters: float, lat: float) -> Tuple[float, float]:
+        """
+        Longitude and latitude degrees of a distance in meters around a latitude.
+        """
+        return meters / (111320 * np.cos(np.radians(lat))), meters / 110574
+
+    @staticmethod
+    def _locations(pois: List[int]) -> Tuple[NDArray, NDArray]:
+        return (
+            Repo.file.loc[pois, "lng_wgs84"].to_numpy(dtype=float),
+            Repo.file.loc[pois, "lat_wgs84"].to_numpy(dtype=float),
+        )
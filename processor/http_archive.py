@@ -0,0 +1,118 @@
+import hashlib
+import json
+import os
+import sqlite3
+import time
+import zlib
+from contextlib import contextmanager
+from typing import Iterator, Tuple
+
+from w3lib.url import canonicalize_url, url_query_cleaner
+
+from processor.repository import Repo
+
+
+class HttpArchive(object):
+    """
+    Local archive of Baidu API responses in a sqlite file (`HTTP_ARCHIVE_PATH`),
+    with one row per request fingerprint: `(fingerprint, url, status, headers, body,
+    recorded_at)`, where headers are json and the body is zlib compressed.
+
+    The fingerprint ignores the host and the random `ak`, so that an archive
+    recorded from Baidu (or the benchmark stand-in) replays under any endpoint.
+    """
+
+    _conn = None
+    _pending = 0
+    COMMIT_EVERY = 500
+
+    @classmethod
+    def open(cls) -> None:
+        if not cls.enabled():
+            return
+        if Repo._http_archive_mode == "replay" and not os.path.exists(
+            Repo._http_archive_path
+        ):
+            raise FileNotFoundError(
+                f'HTTP_ARCHIVE_PATH not found: "{Repo._http_archive_path}".'
+            )
+        os.makedirs(os.path.dirname(Repo._http_archive_path) or ".", exist_ok=True)
+        cls._connect()
+
+    @classmethod
+    @contextmanager
+    def reading(cls) -> Iterator[bool]:
+        """
+        Open the archive for offline reading whatever `HTTP_ARCHIVE_MODE` is,
+        and yield whether it exists.
+        """
+        exists = bool(Repo._http_archive_path) and os.path.exists(
+            Repo._http_archive_path
+        )
+        if exists:
+            cls._connect()
+        try:
+            yield exists
+        finally:
+            cls.close()
+
+    @classmethod
+    def _connect(cls) -> None:
+        cls._conn = sqlite3.connect(Repo._http_archive_path)
+        cls._conn.execute(
+            "CREATE TABLE IF NOT EXISTS archive ("
+            "fingerprint TEXT PRIMARY KEY, url TEXT, status INTEGER, "
+            "headers TEXT, body BLOB, recorded_at REAL)"
+        )
+        cls._pending = 0
+
+    @classmethod
+    def close(cls) -> None:
+        if cls._conn is not None:
+            cls._conn.commit()
+            cls._conn.close()
+            cls._conn = None
+
+    @staticmethod
+    def enabled() -> bool:
+        return bool(Repo._http_archive_mode)
+
+    @staticmethod
+    def fingerprint(url: str) -> str:
+        """
+        sha1 of the canonical path and query of `url`, without the `ak` parameter.
+        """
+        url = canonicalize_url(url_query_cleaner(url, ["ak"], remove=True))
+        path = url.split("://", 1)[-1].split("/", 1)[-1]
+        return hashlib.sha1(path.encode("utf-8")).hexdigest()
+
+    @classmethod
+    def get(cls, url: str) -> Tuple[int, dict, bytes] | None:
+        """
+        Return the archived `(status, headers, body)` of `url`, or None if missing.
+        """
+        row = cls._conn.execute(
+            "SELECT status, headers, body FROM archive WHERE fingerprint = ?",
+            (cls.fingerprint(url),),
+        ).fetchone()
+        if row is not None:
+            status, headers, body = row
+            return status, json.loads(headers), zlib.decompress(body)
+
+    @classmethod
+    def put(cls, url: str, status: int, headers: dict, body: bytes) -> None:
+        cls._conn.execute(
+            "INSERT OR REPLACE INTO archive VALUES (?, ?, ?, ?, ?, ?)",
+            (
+                cls.fingerprint(url),
+                url_query_cleaner(url, ["ak"], remove=True),
+                status,
+                json.dumps(headers),
+                zlib.compress(body),
+                time.time(),
+            ),
+        )
+        cls._pending += 1
+        if cls._pending >= cls.COMMIT_EVERY:
+            cls._conn.commit()
+            cls._pending = 0
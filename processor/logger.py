@@ -1,6 +1,15 @@
 import logging
 
+from processor.aoi_container import AOIContainer
 from processor.counter import Counter
+from processor.deduplicator import Deduplicator
+from processor.harvester import Harvester
+from processor.negative_cache import NegativeCache
+from processor.prescreener import Prescreener
+from processor.refresher import Refresher
+from processor.repository import Repo
+from processor.session_pool import SessionPool
+from processor.simplifier import Simplifier
 
 
 class Logger(object):
@@ -33,13 +42,32 @@ class Logger(object):
             f"{uid_name} of POI index {idx} failed to parse AOI. Reason: {exception}"
         )
 
+    @staticmethod
+    def log_cell_fail(exception: Exception, cell: int) -> None:
+        logging.error(f"Grid cell {cell} failed to parse uids. Reason: {exception}")
+
+    @staticmethod
+    def log_cell_aoi_fail(exception: Exception, cell: int, uid_name: str) -> None:
+        logging.error(
+            f"{uid_name} of grid cell {cell} failed to parse AOI. Reason: {exception}"
+        )
+
     @staticmethod
     def log_update() -> None:
         avg_speed, xTime = Counter._cal_speed_xTime()
         logging.warning(f"-- Updated. Avg speed: {avg_speed}. Time remaining: {xTime}.")
 
     @staticmethod
-    def log_finish() -> None:
+    def log_simplification() -> None:
+        if Simplifier.enabled():
+            reduction, max_error = Simplifier.report()
+            logging.warning(
+                f"-- Output geometries simplified: wkt size reduced by {reduction:.2%}, "
+                f"max Hausdorff error {max_error:.2f} m."
+            )
+
+    @classmethod
+    def log_finish(cls) -> None:
         avg_speed, _ = Counter._cal_speed_xTime()
         total_time = Counter._total_time()
         poi_missing = Counter._count_missing()
@@ -58,3 +86,55 @@ class Logger(object):
             )
         else:
             logging.warning("-- All POIs are crawled. Re-crawling is not needed.")
+        searches_saved, aoi_requests_saved = Deduplicator.saved_calls()
+        if searches_saved:
+            logging.warning(
+                f"-- Deduplication saved {searches_saved} uid searches "
+                f"and {aoi_requests_saved} AOI requests."
+            )
+        cls.log_simplification()
+        if Repo._decisive_match:
+            logging.warning(
+                f"-- {AOIContainer._decided} POIs finished early by a decisive match, "
+                f"{AOIContainer._saved} AOI requests saved."
+            )
+        if Prescreener.enabled():
+            skipped, audited, agreed = Prescreener.report()
+            logging.warning(f"-- Pre-screening saved {skipped} AOI requests.")
+            if audited:
+                logging.warning(
+                    f"-- Pre-screening audit: the best AOI is in the top-K "
+                    f"for {agreed}/{audited} ({agreed / audited:.2%}) POIs."
+                )
+        if Harvester.enabled():
+            stats = Harvester.report()
+            logging.warning(
+                f"-- Grid harvesting: {stats['harvested']}/{stats['probed']} cells "
+                f"harvested with {stats['searches']} searches "
+                f"and {stats['aoi_requests']} AOI requests, "
+                f"{stats['matched']} POIs matched, "
+                f"{stats['searched']} POIs searched one by one instead."
+            )
+        if Refresher.enabled():
+            selected, reused, changes = Refresher.report()
+            logging.warning(
+                f"-- Refresh: {selected} POIs selected, {reused} uid searches reused. "
+                f"Geometries: {changes['unchanged']} unchanged, "
+                f"{changes['changed']} changed, {changes['added']} added "
+                f"and {changes['removed']} removed."
+            )
+        if NegativeCache.enabled():
+            hits, added = NegativeCache._hits, NegativeCache._added
+            logging.warning(
+                f"-- Negative cache skipped {hits['no_uid']} uid searches "
+                f"and {hits['no_geometry']} AOI requests, "
+                f"recorded {added['no_uid']} searches and {added['no_geometry']} uids."
+            )
+        if SessionPool.enabled():
+            stats = SessionPool.report_stats()
+            logging.warning(
+                f"-- Session pool: {stats['created']} sessions created, "
+                f"{stats['requests_per_session']:.1f} requests per session, "
+                f"{stats['blocked']} blocked, {stats['failed']} failed "
+                f"and {stats['rotated']} rotated."
+            )
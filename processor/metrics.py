@@ -0,0 +1,146 @@
+import bisect
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator, Tuple
+
+
+class Histogram(object):
+    """
+    Histogram of durations (in seconds) over the bucket bounds of `Metrics.BUCKETS`.
+    """
+
+    __slots__ = ("counts", "sum", "count", "max")
+
+    def __init__(self) -> None:
+        self.counts = [0] * (len(Metrics.BUCKETS) + 1)  # the last one is +Inf
+        self.sum = 0.0
+        self.count = 0
+        self.max = 0.0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect.bisect_left(Metrics.BUCKETS, value)] += 1
+        self.sum += value
+        self.count += 1
+        self.max = max(self.max, value)
+
+    def quantile(self, q: float) -> float:
+        """
+        Upper bound of the bucket where the `q` quantile falls in,
+        capped by the maximum observed value.
+        """
+        rank, seen = q * self.count, 0
+        for bound, count in zip(Metrics.BUCKETS, self.counts):
+            seen += count
+            if seen >= rank:
+                return min(bound, self.max)
+        return self.max
+
+    def summary(self) -> Dict[str, float]:
+        return dict(
+            count=self.count,
+            mean=self.sum / self.count if self.count else 0.0,
+            p50=self.quantile(0.5),
+            p95=self.quantile(0.95),
+            p99=self.quantile(0.99),
+            max=self.max,
+        )
+
+
+class Metrics(object):
+    """
+    Per-stage latency histograms and in-flight gauges of the crawl, with stages:
+        - download: download latency, labelled by API host
+        - queue_wait: time from being scheduled to reaching the downloader
+        - proxy_fetch: time to fetch a proxy from the proxy pool
+        - parse_uid/parse_aoi: CPU time of parsing uid search/AOI responses
+        - aoi_append: CPU time of `AOIContainer.append`
+        - save: duration of `FileOperator.save_file`
+    """
+
+    BUCKETS = (
+        0.0001,
+        0.0005,
+        0.001,
+        0.0025,
+        0.005,
+        0.01,
+        0.025,
+        0.05,
+        0.1,
+        0.25,
+        0.5,
+        1.0,
+        2.5,
+        5.0,
+        10.0,
+        30.0,
+    )
+    _histograms: Dict[Tuple[str, str], Histogram] = {}
+    _gauges: Dict[str, float] = {}
+
+    @classmethod
+    def reset(cls) -> None:
+        cls._histograms = {}
+        cls._gauges = {}
+
+    @classmethod
+    def observe(cls, stage: str, seconds: float, host: str = "") -> None:
+        key = (stage, host)
+        if key not in cls._histograms:
+            cls._histograms[key] = Histogram()
+        cls._histograms[key].observe(seconds)
+
+    @classmethod
+    def set_gauge(cls, name: str, value: float) -> None:
+        cls._gauges[name] = value
+
+    @classmethod
+    @contextmanager
+    def timer(cls, stage: str, cpu: bool = False) -> Iterator[None]:
+        """
+        Observe the wall time (or the CPU time of this thread if `cpu`) of a block.
+        """
+        clock = time.thread_time if cpu else time.perf_counter
+        start = clock()
+        try:
+            yield
+        finally:
+            cls.observe(stage, clock() - start)
+
+    @classmethod
+    def summary(cls) -> Dict[str, Dict[str, float]]:
+        """
+        Summaries of all histograms, keyed by `stage` or `stage/host`.
+        """
+        return {
+            f"{stage}/{host}" if host else stage: histogram.summary()
+            for (stage, host), histogram in sorted(cls._histograms.items())
+        }
+
+    @classmethod
+    def snapshot(cls) -> dict:
+        return dict(time=time.time(), gauges=dict(cls._gauges), stages=cls.summary())
+
+    @classmethod
+    def prometheus(cls) -> str:
+        """
+        Render all metrics in Prometheus text exposition format.
+        """
+        lines = [
+            "# HELP baidu_aoi_stage_seconds Duration of each crawling stage.",
+            "# TYPE baidu_aoi_stage_seconds histogram",
+        ]
+        for (stage, host), histogram in sorted(cls._histograms.items()):
+            labels = f'stage="{stage}"' + (f',host="{host}"' if host else "")
+            cumulative = 0
+            for bound, count in zip(cls.BUCKETS + ("+Inf",), histogram.counts):
+                cumulative += count
+                lines.append(
+                    f'baidu_aoi_stage_seconds_bucket{{{labels},le="{bound}"}} {cumulative}'
+                )
+            lines.append(f"baidu_aoi_stage_seconds_sum{{{labels}}} {histogram.sum}")
+            lines.append(f"baidu_aoi_stage_seconds_count{{{labels}}} {histogram.count}")
+        for name, value in sorted(cls._gauges.items()):
+            lines.append(f"# TYPE baidu_aoi_{name} gauge")
+            lines.append(f"baidu_aoi_{name} {value}")
+        return "\n".join(lines) + "\n"
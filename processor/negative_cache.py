@@ -0,0 +1,115 @@
+import os
+import sqlite3
+import time
+from typing import List, Tuple
+
+from processor.http_archive import HttpArchive
+from processor.repository import Repo
+
+
+class NegativeCache(object):
+    """
+    Cache of the requests that returned nothing, kept across crawls in a sqlite file
+    (`NEGATIVE_CACHE_PATH`), with one row per `(kind, key, recorded_at)`:
+        - 'no_uid': uid searches without any valid uid, keyed by the fingerprint
+          of the search url, i.e. name, location, radius and industry tag
+        - 'no_geometry': uids whose AOI response has no geometry, keyed by uid
+    Entries expire after `NEGATIVE_CACHE_TTL` days of their kind, and are ignored
+    (but still recorded) if `NEGATIVE_CACHE_FORCE` is on.
+    """
+
+    KINDS = ["no_uid", "no_geometry"]
+    COMMIT_EVERY = 500
+    _conn = None
+    _entries = {kind: set() for kind in KINDS}
+    _hits = {kind: 0 for kind in KINDS}
+    _added = {kind: 0 for kind in KINDS}
+    _pending = 0
+
+    @classmethod
+    def open(cls) -> None:
+        cls._entries = {kind: set() for kind in cls.KINDS}
+        cls._hits = {kind: 0 for kind in cls.KINDS}
+        cls._added = {kind: 0 for kind in cls.KINDS}
+        cls._pending = 0
+        if not cls.enabled():
+            return
+        os.makedirs(os.path.dirname(Repo._negative_cache_path) or ".", exist_ok=True)
+        cls._conn = sqlite3.connect(Repo._negative_cache_path)
+        cls._conn.execute(
+            "CREATE TABLE IF NOT EXISTS negative ("
+            "kind TEXT, key TEXT, recorded_at REAL, PRIMARY KEY (kind, key))"
+        )
+        if Repo._negative_cache_force:
+            return
+        now = time.time()
+        for kind in cls.KINDS:
+            ttl = Repo._negative_cache_ttl[kind] * 86400  # days to seconds
+            rows = cls._conn.execute(
+                "SELECT key FROM negative WHERE kind = ? AND recorded_at > ?",
+                (kind, now - ttl),
+            )
+            cls._entries[kind] = {key for key, in rows}
+
+    @classmethod
+    def close(cls) -> None:
+        if cls._conn is not None:
+            cls._conn.commit()
+            cls._conn.close()
+            cls._conn = None
+
+    @staticmethod
+    def enabled() -> bool:
+        return bool(Repo._negative_cache_path)
+
+    @classmethod
+    def has_search(cls, url: str) -> bool:
+        """
+        Whether the uid search `url` is known to return no valid uid.
+        """
+        return cls._has("no_uid", HttpArchive.fingerprint(url))
+
+    @classmethod
+    def add_search(cls, url: str) -> None:
+        cls._add("no_uid", HttpArchive.fingerprint(url))
+
+    @classmethod
+    def filter_uids(
+        cls, uid_name_rank_triples: List[Tuple[str, str, int]]
+    ) -> List[Tuple[str, str, int]]:
+        """
+        Drop the `(uid_name, uid, search_rank)` triples whose uid
+        is known to have no geometry.
+        """
+        return [
+            triple
+            for triple in uid_name_rank_triples
+            if not cls._has("no_geometry", triple[1])
+        ]
+
+    @classmethod
+    def add_uid(cls, uid: str) -> None:
+        cls._add("no_geometry", uid)
+
+    @classmethod
+    def _has(cls, kind: str, key: str) -> bool:
+        if key in cls._entries[kind]:
+            cls._hits[kind] += 1
+            return True
+        return False
+
+    @classmethod
+    def _add(cls, kind: str, key: str) -> None:
+        if cls._conn is None:
+            return
+        # also skip the key for the rest of this crawl, e.g. a uid shared by POIs
+        if not Repo._negative_cache_force and Repo._negative_cache_ttl[kind]:
+            cls._entries[kind].add(key)
+        cls._conn.execute(
+            "INSERT OR REPLACE INTO negative VALUES (?, ?, ?)", (kind, key, time.time())
+        )
+        cls._added[kind] += 1
+        cls._pending += 1
+        if cls._pending >= cls.COMMIT_EVERY:
+            cls._conn.commit()
+            cls._pending = 0
@@ -0,0 +1,93 @@
+import os
+
+from processor.repository import Repo
+from processor.result_store import ResultStore
+
+
+class Normalizer(object):
+    """
+    Normalized output in `OUTPUT_NORMALIZED_DIR`, where the polygon of an AOI
+    is saved once instead of once for every POI matched to it:
+        - aoi.csv: the distinct AOIs, keyed by uid and geom_hash, with the columns
+          uid, uid_name, area (square kilometers), geom_hash and geometry (`wkt`)
+        - poi_aoi.csv: the uid of every matched POI, keyed by `poi_idx`
+          (its row in the POI csv), with its search_rank, distance and similarity
+    The AOI table is only appended to: each save appends the AOIs not saved yet.
+    An AOI whose geometry changed (e.g. when refreshing) is appended again,
+    so a uid may have several rows, and a POI is given the geometry of its uid
+    and geom_hash. The assignment table holds no geometry, and is rewritten
+    at each save.
+    """
+
+    AOI_TABLE = "aoi.csv"
+    ASSIGNMENT_TABLE = "poi_aoi.csv"
+    _saved = set()  # (uid, geom_hash) pairs in the AOI table
+
+    @staticmethod
+    def enabled() -> bool:
+        return bool(Repo._output_normalized_dir)
+
+    @classmethod
+    def open(cls) -> None:
+        """
+        Read the tables saved by a previous crawl, if any,
+        and restore the results missing from the POI csv.
+        """
+        import geopandas as gpd
+        import pandas as pd
+
+        cls._saved = set()
+        if not cls.enabled():
+            return
+        # geometries without uid cannot be saved in the AOI table
+        no_uid = (ResultStore._lengths > 0) & (ResultStore._uid == -1)
+        if no_uid.any():
+            raise ValueError(
+                f"{no_uid.sum()} POIs have a geometry but no uid, e.g. matched by "
+                f'an older version, and cannot be saved in "OUTPUT_NORMALIZED_DIR". '
+                f'Crawl them again without it first, e.g. with REFRESH_STATUSES = ["Matched"].'
+            )
+        os.makedirs(Repo._output_normalized_dir, exist_ok=True)
+        if not os.path.exists(cls._path(cls.AOI_TABLE)):
+            return
+        dtype = {"uid": str, "geom_hash": str}
+        aois = pd.read_csv(cls._path(cls.AOI_TABLE), dtype=dtype, encoding="utf-8")
+        cls._saved = set(zip(aois["uid"], aois["geom_hash"]))
+        aois = aois.drop_duplicates(["uid", "geom_hash"], keep="last")
+        aois["geometry"] = gpd.GeoSeries.from_wkt(
+            aois["geometry"].to_numpy()
+        ).to_numpy()
+        if os.path.exists(cls._path(cls.ASSIGNMENT_TABLE)):
+            assignments = pd.read_csv(
+                cls._path(cls.ASSIGNMENT_TABLE), dtype=dtype, encoding="utf-8"
+            )
+            assignments = assignments[assignments["poi_idx"] < len(Repo.file)]
+        else:
+            assignments = ResultStore.assignments()
+        ResultStore.restore(aois, assignments)
+
+    @classmethod
+    def save(cls) -> None:
+        """
+        Append the new AOIs, and rewrite the assignments.
+        """
+        aois = ResultStore.aois(ResultStore.take_written())
+        new = [pair not in cls._saved for pair in zip(aois["uid"], aois["geom_hash"])]
+        aois = aois[new]
+        if len(aois):
+            path = cls._path(cls.AOI_TABLE)
+            aois.to_csv(
+                path,
+                mode="a",
+                header=not os.path.exists(path),
+                encoding="utf-8",
+                index=False,
+            )
+            cls._saved.update(zip(aois["uid"], aois["geom_hash"]))
+        ResultStore.assignments().to_csv(
+            cls._path(cls.ASSIGNMENT_TABLE), encoding="utf-8", index=False
+        )
+
+    @staticmethod
+    def _path(name: str) -> str:
+        return os.path.join(Repo._output_normalized_dir, name)
@@ -0,0 +1,119 @@
+import random
+from typing import List, Tuple
+
+import numpy as np
+from numpy.typing import NDArray
+
+from processor.repository import Repo
+from processor.similarity import Similarity
+from spatial.coords import bd09ll_to_wgs84_array, cal_distance
+
+
+class Prescreener(object):
+    """
+    Pre-screening of the uid search results of a POI before any AOI request,
+    so that only the top `PRESCREEN_TOP_K` candidates are requested.
+
+    Each candidate is scored in [0, 1] by the weighted mean (`PRESCREEN_WEIGHTS`) of:
+        - similarity: name similarity to the POI, see `Similarity`
+        - distance: 1 - distance between its location and the POI / search radius
+        - search_rank: 1 / search rank
+        - tag: share of the POI industry categories found in its tag
+          (skipped if no industry category is given)
+    Candidates scoring below `PRESCREEN_MIN_SCORE` are dropped as well,
+    but the best one is always kept.
+
+    A random `PRESCREEN_AUDIT_RATE` fraction of POIs are not pre-screened, and for
+    them it is counted how often the best AOI would have been kept in the top-K.
+    """
+
+    _audits = {}  # kept uids of the audited POIs in the crawl
+    _audited = 0
+    _agreed = 0
+    _skipped = 0  # candidates dropped, i.e. AOI requests saved
+
+    @staticmethod
+    def enabled() -> bool:
+        return bool(Repo._prescreen_top_k)
+
+    @classmethod
+    def screen(
+        cls,
+        idx: int,
+        name_uid_rank: List[Tuple[str, str, int]],
+        u_properties: List[dict],
+        p_property: dict,
+    ) -> List[Tuple[str, str, int]]:
+        """
+        Return the `(uid_name, uid, search_rank)` triples of the kept candidates
+        in their search order, or all of them if the POI is audited.
+        """
+        if len(name_uid_rank) <= 1:
+            return name_uid_rank
+        scores = cls.score(idx, name_uid_rank, u_properties, p_property)
+        order = np.argsort(-scores, kind="stable")[: Repo._prescreen_top_k]
+        order = order[
+            (scores[order] >= Repo._prescreen_min_score) | (order == order[0])
+        ]
+        kept = [name_uid_rank[i] for i in np.sort(order)]
+        if random.random() < Repo._prescreen_audit_rate:
+            cls._audits[idx] = {uid for _, uid, _ in kept}
+            return name_uid_rank
+        cls._skipped += len(name_uid_rank) - len(kept)
+        return kept
+
+    @staticmethod
+    def score(
+        idx: int,
+        name_uid_rank: List[Tuple[str, str, int]],
+        u_properties: List[dict],
+        p_property: dict,
+    ) -> NDArray:
+        weights = Repo._prescreen_weights
+        components = {
+            "similarity": Similarity.score(
+                Similarity.features(Repo.file.loc[idx, "name"]),
+                [name for name, _, _ in name_uid_rank],
+            ),
+            "search_rank": 1 / np.array([rank for _, _, rank in name_uid_rank]),
+        }
+        u_lng, u_lat = bd09ll_to_wgs84_array(
+            np.array([u["u_lng"] for u in u_properties], dtype=float),
+            np.array([u["u_lat"] for u in u_properties], dtype=float),
+        )
+        distance = np.array(
+            [
+                cal_distance(lng, lat, p_property["p_lng"], p_property["p_lat"])
+                for lng, lat in zip(u_lng, u_lat)
+            ]
+        )
+        components["distance"] = 1 - np.minimum(distance / p_property["radius"], 1)
+        p_inds = [p_property["p_prim_ind"], p_property["p_sec_ind"]]
+        p_inds = [ind for ind in p_inds if isinstance(ind, str) and ind]
+        if p_inds:
+            components["tag"] = np.array(
+                [
+                    np.mean([ind in (u["u_tag"] or "") for ind in p_inds])
+                    for u in u_properties
+                ]
+            )
+        total = sum(weights[k] * v for k, v in components.items())
+        return total / sum(weights[k] for k in components)
+
+    @classmethod
+    def audit(cls, idx: int, best_uid: str | None) -> None:
+        """
+        Count whether the best AOI of an audited POI was kept by pre-screening.
+        """
+        kept = cls._audits.pop(idx, None)
+        if kept is not None and best_uid is not None:
+            cls._audited += 1
+            cls._agreed += best_uid in kept
+
+    @classmethod
+    def report(cls) -> Tuple[int, int, int]:
+        """
+        Return the AOI requests saved, the audited POIs with a best AOI,
+        and how many of them kept their best AOI in the top-K.
+        """
+        return cls._skipped, cls._audited, cls._agreed
@@ -0,0 +1,163 @@
+import cProfile
+import glob
+import inspect
+import os
+import random
+import signal
+import tracemalloc
+from collections import Counter as StackCounter
+from contextlib import contextmanager
+from functools import wraps
+from typing import Callable, Iterator
+
+from processor.repository import Repo
+
+
+class Profiler(object):
+    """
+    Sampled profiling of spider callbacks and middleware hooks decorated by `sampled`.
+
+    Each call is profiled with the probability `PROFILE_SAMPLE_RATE`, and profiles
+    are written into `PROFILE_DIR` at every update, one file per interval:
+        - 'pstats': `profile-xxxxx.pstats` of `cProfile`, for `pstats` or snakeviz
+        - 'collapsed': `profile-xxxxx.collapsed` of stacks sampled every 5 ms of CPU
+          time by a `SIGPROF` timer, for flamegraph.pl or speedscope
+    If `PROFILE_TRACEMALLOC` is on, the top allocators are also written into
+    `tracemalloc-xxxxx.txt` at every update.
+    """
+
+    INTERVAL = 0.005  # seconds of CPU time between two stack samples
+    TOP_ALLOCATORS = 50
+    _profile = None
+    _stacks = StackCounter()
+    _active = False
+    _dumps = 0
+
+    @classmethod
+    def start(cls) -> None:
+        cls._profile = cProfile.Profile()
+        cls._stacks = StackCounter()
+        cls._active = False
+        if cls.enabled() or Repo._profile_tracemalloc:
+            os.makedirs(Repo._profile_dir, exist_ok=True)
+        # continue the numbering of the files from the last crawl
+        cls._dumps = max(
+            (
+                int(os.path.basename(path).split("-")[1][:5])
+                for path in glob.glob(os.path.join(Repo._profile_dir, "*-?????.*"))
+            ),
+            default=0,
+        )
+        if cls.enabled() and Repo._profile_format == "collapsed":
+            signal.signal(signal.SIGPROF, cls._sample_stack)
+            signal.setitimer(signal.ITIMER_PROF, cls.INTERVAL, cls.INTERVAL)
+        if Repo._profile_tracemalloc:
+            tracemalloc.start()
+
+    @classmethod
+    def stop(cls) -> None:
+        if cls.enabled() and Repo._profile_format == "collapsed":
+            signal.setitimer(signal.ITIMER_PROF, 0)
+        if tracemalloc.is_tracing():
+            tracemalloc.stop()
+
+    @staticmethod
+    def enabled() -> bool:
+        return bool(Repo._profile_sample_rate)
+
+    @classmethod
+    def sampled(cls, func: Callable) -> Callable:
+        """
+        Decorator to profile a sampled fraction of the calls of `func`.
+        Generators are only profiled while they run, not while they are suspended.
+        """
+        if inspect.isgeneratorfunction(func):
+
+            @wraps(func)
+            def generator_wrapper(*args, **kwargs):
+                generator = func(*args, **kwargs)
+                if not cls._sampled():
+                    return (yield from generator)
+                while True:
+                    with cls._profiling():
+                        try:
+                            item = next(generator)
+                        except StopIteration as stop:
+                            return stop.value
+                    yield item
+
+            return generator_wrapper
+
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            if not cls._sampled():
+                return func(*args, **kwargs)
+            with cls._profiling():
+                return func(*args, **kwargs)
+
+        return wrapper
+
+    @classmethod
+    def dump(cls) -> None:
+        """
+        Write the profile and tracemalloc snapshot of the last interval.
+        """
+        if not (cls.enabled() or Repo._profile_tracemalloc):
+            return
+        cls._dumps += 1
+        if cls.enabled() and Repo._profile_format == "pstats":
+            cls._profile.dump_stats(cls._path("profile", "pstats"))
+            cls._profile = cProfile.Profile()
+        elif cls.enabled():
+            stacks, cls._stacks = cls._stacks, StackCounter()
+            with open(cls._path("profile", "collapsed"), "w", encoding="utf-8") as f:
+                for stack, count in stacks.most_common():
+                    f.write(f"{stack} {count}\n")
+        if tracemalloc.is_tracing():
+            statistics = tracemalloc.take_snapshot().statistics("lineno")
+            with open(cls._path("tracemalloc", "txt"), "w", encoding="utf-8") as f:
+                for stat in statistics[: cls.TOP_ALLOCATORS]:
+                    f.write(f"{stat}\n")
+
+    @classmethod
+    def _sampled(cls) -> bool:
+        # nested calls are covered by the outer profiling already
+        return (
+            not cls._active
+            and cls.enabled()
+            and random.random() < Repo._profile_sample_rate
+        )
+
+    @classmethod
+    @contextmanager
+    def _profiling(cls) -> Iterator[None]:
+        cls._active = True
+        if Repo._profile_format == "pstats":
+            cls._profile.enable()
+        try:
+            yield
+        finally:
+            if Repo._profile_format == "pstats":
+                cls._profile.disable()
+            cls._active = False
+
+    @classmethod
+    def _sample_stack(cls, signum: int, frame) -> None:
+        """
+        `SIGPROF` handler, which records the current stack if it is being profiled.
+        """
+        if not cls._active:
+            return
+        stack = []
+        while frame is not None:
+            code = frame.f_code
+            stack.append(
+                f"{code.co_name} ({os.path.basename(code.co_filename)}:"
+                f"{code.co_firstlineno})"
+            )
+            frame = frame.f_back
+        cls._stacks[";".join(reversed(stack))] += 1
+
+    @classmethod
+    def _path(cls, prefix: str, extension: str) -> str:
+        return os.path.join(Repo._profile_dir, f"{prefix}-{cls._dumps:05d}.{extension}")
@@ -0,0 +1,76 @@
+from typing import Dict, Optional
+
+import numpy as np
+from numpy.typing import NDArray
+
+from processor.repository import Repo
+
+
+class Ranker(object):
+    """
+    Vectorized weighted ranking of candidate AOIs according to `FILTER_RULES`.
+
+    Candidates are given as a flat table of columns `search_rank`, `area`,
+    `distance` and `similarity` (only the columns of enabled sortings are required),
+    and an optional `group` column (e.g. POI index) within which they are ranked.
+    Ties are broken by the position of the candidate, so the first one wins.
+    """
+
+    _columns = {
+        "sort_by_search_rank": "search_rank",
+        "sort_by_area": "area",
+        "sort_by_distance": "distance",
+        "sort_by_similarity": "similarity",
+    }
+
+    @classmethod
+    def weighted_rank(
+        cls, table: Dict[str, NDArray], group: Optional[NDArray] = None
+    ) -> NDArray:
+        """
+        Return the weighted rank of every candidate within its group,
+        which is the sum of the ranks of all enabled sortings, each weighted by
+        its `FILTER_RULES` value divided by the sum of their absolute values.
+        """
+        sortings = {k: v for k, v in Repo._sortings.items() if v != 0}
+        values = list(sortings.values())
+        weights = np.array(values) / np.abs(values).sum()
+        weighted_rank = 0
+        for (sorting, value), weight in zip(sortings.items(), weights):
+            key = np.asarray(table[cls._columns[sorting]])
+            if sorting == "sort_by_area":
+                # ascending if `sort_by_area` is 1, descending if -1
+                key = value * key
+            elif sorting == "sort_by_similarity":
+                key = -key  # descending
+            weighted_rank = weighted_rank + cls._rank(key, group) * weight
+        return weighted_rank
+
+    @classmethod
+    def best(cls, table: Dict[str, NDArray], group: NDArray) -> NDArray:
+        """
+        Return the positions of the best candidate of every group,
+        in ascending order of the group.
+        """
+        if not len(group):
+            return np.array([], dtype=np.int64)
+        order = np.lexsort((cls.weighted_rank(table, group), group))
+        first = np.r_[True, group[order][1:] != group[order][:-1]]
+        return order[first]
+
+    @staticmethod
+    def _rank(key: NDArray, group: Optional[NDArray] = None) -> NDArray:
+        """
+        Return an rank array [r1, r2, ... rn] for a key array [k1, k2, ... kn],
+        such that ki is the ri-th smallest element in its group.
+        """
+        if group is None:
+            order = np.argsort(key, kind="stable")
+            start = 0
+        else:
+            order = np.lexsort((key, group))
+            sorted_group = group[order]
+            start = np.searchsorted(sorted_group, sorted_group, side="left")
+        rank = np.empty(len(key), dtype=np.int64)
+        rank[order] = np.arange(len(key)) - start
+        return rank
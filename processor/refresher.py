@@ -0,0 +1,95 @@
+import logging
+import time
+from typing import Dict, List, Tuple
+
+import numpy as np
+from numpy.typing import NDArray
+
+from processor.candidate_store import CandidateStore
+from processor.deduplicator import Deduplicator
+from processor.repository import Repo
+from processor.result_store import ResultStore
+
+
+class Refresher(object):
+    """
+    Incremental re-crawling of a finished file, instead of crawling it all again.
+
+    A finished POI is refreshed if its result is older than `REFRESH_MAX_AGE` days
+    (or of unknown age), or if its status is in `REFRESH_STATUSES`. Deduplicated POIs
+    are refreshed as a whole group. If `REFRESH_REUSE_SEARCH` is on, the uid search
+    of a refreshed POI is replaced by its candidates of the `CandidateStore`,
+    i.e. the uids found by its last search that had a geometry.
+    """
+
+    _selected = 0
+    _searches = {}  # cached (uid_name, uid, search_rank) triples of refreshed POIs
+    _reused = 0
+
+    @staticmethod
+    def enabled() -> bool:
+        return bool(Repo._refresh_max_age or Repo._refresh_statuses)
+
+    @classmethod
+    def select(cls) -> None:
+        """
+        Mark the POIs to refresh in the `ResultStore`.
+        """
+        cls._selected, cls._searches, cls._reused = 0, {}, 0
+        if not cls.enabled():
+            return
+        mask = np.zeros(len(Repo.file), dtype=bool)
+        if Repo._refresh_max_age:
+            age = time.time() - ResultStore._crawled_at
+            # NaN, i.e. crawled by an older version, is always refreshed
+            mask |= ~(age <= Repo._refresh_max_age * 86400)
+        for status in Repo._refresh_statuses:
+            mask |= ResultStore._status == ResultStore.STATUSES.index(status)
+        # a group is refreshed if any of its POIs is
+        reps, members = Deduplicator._reps.to_numpy(), Deduplicator._reps.index
+        mask[reps[mask[members]]] = True
+        mask[members] = mask[reps]
+        selected = mask & (ResultStore._status != 0)
+        ResultStore.refresh(selected)
+        cls._selected = int(selected.sum())
+        if Repo._refresh_reuse_search and cls._selected:
+            cls._searches = cls._load_searches(selected)
+        logging.warning(
+            f"-- Refresh: {cls._selected} finished POIs to crawl again, "
+            f"{len(cls._searches)} of them with a cached uid search."
+        )
+
+    @classmethod
+    def cached_search(cls, idx: int) -> List[Tuple[str, str, int]] | None:
+        """
+        Return the cached `(uid_name, uid, search_rank)` triples of a refreshed POI,
+        or None if its uids should be searched.
+        """
+        triples = cls._searches.pop(idx, None)
+        if triples is not None:
+            cls._reused += 1
+        return triples
+
+    @classmethod
+    def report(cls) -> Tuple[int, int, Dict[str, int]]:
+        """
+        Return the POIs selected for refreshing, the uid searches reused,
+        and the changes of the refreshed geometries (see `ResultStore.changes`).
+        """
+        return cls._selected, cls._reused, ResultStore.changes()
+
+    @staticmethod
+    def _load_searches(selected: NDArray) -> Dict[int, List[Tuple[str, str, int]]]:
+        if not CandidateStore._part_paths():
+            return {}
+        table = CandidateStore.load()
+        keep = selected[table["idx"]]
+        searches = {}
+        for idx, uid_name, uid, rank in zip(
+            table["idx"][keep].tolist(),
+            table["uid_name"][keep].tolist(),
+            table["uid"][keep].tolist(),
+            table["search_rank"][keep].tolist(),
+        ):
+            searches.setdefault(idx, []).append((uid_name, uid, rank))
+        return searches
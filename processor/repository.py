@@ -1,28 +1,99 @@
 import logging
 
-import pandas as pd
+from processor.startup import Startup
 
 
 class Repo(object):
     @classmethod
     def import_settings(cls, settings: dict) -> None:
+        Startup.start()
         cls._import_settings(settings)
         logging.warning("# ---------- Initialization ---------- #")
 
+    @classmethod
+    def update_settings(cls, updates: dict) -> dict:
+        """
+        Re-import the settings with `updates` while crawling, where a dict value
+        only updates the given keys, e.g. some of the `FILTER_RULES`.
+        Return the previous settings, to restore them if the updates are invalid.
+        """
+        previous = cls._settings
+        settings = dict(previous)
+        for name, value in updates.items():
+            if isinstance(value, dict) and isinstance(settings.get(name), dict):
+                value = {**settings[name], **value}
+            settings[name] = value
+        cls._import_settings(settings)
+        return previous
+
     @classmethod
     def load_file(cls) -> None:
-        cls.file = pd.read_csv(cls._poi_csv_path, encoding="utf-8")
+        import pandas as pd
+
+        # hexadecimal result columns may look like numbers
+        cls.file = pd.read_csv(
+            cls._poi_csv_path, encoding="utf-8", dtype={"uid": str, "geom_hash": str}
+        )
 
     @classmethod
     def _import_settings(cls, settings: dict) -> None:
+        cls._settings = settings
+        # Concurrency settings
+        cls._concurrent_requests = settings.get("CONCURRENT_REQUESTS")
+        cls._concurrent_requests_per_ip = settings.get("CONCURRENT_REQUESTS_PER_IP")
+        cls._download_delay = settings.get("DOWNLOAD_DELAY")
+        cls._retry_http_codes = settings.get("RETRY_HTTP_CODES")
         # Spider settings
         cls._proxy_enabled = settings.get("PROXY_ENABLED")
         cls._update_interval = settings.get("UPDATE_INTERVAL")
         cls._use_first_uid = settings.get("USE_FIRST_UID")
+        cls._session_pool_size = settings.get("SESSION_POOL_SIZE")
+        cls._session_min_interval = settings.get("SESSION_MIN_INTERVAL")
+        cls._session_max_requests = settings.get("SESSION_MAX_REQUESTS")
+        cls._session_max_failures = settings.get("SESSION_MAX_FAILURES")
+        cls._session_block_codes = settings.get("SESSION_BLOCK_CODES")
+        cls._crawl_order = settings.get("CRAWL_ORDER")
+        cls._crawl_order_by_industry = settings.get("CRAWL_ORDER_BY_INDUSTRY")
+        cls._dedup_tolerance = settings.get("DEDUP_TOLERANCE")
+        cls._grid_cell_size = settings.get("GRID_CELL_SIZE")
+        cls._grid_min_pois = settings.get("GRID_MIN_POIS")
+        cls._grid_margin = settings.get("GRID_MARGIN")
+        cls._decisive_match = settings.get("DECISIVE_MATCH")
+        cls._prescreen_top_k = settings.get("PRESCREEN_TOP_K")
+        cls._prescreen_min_score = settings.get("PRESCREEN_MIN_SCORE")
+        cls._prescreen_weights = settings.get("PRESCREEN_WEIGHTS")
+        cls._prescreen_audit_rate = settings.get("PRESCREEN_AUDIT_RATE")
+        cls._output_simplify_tolerance = settings.get("OUTPUT_SIMPLIFY_TOLERANCE")
+        cls._output_precision = settings.get("OUTPUT_PRECISION")
+        cls._refresh_max_age = settings.get("REFRESH_MAX_AGE")
+        cls._refresh_statuses = settings.get("REFRESH_STATUSES")
+        cls._refresh_reuse_search = settings.get("REFRESH_REUSE_SEARCH")
+        # Metrics settings
+        cls._metrics_host = settings.get("METRICS_HOST")
+        cls._metrics_port = settings.get("METRICS_PORT")
+        cls._metrics_dump_path = settings.get("METRICS_DUMP_PATH")
+        cls._metrics_dump_interval = settings.get("METRICS_DUMP_INTERVAL")
+        # Control settings
+        cls._control_host = settings.get("CONTROL_HOST")
+        cls._control_port = settings.get("CONTROL_PORT")
+        # Profiling settings
+        cls._profile_sample_rate = settings.get("PROFILE_SAMPLE_RATE")
+        cls._profile_format = settings.get("PROFILE_FORMAT")
+        cls._profile_tracemalloc = settings.get("PROFILE_TRACEMALLOC")
+        cls._profile_dir = settings.get("PROFILE_DIR")
         # File path settings
         cls._poi_csv_path = settings.get("POI_CSV_PATH")
         cls._aoi_shp_path = settings.get("AOI_SHP_PATH")
+        cls._candidate_store_dir = settings.get("CANDIDATE_STORE_DIR")
+        cls._output_normalized_dir = settings.get("OUTPUT_NORMALIZED_DIR")
+        cls._http_archive_mode = settings.get("HTTP_ARCHIVE_MODE")
+        cls._http_archive_path = settings.get("HTTP_ARCHIVE_PATH")
+        cls._negative_cache_path = settings.get("NEGATIVE_CACHE_PATH")
+        cls._negative_cache_ttl = settings.get("NEGATIVE_CACHE_TTL")
+        cls._negative_cache_force = settings.get("NEGATIVE_CACHE_FORCE")
         # Baidu API settings
+        cls._search_url = settings.get("BAIDU_SEARCH_URL")
+        cls._aoi_url = settings.get("BAIDU_AOI_URL")
         cls._ak_list = settings.get("AK_LIST")
         cls._prim_ind = settings.get("API_PARAMS", {}).get("prim_ind")
         cls._sec_ind = settings.get("API_PARAMS", {}).get("sec_ind")
@@ -33,6 +104,10 @@ class Repo(object):
         cls._min_aoi_area = settings.get("FILTER_RULES", {}).get("min_aoi_area")
         cls._max_aoi_area = settings.get("FILTER_RULES", {}).get("max_aoi_area")
         cls._min_similarity = settings.get("FILTER_RULES", {}).get("min_similarity")
+        cls._similarity_metric = settings.get("FILTER_RULES", {}).get(
+            "similarity_metric"
+        )
+        cls._strip_suffixes = settings.get("FILTER_RULES", {}).get("strip_suffixes")
         cls._sortings = {
             sorting: settings.get("FILTER_RULES", {}).get(sorting)
             for sorting in [
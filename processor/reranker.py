@@ -0,0 +1,96 @@
+import logging
+from typing import Dict
+
+import numpy as np
+from numpy.typing import NDArray
+
+from processor.candidate_store import CandidateStore
+from processor.deduplicator import Deduplicator
+from processor.ranker import Ranker
+from processor.repository import Repo
+from processor.result_store import ResultStore
+from processor.similarity import Similarity
+from processor.simplifier import Simplifier
+from spatial.geometry import wkb_to_geometries
+
+
+class Reranker(object):
+    @classmethod
+    def rerank(cls) -> None:
+        """
+        Re-match every POI in the `CandidateStore` with the current `FILTER_RULES`,
+        without any network request.
+
+        The validation and the weighted ranking of `AOI_list` are re-run
+        for all POIs at once, and the results are written into the file:
+        - 'Matched' with the new best AOI if any candidate is still valid.
+        - 'No Geometry' if all candidates are now filtered out.
+        The time of crawling of the POIs is kept.
+        """
+        table = CandidateStore.load()
+        if Repo._sortings.get("sort_by_similarity"):
+            table["similarity"] = cls._rescore_similarity(table)
+        valid = cls._validate(table)
+        candidates = {col: table[col][valid] for col in Ranker._columns.values()}
+        best = Ranker.best(candidates, group=table["idx"][valid])
+        best = np.flatnonzero(valid)[best]
+        # write results of all POIs in the store
+        pois = np.unique(table["idx"])
+        crawled_at = ResultStore._crawled_at.copy()
+        for idx in pois:
+            ResultStore.write(idx, "No Geometry", crawled_at=crawled_at[idx])
+        matched = table["idx"][best]
+        geometries = wkb_to_geometries(table["wkb"][best])
+        for pos, idx, geometry in zip(best, matched, geometries):
+            ResultStore.write(
+                idx,
+                "Matched",
+                table["uid_name"][pos],
+                Simplifier.simplify(geometry),
+                crawled_at=crawled_at[idx],
+                uid=table["uid"][pos],
+                match=tuple(
+                    table[col][pos]
+                    for col in ["search_rank", "area", "distance", "similarity"]
+                ),
+            )
+        Deduplicator.fan_out()
+        logging.warning(
+            f"-- {len(pois)} POIs re-ranked offline: "
+            f"{len(matched)} matched, {len(pois) - len(matched)} without geometry."
+        )
+
+    @staticmethod
+    def _rescore_similarity(table: Dict[str, NDArray]) -> NDArray:
+        """
+        Re-score the name similarity of all candidates with the current
+        `similarity_metric`, in one batched call per POI.
+        """
+        similarity = np.empty(len(table["idx"]), dtype=float)
+        pois, starts = np.unique(table["idx"], return_index=True)
+        ends = np.r_[starts[1:], len(table["idx"])]
+        for idx, start, end in zip(pois, starts, ends):
+            features = Similarity.features(Repo.file.loc[idx, "name"])
+            similarity[start:end] = Similarity.score(
+                features, table["uid_name"][start:end]
+            )
+        return similarity
+
+    @staticmethod
+    def _validate(table: Dict[str, NDArray]) -> NDArray:
+        """
+        Vectorized version of `AOI_list._validate_aoi`.
+        """
+        p_lng = Repo.file["lng_wgs84"].to_numpy(dtype=float)[table["idx"]]
+        p_lat = Repo.file["lat_wgs84"].to_numpy(dtype=float)[table["idx"]]
+        lng1, lat1, lng2, lat2 = table["bounds"].T
+        bbox_contains_poi = (lng1 <= p_lng) & (p_lng <= lng2)
+        bbox_contains_poi &= (lat1 <= p_lat) & (p_lat <= lat2)
+        not_too_big_or_too_small = (table["area"] >= Repo._min_aoi_area) & (
+            table["area"] <= Repo._max_aoi_area
+        )
+        if Repo._sortings.get("sort_by_similarity") == 0:
+            not_too_different = np.ones(len(table["idx"]), dtype=bool)
+        else:
+            not_too_different = table["similarity"] >= Repo._min_similarity
+        return bbox_contains_poi & not_too_big_or_too_small & not_too_different
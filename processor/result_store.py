@@ -0,0 +1,394 @@
+import hashlib
+import time
+from typing import TYPE_CHECKING, Dict, Tuple
+
+import numpy as np
+from numpy.typing import NDArray
+from shapely import wkb
+from shapely.geometry.base import BaseGeometry
+
+from processor.repository import Repo
+
+if TYPE_CHECKING:
+    import pandas as pd
+    from shapely.geometry import Polygon
+
+
+class ResultStore(object):
+    """
+    Compact, typed store of the crawling results, held apart from the file
+    and only joined to it for export (see `frame`).
+
+    POIs are addressed by position, i.e. the default `RangeIndex` of the file,
+    so that writing the result of a POI is an O(1) array update:
+        - status (int8): index in `STATUSES`, 0 if the POI is not finished
+        - uid_name (int32): code of the interned uid name, -1 if none
+        - geometry: `wkb` appended to one contiguous buffer, addressed by
+          its offset (int64) and length (int32, 0 if none)
+        - crawled_at (float64): unix time of crawling, NaN if unknown
+        - geom_hash (uint64): content hash of the geometry, 0 if none
+        - uid (int32): code of the interned Baidu uid of the AOI, -1 if none
+    and, only exported by `assignments`, how the AOI was matched (`MATCH_DTYPE`).
+    Overwritten geometries (e.g. when re-ranking) leave stale bytes behind,
+    which are compacted away once they outweigh the live ones.
+
+    Finished POIs can be marked for refreshing: they count as unfinished,
+    but keep their previous results until they are written again,
+    when the change of their geometry is counted (see `changes`).
+    """
+
+    STATUSES = [None, "Matched", "No Uid", "No Geometry"]
+    COLUMNS = ["status", "uid_name", "geometry", "crawled_at", "geom_hash", "uid"]
+    MATCH_DTYPE = [
+        ("search_rank", np.int16),  # 0 if unknown
+        ("area", np.float64),  # in square kilometers, NaN if unknown
+        ("distance", np.float64),
+        ("similarity", np.float64),
+    ]
+    HASH_PRECISION = 7  # decimals of the coordinates hashed, ~1 cm
+    _columns = []  # column order of the file, for export
+    _status = np.zeros(0, dtype=np.int8)
+    _uid_name = np.zeros(0, dtype=np.int32)
+    _uid = np.zeros(0, dtype=np.int32)
+    _match = np.zeros(0, dtype=MATCH_DTYPE)
+    _offsets = np.zeros(0, dtype=np.int64)
+    _lengths = np.zeros(0, dtype=np.int32)
+    _buffer = bytearray()
+    _stale = 0  # bytes in the buffer no longer addressed
+    _crawled_at = np.zeros(0, dtype=np.float64)
+    _geom_hash = np.zeros(0, dtype=np.uint64)
+    _pending = np.zeros(0, dtype=bool)  # finished POIs to refresh
+    _written = np.zeros(0, dtype=bool)  # POIs written since `take_written`
+    _changes = {}
+    _interned = {"uid_name": ([], {}), "uid": ([], {})}  # values and their codes
+
+    @classmethod
+    def load(cls) -> None:
+        """
+        Move the result columns of the file into the store, which parses
+        the `wkt` geometries of a previously saved file all at once.
+        Geometries saved without a hash, e.g. by an older version, are hashed.
+        """
+        import geopandas as gpd
+        import pandas as pd
+
+        n = len(Repo.file)
+        cls._columns = list(Repo.file.columns)
+        codes = {status: code for code, status in enumerate(cls.STATUSES)}
+        cls._status = Repo.file["status"].map(codes).fillna(0).to_numpy(dtype=np.int8)
+        cls._interned = {"uid_name": ([], {}), "uid": ([], {})}
+        cls._uid_name, cls._uid = (
+            np.fromiter(
+                (cls._intern(col, value) for value in Repo.file[col]),
+                dtype=np.int32,
+                count=n,
+            )
+            for col in ["uid_name", "uid"]
+        )
+        cls._match = np.zeros(n, dtype=cls.MATCH_DTYPE)
+        for field in ["area", "distance", "similarity"]:
+            cls._match[field] = np.nan
+        cls._offsets = np.zeros(n, dtype=np.int64)
+        cls._lengths = np.zeros(n, dtype=np.int32)
+        cls._buffer, cls._stale = bytearray(), 0
+        geometry = Repo.file["geometry"]
+        is_wkt = geometry.map(type).eq(str).to_numpy()
+        if is_wkt.any():
+            geometry = geometry.copy()
+            geometry[is_wkt] = gpd.GeoSeries.from_wkt(
+                geometry[is_wkt].to_numpy()
+            ).to_numpy()
+        for pos in np.flatnonzero(geometry.notna().to_numpy()):
+            cls._put_geometry(pos, geometry.iat[pos])
+        crawled_at = pd.to_datetime(Repo.file["crawled_at"], utc=True, errors="coerce")
+        cls._crawled_at = (
+            (crawled_at - pd.Timestamp(0, tz="UTC"))
+            .dt.total_seconds()
+            .to_numpy(dtype=np.float64, copy=True)
+        )
+        cls._geom_hash = np.fromiter(
+            (int(h, 16) if isinstance(h, str) else 0 for h in Repo.file["geom_hash"]),
+            dtype=np.uint64,
+            count=n,
+        )
+        for pos in np.flatnonzero((cls._lengths > 0) & (cls._geom_hash == 0)):
+            cls._geom_hash[pos] = cls._hash(geometry.iat[pos])
+        cls._pending = np.zeros(n, dtype=bool)
+        cls._written = cls._status != 0
+        cls._changes = dict.fromkeys(["unchanged", "changed", "added", "removed"], 0)
+        Repo.file = Repo.file.drop(columns=cls.COLUMNS)
+
+    @classmethod
+    def write(
+        cls,
+        idx: int,
+        status: str,
+        uid_name: str | None = None,
+        geometry: BaseGeometry | None = None,
+        crawled_at: float | None = None,
+        uid: str | None = None,
+        match: Tuple[int, float, float, float] | None = None,
+    ) -> None:
+        """
+        Write the status, uid_name and geometry of a POI,
+        crawled at `crawled_at` (unix time), or now if None,
+        and the uid and `(search_rank, area, distance, similarity)` of its AOI.
+        """
+        geom_hash = 0 if geometry is None else cls._hash(geometry)
+        if cls._pending[idx]:
+            cls._pending[idx] = False
+            cls._count_change(int(cls._geom_hash[idx]), geom_hash)
+        cls._status[idx] = cls.STATUSES.index(status)
+        cls._uid_name[idx] = cls._intern("uid_name", uid_name)
+        cls._crawled_at[idx] = time.time() if crawled_at is None else crawled_at
+        cls._geom_hash[idx] = geom_hash
+        cls._uid[idx] = cls._intern("uid", uid)
+        match = match or (0, None, None, None)
+        cls._match[idx] = tuple(np.nan if v is None else v for v in match)
+        cls._written[idx] = True
+        cls._stale += int(cls._lengths[idx])
+        cls._lengths[idx] = 0
+        if geometry is not None:
+            cls._put_geometry(idx, geometry)
+        if cls._stale > len(cls._buffer) // 2:
+            cls._compact()
+
+    @classmethod
+    def copy(cls, src: NDArray, dst: NDArray) -> None:
+        """
+        Copy the results of the POIs at positions `src` to the ones at `dst`,
+        which share the `wkb` bytes of their geometries.
+        """
+        cls._stale += int(cls._lengths[dst].sum())
+        cls._status[dst] = cls._status[src]
+        cls._uid_name[dst] = cls._uid_name[src]
+        cls._offsets[dst] = cls._offsets[src]
+        cls._lengths[dst] = cls._lengths[src]
+        cls._crawled_at[dst] = cls._crawled_at[src]
+        cls._geom_hash[dst] = cls._geom_hash[src]
+        cls._uid[dst] = cls._uid[src]
+        cls._match[dst] = cls._match[src]
+        cls._pending[dst] = cls._pending[src]
+        cls._written[dst] = True
+
+    @classmethod
+    def finished(cls) -> NDArray:
+        """
+        Boolean mask of the POIs with a status, and not to refresh.
+        """
+        return (cls._status != 0) & ~cls._pending
+
+    @classmethod
+    def count(cls, status: str) -> int:
+        """
+        Number of finished POIs with `status`.
+        """
+        is_status = cls._status == cls.STATUSES.index(status)
+        return int(np.count_nonzero(is_status & ~cls._pending))
+
+    @classmethod
+    def refresh(cls, mask: NDArray) -> None:
+        """
+        Mark the finished POIs of the boolean `mask` for refreshing.
+        """
+        cls._pending |= mask & (cls._status != 0)
+
+    @classmethod
+    def changes(cls) -> Dict[str, int]:
+        """
+        Return how many refreshed POIs have their geometry unchanged, changed,
+        added (a geometry now but none before) and removed (the other way round).
+        """
+        return dict(cls._changes)
+
+    @classmethod
+    def take_written(cls) -> NDArray:
+        """
+        Return the positions of the POIs written since the last call
+        (or finished when loaded, for the first call).
+        """
+        written = np.flatnonzero(cls._written)
+        cls._written[:] = False
+        return written
+
+    @classmethod
+    def frame(cls, geometry: bool = True) -> "pd.DataFrame":
+        """
+        Join the results to the file, with the columns in their original order.
+        The geometry column is left empty if `geometry` is False.
+        """
+        import pandas as pd
+
+        df = Repo.file.copy()
+        df["status"] = np.array(cls.STATUSES, dtype=object)[cls._status]
+        df["uid_name"] = cls._decode("uid_name", cls._uid_name)
+        df["uid"] = cls._decode("uid", cls._uid)
+        df["geometry"] = (
+            cls._geometries(np.arange(len(df)))
+            if geometry
+            else np.full(len(df), None, dtype=object)
+        )
+        df["crawled_at"] = (
+            pd.to_datetime(cls._crawled_at, unit="s", utc=True)
+            .strftime("%Y-%m-%dT%H:%M:%SZ")
+            .to_numpy(dtype=object)
+        )
+        df["geom_hash"] = np.array(
+            [f"{h:016x}" if h else None for h in cls._geom_hash.tolist()],
+            dtype=object,
+        )
+        return df[cls._columns]
+
+    @classmethod
+    def aois(cls, positions: NDArray) -> "pd.DataFrame":
+        """
+        Return the distinct AOIs, i.e. `(uid, geom_hash)` pairs, of the POIs at
+        `positions` with the uid, uid_name, area, geom_hash and geometry columns.
+        """
+        import pandas as pd
+
+        positions = positions[
+            (cls._uid[positions] != -1) & (cls._lengths[positions] > 0)
+        ]
+        pairs = pd.DataFrame(
+            {"uid": cls._uid[positions], "geom_hash": cls._geom_hash[positions]}
+        )
+        positions = positions[~pairs.duplicated().to_numpy()]
+        return pd.DataFrame(
+            {
+                "uid": cls._decode("uid", cls._uid[positions]),
+                "uid_name": cls._decode("uid_name", cls._uid_name[positions]),
+                "area": cls._match["area"][positions],
+                "geom_hash": [f"{h:016x}" for h in cls._geom_hash[positions].tolist()],
+                "geometry": cls._geometries(positions),
+            }
+        )
+
+    @classmethod
+    def assignments(cls) -> "pd.DataFrame":
+        """
+        Return the uid of every matched POI, indexed by its position `poi_idx`,
+        with the search_rank, distance and similarity of the match.
+        """
+        import pandas as pd
+
+        positions = np.flatnonzero(
+            (cls._status == cls.STATUSES.index("Matched")) & (cls._uid != -1)
+        )
+        match = cls._match[positions]
+        return pd.DataFrame(
+            {
+                "poi_idx": positions,
+                "uid": cls._decode("uid", cls._uid[positions]),
+                "search_rank": match["search_rank"],
+                "distance": match["distance"],
+                "similarity": match["similarity"],
+            }
+        )
+
+    @classmethod
+    def restore(cls, aois: "pd.DataFrame", assignments: "pd.DataFrame") -> None:
+        """
+        Restore the results held in normalized tables (see `Normalizer`):
+        the geometries of the matched POIs saved without one, by their uid
+        and geom_hash, and how all of them were matched, by `poi_idx`.
+        """
+        # a uid has several geometries if it changed, e.g. refreshed for some POIs
+        keys = list(zip(aois["uid"], aois["geom_hash"]))
+        geometries = dict(zip(keys, aois["geometry"]))
+        area = dict(zip(keys, aois["area"]))
+        uids = cls._interned["uid"][0]
+        missing = (cls._status == cls.STATUSES.index("Matched")) & (cls._lengths == 0)
+        for pos in np.flatnonzero(missing & (cls._uid != -1)):
+            geometry = geometries.get(cls._aoi_key(uids, pos))
+            if geometry is not None:
+                cls._put_geometry(pos, geometry)
+        positions = assignments["poi_idx"].to_numpy()
+        cls._match["search_rank"][positions] = assignments["search_rank"].to_numpy()
+        cls._match["distance"][positions] = assignments["distance"].to_numpy()
+        cls._match["similarity"][positions] = assignments["similarity"].to_numpy()
+        cls._match["area"][positions] = [
+            area.get(cls._aoi_key(uids, pos), np.nan) for pos in positions
+        ]
+
+    @classmethod
+    def _aoi_key(cls, uids: list, pos: int) -> Tuple[str, str]:
+        # the `(uid, geom_hash)` pair of the POI at `pos`, as in `aois`
+        return uids[cls._uid[pos]], f"{cls._geom_hash[pos]:016x}"
+
+    @classmethod
+    def _intern(cls, column: str, value: str | None) -> int:
+        # missing values (None or NaN) are coded -1, i.e. the last of `_decode`
+        if not isinstance(value, str):
+            return -1
+        values, codes = cls._interned[column]
+        code = codes.get(value)
+        if code is None:
+            code = codes[value] = len(values)
+            values.append(value)
+        return code
+
+    @classmethod
+    def _decode(cls, column: str, codes: NDArray) -> NDArray:
+        return np.array(cls._interned[column][0] + [None], dtype=object)[codes]
+
+    @classmethod
+    def _geometries(cls, positions: NDArray) -> NDArray:
+        """
+        Geometries of the POIs at `positions`, None if none.
+        """
+        import geopandas as gpd
+
+        geometry = np.full(len(positions), None, dtype=object)
+        has_geometry = np.flatnonzero(cls._lengths[positions])
+        if len(has_geometry):
+            geometry[has_geometry] = gpd.GeoSeries.from_wkb(
+                [cls._get_wkb(pos) for pos in positions[has_geometry]]
+            ).to_numpy()
+        return geometry
+
+    @classmethod
+    def _hash(cls, geometry: "Polygon") -> int:
+        # rounded, so that a geometry read back from the saved `wkt` hashes the same
+        digest = hashlib.blake2b(digest_size=8)
+        for ring in [geometry.exterior, *geometry.interiors]:
+            coords = np.round(np.asarray(ring.coords), cls.HASH_PRECISION)
+            digest.update(coords.tobytes())
+        return int.from_bytes(digest.digest(), "little") or 1
+
+    @classmethod
+    def _count_change(cls, before: int, after: int) -> None:
+        if before == after:
+            cls._changes["unchanged"] += 1
+        elif before and after:
+            cls._changes["changed"] += 1
+        elif after:
+            cls._changes["added"] += 1
+        else:
+            cls._changes["removed"] += 1
+
+    @classmethod
+    def _put_geometry(cls, pos: int, geometry: BaseGeometry) -> None:
+        data = wkb.dumps(geometry)
+        cls._offsets[pos] = len(cls._buffer)
+        cls._lengths[pos] = len(data)
+        cls._buffer += data
+
+    @classmethod
+    def _get_wkb(cls, pos: int) -> bytes:
+        offset = cls._offsets[pos]
+        return bytes(cls._buffer[offset : offset + cls._lengths[pos]])
+
+    @classmethod
+    def _compact(cls) -> None:
+        """
+        Rewrite the buffer with only the live `wkb` bytes, once each.
+        """
+        buffer, moved = bytearray(), {}
+        for pos in np.flatnonzero(cls._lengths):
+            offset = int(cls._offsets[pos])
+            if offset not in moved:
+                moved[offset] = len(buffer)
+                buffer += cls._buffer[offset : offset + cls._lengths[pos]]
+            cls._offsets[pos] = moved[offset]
+        cls._buffer, cls._stale = buffer, 0
@@ -0,0 +1,131 @@
+import itertools
+import time
+from collections import OrderedDict
+from typing import Dict
+
+from processor.repository import Repo
+
+
+class Session(object):
+    """
+    A visitor of Baidu Map: a `BAIDUID` cookie (and its own cookie jar),
+    a user-agent and a proxy, which are reused across requests.
+    """
+
+    __slots__ = ("id", "cookie", "user_agent", "proxy", "requests", "failures", "last")
+
+    def __init__(self, id: int, cookie: str, user_agent: str, proxy: str | None):
+        self.id = id
+        self.cookie = cookie
+        self.user_agent = user_agent
+        self.proxy = proxy
+        self.requests = 0
+        self.failures = 0  # consecutive failures
+        self.last = 0.0  # time of the last request, or of the next one if ahead
+
+
+class SessionPool(object):
+    """
+    Pool of up to `SESSION_POOL_SIZE` sticky sessions, so that requests come from
+    a few consistent visitors rather than from a new random one every time.
+
+    Each request takes the session that has been idle the longest. While the pool
+    is not full, a new session is created instead if that one was used within the
+    last `SESSION_MIN_INTERVAL` seconds. Otherwise the request waits (see `wait`)
+    until `SESSION_MIN_INTERVAL` seconds after the last request of the session.
+    A session is retired:
+        - blocked: at once on a response status in `SESSION_BLOCK_CODES`
+        - failed: after `SESSION_MAX_FAILURES` consecutive other failures,
+          e.g. server errors or timeouts of a dead proxy
+        - rotated: after `SESSION_MAX_REQUESTS` requests (0 for never)
+    """
+
+    _sessions = OrderedDict()  # least recently used first
+    _ids = itertools.count()
+    _stats = {"created": 0, "blocked": 0, "failed": 0, "rotated": 0}
+    _requests = 0
+
+    @classmethod
+    def open(cls) -> None:
+        cls._sessions = OrderedDict()
+        cls._stats = dict.fromkeys(cls._stats, 0)
+        cls._requests = 0
+
+    @staticmethod
+    def enabled() -> bool:
+        return bool(Repo._session_pool_size)
+
+    @classmethod
+    def acquire(cls) -> Session | None:
+        """
+        Return the session for a new request, or None if a new session
+        should be created with `add`. The request is sent in `wait` seconds.
+        """
+        if not cls._sessions:
+            return None
+        session = next(iter(cls._sessions.values()))
+        now = time.monotonic()
+        if (
+            len(cls._sessions) < Repo._session_pool_size
+            and now - session.last < Repo._session_min_interval
+        ):
+            return None
+        cls._use(session, max(now, session.last + Repo._session_min_interval))
+        return session
+
+    @staticmethod
+    def wait(session: Session) -> float:
+        """
+        Seconds to wait before sending the request that acquired `session`.
+        """
+        return max(session.last - time.monotonic(), 0.0)
+
+    @classmethod
+    def add(cls, cookie: str, user_agent: str, proxy: str | None) -> Session:
+        session = Session(next(cls._ids), cookie, user_agent, proxy)
+        cls._sessions[session.id] = session
+        cls._stats["created"] += 1
+        cls._use(session, time.monotonic())
+        return session
+
+    @classmethod
+    def report(cls, session: Session, status: int | None) -> bool:
+        """
+        Record the outcome of a request of `session`, i.e. the response status,
+        or None if the request failed without any response.
+        Return whether the session is retired by it, so that its proxy can be deleted.
+        """
+        if session.id not in cls._sessions:
+            return False
+        if status is not None and status in Repo._session_block_codes:
+            reason = "blocked"
+        elif status is None or status in Repo._retry_http_codes:
+            session.failures += 1
+            reason = "failed" if session.failures >= Repo._session_max_failures else ""
+        else:
+            session.failures = 0
+            reason = ""
+        if not reason and 0 < Repo._session_max_requests <= session.requests:
+            reason = "rotated"
+        if not reason:
+            return False
+        del cls._sessions[session.id]
+        cls._stats[reason] += 1
+        return True
+
+    @classmethod
+    def report_stats(cls) -> Dict[str, float]:
+        """
+        Return the numbers of sessions created, blocked, failed and rotated,
+        and the mean number of requests per session.
+        """
+        stats = dict(cls._stats)
+        stats["requests_per_session"] = cls._requests / max(stats["created"], 1)
+        return stats
+
+    @classmethod
+    def _use(cls, session: Session, now: float) -> None:
+        session.last = now
+        session.requests += 1
+        cls._requests += 1
+        cls._sessions.move_to_end(session.id)
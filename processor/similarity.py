@@ -0,0 +1,129 @@
+import re
+from difflib import SequenceMatcher
+from functools import lru_cache
+from typing import FrozenSet, Sequence
+
+import numpy as np
+from numpy.typing import NDArray
+
+from processor.repository import Repo
+
+
+class NameFeatures(object):
+    """
+    Preprocessed features of a POI name, computed once per POI
+    and shared by all its candidate AOIs.
+    """
+
+    __slots__ = ("name", "normalized", "ngrams", "matcher")
+
+    def __init__(self, name: str) -> None:
+        self.name = name
+        self.normalized = Similarity.normalize(name)
+        self.ngrams = Similarity.ngrams(self.normalized)
+        # the index of the second sequence is built once by `set_seq2`
+        self.matcher = SequenceMatcher(None, "", name)
+
+
+class Similarity(object):
+    """
+    Pluggable name similarity engine, the metric is chosen by `similarity_metric`:
+    - 'sequence': ratio of difflib `SequenceMatcher` on the raw names. For its algorithm,
+      see https://stackoverflow.com/questions/35517353/how-does-pythons-sequencematcher-work
+    - 'jaccard': Jaccard index of the character bigram sets of the normalized names.
+    - 'levenshtein': 1 - Levenshtein distance / length of the longer normalized name.
+
+    Names are normalized by removing brackets, spaces and punctuations, and if
+    `strip_suffixes` is on, common suffixes like '小区' or '花园' are stripped as well.
+    """
+
+    SUFFIXES = (
+        "小区",
+        "花园",
+        "家园",
+        "公寓",
+        "社区",
+        "新村",
+        "大厦",
+        "广场",
+        "公馆",
+        "别墅",
+        "园区",
+        "苑",
+        "园",
+    )
+    _brackets = re.compile(r"[(（\[【].*?[)）\]】]")
+    _punctuations = re.compile(r"[\s\-_·•.,，。、/\\|]+")
+
+    @classmethod
+    def features(cls, name: str) -> NameFeatures:
+        return NameFeatures(name)
+
+    @classmethod
+    def score(cls, features: NameFeatures, names: Sequence[str]) -> NDArray:
+        """
+        Score the similarity between a POI and all its candidate names at once.
+        """
+        metric = getattr(cls, f"_{Repo._similarity_metric}")
+        return np.fromiter(
+            (metric(features, name) for name in names), dtype=float, count=len(names)
+        )
+
+    @classmethod
+    def normalize(cls, name: str) -> str:
+        return cls._normalize(name, Repo._strip_suffixes)
+
+    @classmethod
+    @lru_cache(maxsize=65536)
+    def _normalize(cls, name: str, strip_suffixes: bool) -> str:
+        normalized = cls._brackets.sub("", name)
+        normalized = cls._punctuations.sub("", normalized).lower()
+        if strip_suffixes:
+            for suffix in cls.SUFFIXES:
+                # keep the name if nothing remains after stripping
+                if normalized.endswith(suffix) and len(normalized) > len(suffix):
+                    normalized = normalized[: -len(suffix)]
+                    break
+        return normalized
+
+    @staticmethod
+    @lru_cache(maxsize=65536)
+    def ngrams(normalized: str, n: int = 2) -> FrozenSet[str]:
+        if len(normalized) < n:
+            return frozenset([normalized]) if normalized else frozenset()
+        return frozenset(normalized[i : i + n] for i in range(len(normalized) - n + 1))
+
+    @staticmethod
+    def _sequence(features: NameFeatures, name: str) -> float:
+        features.matcher.set_seq1(name)
+        return features.matcher.ratio()
+
+    @classmethod
+    def _jaccard(cls, features: NameFeatures, name: str) -> float:
+        ngrams = cls.ngrams(cls.normalize(name))
+        union = len(features.ngrams | ngrams)
+        if union == 0:
+            return 1.0
+        return len(features.ngrams & ngrams) / union
+
+    @classmethod
+    def _levenshtein(cls, features: NameFeatures, name: str) -> float:
+        a, b = features.normalized, cls.normalize(name)
+        if not (a or b):
+            return 1.0
+        if len(a) < len(b):
+            a, b = b, a
+        # single-row dynamic programming over the shorter name
+        previous = list(range(len(b) + 1))
+        for i, char_a in enumerate(a, 1):
+            current = [i]
+            for j, char_b in enumerate(b, 1):
+                current.append(
+                    min(
+                        previous[j] + 1,
+                        current[j - 1] + 1,
+                        previous[j - 1] + (char_a != char_b),
+                    )
+                )
+            previous = current
+        return 1 - previous[-1] / len(a)
@@ -0,0 +1,47 @@
+from typing import Tuple
+
+from shapely.geometry import Polygon
+
+from processor.repository import Repo
+from spatial.geometry import simplify_polygon
+
+
+class Simplifier(object):
+    """
+    Optional output stage, which simplifies AOI polygons with a topology-preserving
+    tolerance of `OUTPUT_SIMPLIFY_TOLERANCE` meters and rounds their coordinates
+    to `OUTPUT_PRECISION` decimals, before they are written into the file.
+
+    The total `wkt` size before and after, and the maximum Hausdorff distance
+    between an original polygon and its output, are tracked for the report.
+    """
+
+    _wkt_size = [0, 0]  # bytes before and after
+    _max_error = 0.0  # unit: meters
+
+    @staticmethod
+    def enabled() -> bool:
+        return bool(Repo._output_simplify_tolerance or Repo._output_precision)
+
+    @classmethod
+    def simplify(cls, polygon: Polygon) -> Polygon:
+        """
+        Return the output polygon, which is `polygon` itself if disabled.
+        """
+        if not cls.enabled():
+            return polygon
+        output, error = simplify_polygon(
+            polygon, Repo._output_simplify_tolerance, Repo._output_precision
+        )
+        cls._wkt_size[0] += len(polygon.wkt)
+        cls._wkt_size[1] += len(output.wkt)
+        cls._max_error = max(cls._max_error, error)
+        return output
+
+    @classmethod
+    def report(cls) -> Tuple[float, float]:
+        """
+        Return the `wkt` size reduction ratio and the maximum Hausdorff error in meters.
+        """
+        before, after = cls._wkt_size
+        return (1 - after / before if before else 0.0), cls._max_error
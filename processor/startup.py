@@ -0,0 +1,27 @@
+import logging
+import time
+
+
+class Startup(object):
+    """
+    Durations of the `(n/6)` initialization steps, each measured from the end
+    of the previous step (or from `start`), and logged along with the step.
+    Heavy dependencies are imported at their first use, so that their import time
+    is counted in the step that needs them, not when the spider is loaded.
+    """
+
+    STEPS = 6
+    durations = {}
+    _last = None
+
+    @classmethod
+    def start(cls) -> None:
+        cls.durations = {}
+        cls._last = time.perf_counter()
+
+    @classmethod
+    def log_step(cls, step: int, message: str) -> None:
+        now = time.perf_counter()
+        cls.durations[step] = now - (cls._last or now)
+        cls._last = now
+        logging.warning(f"({step}/{cls.STEPS}) {message} ({cls.durations[step]:.3f}s)")
@@ -1,7 +1,9 @@
 import logging
 import os
+import signal
 
 from processor.repository import Repo
+from processor.startup import Startup
 
 
 class Validator(object):
@@ -11,7 +13,17 @@ class Validator(object):
         cls._validate_path_settings()
         cls._validate_api_settings()
         cls._validate_aoi_filter_settings()
-        logging.warning("(1/6) Settings validation complete.")
+        Startup.log_step(1, "Settings validation complete.")
+
+    @classmethod
+    def validate_live_settings(cls) -> None:
+        """
+        Validate the settings updated while crawling, see `Controller`.
+        """
+        cls._validate_concurrency_settings()
+        cls._validate_spider_settings()
+        cls._validate_api_settings()
+        cls._validate_aoi_filter_settings()
 
     @classmethod
     def validate_file(cls) -> None:
@@ -30,7 +42,22 @@ class Validator(object):
                 raise ValueError(f'Column "{col}" is missing.')
         cls._check_optional_col("prim_ind", Repo._prim_ind)
         cls._check_optional_col("sec_ind", Repo._sec_ind)
-        logging.warning("(2/6) POI csv file validation complete.")
+        cls._check_rows()
+        Startup.log_step(2, "POI csv file validation complete.")
+
+    @classmethod
+    def _validate_concurrency_settings(cls) -> None:
+        # only checked for live updates, Scrapy itself reads them at startup
+        cls._verify_value_type(Repo._concurrent_requests, "CONCURRENT_REQUESTS", int)
+        if Repo._concurrent_requests < 1:
+            raise ValueError('"CONCURRENT_REQUESTS" must be a positive integer.')
+        cls._verify_value_type(
+            Repo._concurrent_requests_per_ip, "CONCURRENT_REQUESTS_PER_IP", int
+        )
+        cls._verify_non_negative_num(
+            Repo._concurrent_requests_per_ip, "CONCURRENT_REQUESTS_PER_IP"
+        )
+        cls._verify_non_negative_num(Repo._download_delay, "DOWNLOAD_DELAY")
 
     @classmethod
     def _validate_spider_settings(cls) -> None:
@@ -39,6 +66,126 @@ class Validator(object):
         cls._verify_value_type(Repo._use_first_uid, "USE_FIRST_UID", bool)
         # UPDATE_INTERVAL must be a positive number
         cls._verify_non_negative_num(Repo._update_interval, "UPDATE_INTERVAL")
+        # SESSION_POOL_SIZE, SESSION_MAX_REQUESTS and SESSION_MAX_FAILURES are
+        # integers, 0 to disable the session pool and session rotation respectively
+        for value, name in [
+            (Repo._session_pool_size, "SESSION_POOL_SIZE"),
+            (Repo._session_max_requests, "SESSION_MAX_REQUESTS"),
+            (Repo._session_max_failures, "SESSION_MAX_FAILURES"),
+        ]:
+            cls._verify_value_type(value, name, int)
+            cls._verify_non_negative_num(value, name)
+        if Repo._session_max_failures == 0:
+            raise ValueError('"SESSION_MAX_FAILURES" must be a positive integer.')
+        cls._verify_non_negative_num(Repo._session_min_interval, "SESSION_MIN_INTERVAL")
+        cls._verify_value_type(Repo._session_block_codes, "SESSION_BLOCK_CODES", list)
+        # CRAWL_ORDER must be one of '', 'hilbert' or 'geohash'
+        if Repo._crawl_order not in ["", "hilbert", "geohash"]:
+            raise ValueError('"CRAWL_ORDER" must be "", "hilbert" or "geohash".')
+        cls._verify_value_type(
+            Repo._crawl_order_by_industry, "CRAWL_ORDER_BY_INDUSTRY", bool
+        )
+        # DEDUP_TOLERANCE must be a non-negative number, 0 to disable deduplication
+        cls._verify_non_negative_num(Repo._dedup_tolerance, "DEDUP_TOLERANCE")
+        # GRID_CELL_SIZE and GRID_MARGIN are non-negative numbers of meters,
+        # GRID_CELL_SIZE is 0 to disable grid harvesting, which needs an industry
+        cls._verify_non_negative_num(Repo._grid_cell_size, "GRID_CELL_SIZE")
+        cls._verify_non_negative_num(Repo._grid_margin, "GRID_MARGIN")
+        cls._verify_value_type(Repo._grid_min_pois, "GRID_MIN_POIS", int)
+        if Repo._grid_min_pois < 1:
+            raise ValueError('"GRID_MIN_POIS" must be a positive integer.')
+        if Repo._grid_cell_size and not (Repo._prim_ind or Repo._sec_ind):
+            raise ValueError(
+                '"GRID_CELL_SIZE" requires "prim_ind" or "sec_ind" of "API_PARAMS", '
+                "as cells are searched by industry category."
+            )
+        # PRESCREEN_TOP_K is a non-negative integer, 0 to disable pre-screening
+        cls._verify_value_type(Repo._prescreen_top_k, "PRESCREEN_TOP_K", int)
+        cls._verify_non_negative_num(Repo._prescreen_top_k, "PRESCREEN_TOP_K")
+        for value, name in [
+            (Repo._prescreen_min_score, "PRESCREEN_MIN_SCORE"),
+            (Repo._prescreen_audit_rate, "PRESCREEN_AUDIT_RATE"),
+        ]:
+            cls._verify_non_negative_num(value, name)
+            if value > 1:
+                raise ValueError(f'"{name}" must not be more than 1.')
+        # PRESCREEN_WEIGHTS are non-negative numbers, not all 0 except "tag"
+        cls._verify_value_type(Repo._prescreen_weights, "PRESCREEN_WEIGHTS", dict)
+        for component in ["similarity", "distance", "search_rank", "tag"]:
+            cls._verify_non_negative_num(
+                Repo._prescreen_weights.get(component),
+                f"PRESCREEN_WEIGHTS.{component}",
+            )
+        if not any(
+            Repo._prescreen_weights[component]
+            for component in ["similarity", "distance", "search_rank"]
+        ):
+            raise ValueError(
+                '"PRESCREEN_WEIGHTS" of similarity, distance and search_rank '
+                "must not be all 0."
+            )
+        # OUTPUT_SIMPLIFY_TOLERANCE is a non-negative number of meters,
+        # OUTPUT_PRECISION is a non-negative number of decimals, 0 to disable both
+        cls._verify_non_negative_num(
+            Repo._output_simplify_tolerance, "OUTPUT_SIMPLIFY_TOLERANCE"
+        )
+        cls._verify_value_type(Repo._output_precision, "OUTPUT_PRECISION", int)
+        cls._verify_non_negative_num(Repo._output_precision, "OUTPUT_PRECISION")
+        # REFRESH_MAX_AGE is a non-negative number of days, 0 to disable,
+        # REFRESH_STATUSES is a list of statuses, REFRESH_REUSE_SEARCH is bool type
+        cls._verify_non_negative_num(Repo._refresh_max_age, "REFRESH_MAX_AGE")
+        cls._verify_value_type(Repo._refresh_statuses, "REFRESH_STATUSES", list)
+        for status in Repo._refresh_statuses:
+            if status not in ["Matched", "No Uid", "No Geometry"]:
+                raise ValueError(
+                    '"REFRESH_STATUSES" must only contain '
+                    '"Matched", "No Uid" or "No Geometry".'
+                )
+        cls._verify_value_type(Repo._refresh_reuse_search, "REFRESH_REUSE_SEARCH", bool)
+        if Repo._refresh_reuse_search and not Repo._candidate_store_dir:
+            raise ValueError('"REFRESH_REUSE_SEARCH" requires "CANDIDATE_STORE_DIR".')
+        # HTTP_ARCHIVE_MODE must be one of '', 'record' or 'replay'
+        if Repo._http_archive_mode not in ["", "record", "replay"]:
+            raise ValueError('"HTTP_ARCHIVE_MODE" must be "", "record" or "replay".')
+        cls._verify_value_type(Repo._http_archive_path, "HTTP_ARCHIVE_PATH", str)
+        # NEGATIVE_CACHE_TTL is a dict of non-negative numbers of days
+        cls._verify_value_type(Repo._negative_cache_path, "NEGATIVE_CACHE_PATH", str)
+        cls._verify_value_type(Repo._negative_cache_ttl, "NEGATIVE_CACHE_TTL", dict)
+        for kind in ["no_uid", "no_geometry"]:
+            cls._verify_non_negative_num(
+                Repo._negative_cache_ttl.get(kind), f"NEGATIVE_CACHE_TTL.{kind}"
+            )
+        cls._verify_value_type(Repo._negative_cache_force, "NEGATIVE_CACHE_FORCE", bool)
+        # METRICS_PORT is a port number, 0 to disable the metrics endpoint
+        cls._verify_value_type(Repo._metrics_host, "METRICS_HOST", str)
+        cls._verify_value_type(Repo._metrics_port, "METRICS_PORT", int)
+        if not 0 <= Repo._metrics_port <= 65535:
+            raise ValueError('"METRICS_PORT" must be within [0, 65535].')
+        # METRICS_DUMP_PATH is a string, '' to disable the json dump
+        cls._verify_value_type(Repo._metrics_dump_path, "METRICS_DUMP_PATH", str)
+        cls._verify_non_negative_num(
+            Repo._metrics_dump_interval, "METRICS_DUMP_INTERVAL"
+        )
+        if Repo._metrics_dump_interval == 0:
+            raise ValueError('"METRICS_DUMP_INTERVAL" must be a positive number.')
+        # CONTROL_PORT is a port number, 0 to disable the control endpoint
+        cls._verify_value_type(Repo._control_host, "CONTROL_HOST", str)
+        cls._verify_value_type(Repo._control_port, "CONTROL_PORT", int)
+        if not 0 <= Repo._control_port <= 65535:
+            raise ValueError('"CONTROL_PORT" must be within [0, 65535].')
+        # PROFILE_SAMPLE_RATE is a probability, 0 to disable profiling
+        cls._verify_non_negative_num(Repo._profile_sample_rate, "PROFILE_SAMPLE_RATE")
+        if Repo._profile_sample_rate > 1:
+            raise ValueError('"PROFILE_SAMPLE_RATE" must not be more than 1.')
+        # PROFILE_FORMAT must be one of 'pstats' or 'collapsed'
+        if Repo._profile_format not in ["pstats", "collapsed"]:
+            raise ValueError('"PROFILE_FORMAT" must be "pstats" or "collapsed".')
+        if Repo._profile_format == "collapsed" and not hasattr(signal, "setitimer"):
+            raise ValueError(
+                '"PROFILE_FORMAT" "collapsed" is not supported on Windows.'
+            )
+        cls._verify_value_type(Repo._profile_tracemalloc, "PROFILE_TRACEMALLOC", bool)
+        cls._verify_value_type(Repo._profile_dir, "PROFILE_DIR", str)
 
     @staticmethod
     def _validate_path_settings() -> None:
@@ -56,9 +203,25 @@ class Validator(object):
         if not os.path.exists(aoi_parent_dir):
             os.makedirs(aoi_parent_dir)
             logging.warning("(0/6) AOI_SHP_PATH parent directory created.")
+        # CANDIDATE_STORE_DIR is a string, '' to disable the candidate store
+        Validator._verify_value_type(
+            Repo._candidate_store_dir, "CANDIDATE_STORE_DIR", str
+        )
+        # OUTPUT_NORMALIZED_DIR is a string, '' to disable the normalized output
+        Validator._verify_value_type(
+            Repo._output_normalized_dir, "OUTPUT_NORMALIZED_DIR", str
+        )
 
     @classmethod
     def _validate_api_settings(cls) -> None:
+        # API endpoints must be urls
+        for url, name in [
+            (Repo._search_url, "BAIDU_SEARCH_URL"),
+            (Repo._aoi_url, "BAIDU_AOI_URL"),
+        ]:
+            cls._verify_value_type(url, name, str)
+            if not url.startswith(("http://", "https://")):
+                raise ValueError(f'"{name}" must be an http(s) url.')
         # AK_LIST must be a list of strings
         cls._verify_value_type(Repo._ak_list, "AK_LIST", list)
         if not Repo._ak_list:
@@ -87,6 +250,12 @@ class Validator(object):
         cls._verify_value_type(Repo._min_similarity, "min_similarity", float | int)
         if Repo._min_similarity >= 1:
             raise ValueError('"min_similarity" must not be more than 1.')
+        # similarity metric must be one of 'sequence', 'jaccard' or 'levenshtein'
+        if Repo._similarity_metric not in ["sequence", "jaccard", "levenshtein"]:
+            raise ValueError(
+                '"similarity_metric" must be "sequence", "jaccard" or "levenshtein".'
+            )
+        cls._verify_value_type(Repo._strip_suffixes, "strip_suffixes", bool)
         # sorting values must be one of 0 or 1 (or -1 for 'sort_by_area')
         for sorting_type, value in Repo._sortings.items():
             if sorting_type == "sort_by_area":
@@ -97,6 +266,10 @@ class Validator(object):
         # at least one kind of sorting must be enabled
         if not any(Repo._sortings.values()):
             raise ValueError("Sorting values must not be all 0.")
+        # whether an AOI is decisive cannot be told by its area
+        cls._verify_value_type(Repo._decisive_match, "DECISIVE_MATCH", bool)
+        if Repo._decisive_match and Repo._sortings.get("sort_by_area"):
+            raise ValueError('"DECISIVE_MATCH" requires "sort_by_area" to be 0.')
 
     @staticmethod
     def _check_optional_col(name: str, value: str) -> None:
@@ -104,6 +277,35 @@ class Validator(object):
             if name not in Repo.file.columns:
                 raise ValueError(f'Column "{name}" is missing.')
 
+    @staticmethod
+    def _check_rows() -> None:
+        """
+        Check all rows at once, and report all bad rows in one error:
+        - name must not be empty.
+        - lng/lat must be numbers within [-180, 180]/[-90, 90].
+        """
+        import pandas as pd
+
+        name = Repo.file["name"]
+        lng = pd.to_numeric(Repo.file["lng"], errors="coerce")
+        lat = pd.to_numeric(Repo.file["lat"], errors="coerce")
+        bad_rows = {
+            "empty name": name.isna() | name.astype(str).str.strip().eq(""),
+            "invalid lng": lng.isna() | ~lng.between(-180, 180),
+            "invalid lat": lat.isna() | ~lat.between(-90, 90),
+        }
+        errors = []
+        for reason, mask in bad_rows.items():
+            rows = Repo.file.index[mask.to_numpy()]
+            if len(rows):
+                shown = ", ".join(map(str, rows[:20]))
+                more = f" and {len(rows) - 20} more" if len(rows) > 20 else ""
+                errors.append(f"{reason} in {len(rows)} rows (index {shown}{more})")
+        if errors:
+            raise ValueError(f'Bad rows in POI csv: {"; ".join(errors)}.')
+        # keep the coordinates numeric for vectorized conversion
+        Repo.file["lng"], Repo.file["lat"] = lng, lat
+
     @classmethod
     def _verify_non_negative_num(cls, value: any, name: str) -> None:
         cls._verify_value_type(value, name, float | int)
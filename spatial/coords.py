@@ -5,6 +5,9 @@ import math
 from math import asin, cos, sin, sqrt
 from typing import Tuple
 
+import numpy as np
+from numpy.typing import NDArray
+
 # Basic Parameters:
 x_pi = 3.14159265358979324 * 3000.0 / 180.0
 pi = 3.1415926535897932384626  # π
@@ -350,3 +353,170 @@ def cal_distance(lon1: float, lat1: float, lon2: float, lat2: float) -> float:
     ) * sin(d_lon / 2) * sin(d_lon / 2)
     dist = 2 * 6378.137 * asin(sqrt(a))
     return dist
+
+
+# ---------------------------------------------------------------------------- #
+#               Vectorized versions, for arrays of coordinates                 #
+# ---------------------------------------------------------------------------- #
+
+
+def gcj02_to_wgs84_array(lng: NDArray, lat: NDArray) -> Tuple[NDArray, NDArray]:
+    """
+    Vectorized `gcj02_to_wgs84`.
+
+    Args:
+        lng (NDArray): gcj02 CRS longitudes
+        lat (NDArray): gcj02 CRS latitudes
+
+    Returns:
+        tuple(NDArray, NDArray): (wgs84_lngs, wgs84_lats)
+    """
+    lng, lat = np.asarray(lng, dtype=float), np.asarray(lat, dtype=float)
+    d_lat = transform_lat_array(lng - 105.0, lat - 35.0)
+    d_lng = transform_lng_array(lng - 105.0, lat - 35.0)
+    rad_lat = lat / 180.0 * pi
+
+    magic = np.sin(rad_lat)
+    magic = 1 - ee * magic * magic
+    sqrt_magic = np.sqrt(magic)
+
+    d_lat = (d_lat * 180.0) / ((a * (1 - ee)) / (magic * sqrt_magic) * pi)
+    d_lng = (d_lng * 180.0) / (a / sqrt_magic * np.cos(rad_lat) * pi)
+    mg_lat = lat + d_lat
+    mg_lng = lng + d_lng
+    outside = outside_of_china_array(lng, lat)
+    return (
+        np.where(outside, lng, lng * 2 - mg_lng),
+        np.where(outside, lat, lat * 2 - mg_lat),
+    )
+
+
+def transform_lat_array(lng: NDArray, lat: NDArray) -> NDArray:
+    ret = (
+        -100.0
+        + 2.0 * lng
+        + 3.0 * lat
+        + 0.2 * lat * lat
+        + 0.1 * lng * lat
+        + 0.2 * np.sqrt(np.fabs(lng))
+    )
+    ret += (20.0 * np.sin(6.0 * lng * pi) + 20.0 * np.sin(2.0 * lng * pi)) * 2.0 / 3.0
+    ret += (20.0 * np.sin(lat * pi) + 40.0 * np.sin(lat / 3.0 * pi)) * 2.0 / 3.0
+    ret += (160.0 * np.sin(lat / 12.0 * pi) + 320 * np.sin(lat * pi / 30.0)) * 2.0 / 3.0
+    return ret
+
+
+def transform_lng_array(lng: NDArray, lat: NDArray) -> NDArray:
+    ret = (
+        300.0
+        + lng
+        + 2.0 * lat
+        + 0.1 * lng * lng
+        + 0.1 * lng * lat
+        + 0.1 * np.sqrt(np.fabs(lng))
+    )
+    ret += (20.0 * np.sin(6.0 * lng * pi) + 20.0 * np.sin(2.0 * lng * pi)) * 2.0 / 3.0
+    ret += (20.0 * np.sin(lng * pi) + 40.0 * np.sin(lng / 3.0 * pi)) * 2.0 / 3.0
+    ret += (
+        (150.0 * np.sin(lng / 12.0 * pi) + 300.0 * np.sin(lng / 30.0 * pi)) * 2.0 / 3.0
+    )
+    return ret
+
+
+def outside_of_china_array(lng: NDArray, lat: NDArray) -> NDArray:
+    """
+    Vectorized `outside_of_china`.
+    """
+    return (lng < 72.004) | (lng > 137.8347) | (lat < 0.8293) | (lat > 55.8271)
+
+
+def bd09ll_to_gcj02_array(bd_lon: NDArray, bd_lat: NDArray) -> Tuple[NDArray, NDArray]:
+    """
+    Vectorized `bd09ll_to_gcj02`.
+    """
+    x = np.asarray(bd_lon, dtype=float) - 0.0065
+    y = np.asarray(bd_lat, dtype=float) - 0.006
+    z = np.sqrt(x * x + y * y) - 0.00002 * np.sin(y * x_pi)
+    theta = np.arctan2(y, x) - 0.000003 * np.cos(x * x_pi)
+    return z * np.cos(theta), z * np.sin(theta)
+
+
+def bd09ll_to_wgs84_array(lon: NDArray, lat: NDArray) -> Tuple[NDArray, NDArray]:
+    """
+    Vectorized `bd09ll_to_wgs84`.
+    """
+    return gcj02_to_wgs84_array(*bd09ll_to_gcj02_array(lon, lat))
+
+
+def bd09mc_to_bd09ll_array(x1: NDArray, y1: NDArray) -> Tuple[NDArray, NDArray]:
+    """
+    Vectorized `bd09mc_to_bd09ll`.
+    """
+    x1, y1 = np.asarray(x1, dtype=float), np.asarray(y1, dtype=float)
+    # index of the first band whose lower bound is below y1
+    band = np.argmax(y1[:, None] > np.array(MC_BAND)[None, :], axis=1)
+    cF = np.array(MC2LL)[band].T
+    xTemp = cF[0] + cF[1] * x1
+    cC = y1 / cF[9]
+    yTemp = (
+        cF[2]
+        + cF[3] * cC
+        + cF[4] * cC**2
+        + cF[5] * cC**3
+        + cF[6] * cC**4
+        + cF[7] * cC**5
+        + cF[8] * cC**6
+    )
+    return xTemp, yTemp
+
+
+def bd09mc_to_wgs84_array(x1: NDArray, y1: NDArray) -> Tuple[NDArray, NDArray]:
+    """
+    Vectorized `bd09mc_to_wgs84`.
+    """
+    return bd09ll_to_wgs84_array(*bd09mc_to_bd09ll_array(x1, y1))
+
+
+def geohash_index_array(lng: NDArray, lat: NDArray, bits: int = 16) -> NDArray:
+    """
+    Position of the points along the Z-order curve, which sorts points
+    in the same order as their geohashes, with `bits` bits per axis.
+    """
+    x, y = _grid_cells_array(lng, lat, bits)
+    index = np.zeros(x.shape, dtype=np.int64)
+    for i in range(bits - 1, -1, -1):
+        # geohash interleaves the bits starting with longitude
+        index = (index << 2) | (((x >> i) & 1) << 1) | ((y >> i) & 1)
+    return index
+
+
+def hilbert_index_array(lng: NDArray, lat: NDArray, bits: int = 16) -> NDArray:
+    """
+    Position of the points along the Hilbert curve, with `bits` bits per axis.
+    Unlike the Z-order curve, consecutive positions are always adjacent cells.
+    """
+    x, y = _grid_cells_array(lng, lat, bits)
+    index = np.zeros(x.shape, dtype=np.int64)
+    s = 1 << (bits - 1)
+    while s > 0:
+        rx = (x & s) > 0
+        ry = (y & s) > 0
+        index += s * s * ((3 * rx) ^ ry)
+        # rotate the quadrant so that the curve is continuous
+        flip = ~ry & rx
+        x = np.where(flip, s - 1 - x, x)
+        y = np.where(flip, s - 1 - y, y)
+        x, y = np.where(~ry, y, x), np.where(~ry, x, y)
+        s >>= 1
+    return index
+
+
+def _grid_cells_array(lng: NDArray, lat: NDArray, bits: int) -> Tuple[NDArray, NDArray]:
+    """
+    Integer cells of the points in a `2^bits x 2^bits` grid over the globe.
+    """
+    n = 1 << bits
+    lng, lat = np.asarray(lng, dtype=float), np.asarray(lat, dtype=float)
+    x = np.clip(((lng + 180) / 360 * n).astype(np.int64), 0, n - 1)
+    y = np.clip(((lat + 90) / 180 * n).astype(np.int64), 0, n - 1)
+    return x, y
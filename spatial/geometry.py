@@ -1,11 +1,18 @@
-import pyproj
-from shapely import wkt
+from functools import lru_cache
+from typing import TYPE_CHECKING, Tuple
+
+import numpy as np
+from numpy.typing import NDArray
+from shapely import wkb, wkt
 from shapely.geometry import LineString, Polygon
 from shapely.geometry.base import BaseGeometry
 from shapely.ops import transform
 
 from spatial.coords import cal_distance
 
+if TYPE_CHECKING:
+    import pyproj
+
 
 def within_distance(
     lng1: float, lat1: float, lng2: float, lat2: float, distance: int = 1
@@ -17,13 +24,44 @@ def within_distance(
     return cal_distance(lng2, lat2, lng1, lat1) <= distance
 
 
-def points_to_polygon(points: list) -> Polygon:
+def points_to_polygon(points: list | NDArray) -> Polygon:
     """
-    Convert a list of points to a `shapely` polygon.
+    Convert a list (or an `n x 2` array) of points to a `shapely` polygon.
     """
     return Polygon(LineString(points))
 
 
+def polygon_area(coords: NDArray) -> float:
+    """
+    Area of the polygon ring `coords` (an `n x 2` array of planar coordinates),
+    calculated by the shoelace formula.
+    """
+    x, y = coords[:, 0], coords[:, 1]
+    return abs(np.dot(x, np.roll(y, -1)) - np.dot(y, np.roll(x, -1))) / 2
+
+
+def simplify_polygon(
+    polygon: Polygon, tolerance: float, precision: int
+) -> Tuple[Polygon, float]:
+    """
+    Simplify the `wgs84` polygon with a topology-preserving `tolerance` (unit: meters),
+    and round its coordinates to `precision` decimals (0 to keep them as they are).
+    Return the new polygon and its Hausdorff distance to the original one in meters.
+    """
+    coords = np.asarray(polygon.exterior.coords)
+    utm_coords = coords_wgs84_to_wgs84utm50n(coords)
+    utm_polygon = Polygon(utm_coords)
+    if tolerance:
+        # the simplified ring is a subset of the vertices, computed in meters
+        simplified = utm_polygon.simplify(tolerance, preserve_topology=True)
+        kept = set(map(tuple, np.asarray(simplified.exterior.coords)))
+        coords = coords[[tuple(xy) in kept for xy in utm_coords]]
+    if precision:
+        coords = np.round(coords, precision)
+    error = utm_polygon.hausdorff_distance(Polygon(coords_wgs84_to_wgs84utm50n(coords)))
+    return Polygon(coords), error
+
+
 def wkt_to_geometry(wkt_str: str) -> BaseGeometry:
     """
     Convert `wkt` string to `shapely` geometry.
@@ -31,11 +69,39 @@ def wkt_to_geometry(wkt_str: str) -> BaseGeometry:
     return wkt.loads(wkt_str)
 
 
+def wkb_to_geometries(wkb_buffers: NDArray) -> NDArray:
+    """
+    Convert an array of `wkb` bytes to an object array of `shapely` geometries.
+    """
+    geometries = np.empty(len(wkb_buffers), dtype=object)
+    for i, buffer in enumerate(wkb_buffers):
+        geometries[i] = wkb.loads(bytes(buffer))
+    return geometries
+
+
 def wgs84_to_wgs84utm50n(geometry: BaseGeometry) -> BaseGeometry:
     """
     Transform the geometry projection from `wgs84` to `wgs84_utm50n`.
     """
+    return transform(_wgs84_to_wgs84utm50n_transformer().transform, geometry)
+
+
+def coords_wgs84_to_wgs84utm50n(coords: NDArray) -> NDArray:
+    """
+    Transform an `n x 2` array of `(lng, lat)` from `wgs84` to `wgs84_utm50n`.
+    """
+    x, y = _wgs84_to_wgs84utm50n_transformer().transform(coords[:, 0], coords[:, 1])
+    return np.column_stack([x, y])
+
+
+@lru_cache(maxsize=None)
+def _wgs84_to_wgs84utm50n_transformer() -> "pyproj.Transformer":
+    """
+    Building a transformer is expensive, so it is built only once,
+    and pyproj is only imported then.
+    """
+    import pyproj
+
     wgs84 = pyproj.CRS("EPSG:4326")
     wgs84_utm50n = pyproj.CRS("EPSG:32650")
-    project = pyproj.Transformer.from_crs(wgs84, wgs84_utm50n, always_xy=True).transform
-    return transform(project, geometry)
+    return pyproj.Transformer.from_crs(wgs84, wgs84_utm50n, always_xy=True)
@@ -0,0 +1,81 @@
+"""
+Smoke test of the control endpoint on a running crawl against the local mock server.
+
+Usage (from the project root):
+    python -m pytest tests
+"""
+
+import argparse
+import socket
+
+from scrapy import signals
+from scrapy.crawler import CrawlerProcess
+from scrapy.utils.project import get_project_settings
+
+from baidu_aoi_spider.extensions import ControlExtension
+from baidu_aoi_spider.spiders.baidu_aoi import BaiduAOISpider
+from benchmarks import mock_baidu
+from benchmarks.crawl import make_poi_file, start_mock_server
+from processor import Repo, ResultStore
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def test_control_on_running_crawl(tmp_path):
+    parser = argparse.ArgumentParser()
+    mock_baidu.add_arguments(parser)
+    args = parser.parse_args(["--latency", "0"])
+    make_poi_file(50, str(tmp_path / "POI.csv"))
+    server = start_mock_server(args)
+    url = f"http://127.0.0.1:{args.port}"
+    settings = get_project_settings()
+    settings.setdict(
+        {
+            "BAIDU_SEARCH_URL": f"{url}/place/v2/search",
+            "BAIDU_AOI_URL": f"{url}/",
+            "POI_CSV_PATH": str(tmp_path / "POI.csv"),
+            "AOI_SHP_PATH": str(tmp_path / "AOI" / "AOI.shp"),
+            "AK_LIST": ["test"],
+            "PROXY_ENABLED": False,
+            "CONTROL_PORT": free_port(),
+            "LOG_LEVEL": "ERROR",
+        },
+        priority="cmdline",
+    )
+    process = CrawlerProcess(settings)
+    crawler = process.create_crawler(BaiduAOISpider)
+    replies = []
+
+    def drive(response, request, spider) -> None:
+        # once, while requests are in flight and scheduled
+        if replies:
+            return
+        (extension,) = [
+            m for m in crawler.extensions.middlewares if isinstance(m, ControlExtension)
+        ]
+        replies.append(extension.state())
+        extension.update({"DOWNLOAD_DELAY": 0, "FILTER_RULES": {"min_similarity": 0}})
+        extension.pause()
+        extension.resume()
+        replies.append(extension.state())
+
+    crawler.signals.connect(drive, signal=signals.response_received)
+    try:
+        process.crawl(crawler)
+        process.start()
+    finally:
+        server.terminate()
+        server.wait()
+    assert len(replies) == 2
+    for state in replies:
+        assert state["paused"] is False
+        assert state["requests_in_flight"] >= 0
+        assert state["requests_scheduled"] >= 0
+        assert state["progress"]["total"] == 50
+    assert replies[1]["settings"]["DOWNLOAD_DELAY"] == 0
+    assert Repo._download_delay == 0
+    assert ResultStore.finished().sum() == 50